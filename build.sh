@@ -2,7 +2,8 @@
 # Saia imediatamente se um comando falhar
 set -o errexit
 
-# Coleta arquivos estáticos
+# Coleta arquivos estáticos. O armazenamento core.static_storage também
+# deduplica, recomprime as imagens, gera variantes WebP/AVIF e os .gz/.br
 python manage.py collectstatic --no-input
 
 # Aplica migrações do banco de dados (CRUCIAL PARA CRIAR A TABELA)
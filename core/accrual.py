@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .income import add_task_earnings
+from .ledger import ZERO, apply_bulk
+from .models import LedgerEntry, UserLevel, Task
+
+
+# Intervalo entre dois ganhos diários consecutivos (mesmo valor usado na tarefa)
+COOLDOWN_DURATION = timedelta(hours=24)
+
+# Quantidade de UserLevels processados por transação
+DEFAULT_CHUNK_SIZE = 500
+
+
+def next_gain_time_for(user_level):
+    """
+    Retorna o momento do próximo ganho de um UserLevel.
+    Se 'last_daily_gain_date' for None (primeiro ciclo), usa a data de compra.
+    """
+    last_gain_time = user_level.last_daily_gain_date or user_level.purchase_date
+    return last_gain_time + COOLDOWN_DURATION
+
+
+def due_user_levels(now=None):
+    """
+    Queryset dos UserLevels com ganho devido em 'now'.
+
+    Assim como a lógica original da tarefa, apenas o primeiro nível ativo
+    (menor id) de cada usuário gera ganho diário.
+    """
+    now = now or timezone.now()
+    threshold = now - COOLDOWN_DURATION
+
+    first_active_level = UserLevel.objects.filter(
+        user=OuterRef('user'), is_active=True
+    ).order_by('id').values('id')[:1]
+
+    return UserLevel.objects.filter(
+        Q(last_daily_gain_date__lte=threshold) |
+        Q(last_daily_gain_date__isnull=True, purchase_date__lte=threshold),
+        is_active=True,
+        id=Subquery(first_active_level),
+    )
+
+
+def _credit_chunk(now, user_level_ids):
+    """
+    Aplica os ganhos de um bloco de UserLevels numa única transação.
+
+    As linhas são bloqueadas com skip_locked, de modo que dois processos
+    executando o motor ao mesmo tempo nunca creditam o mesmo ganho. A
+    condição de vencimento é reavaliada dentro da transação, o que torna
+    a operação idempotente.
+    """
+    with transaction.atomic():
+        rows = list(
+            due_user_levels(now)
+            .select_for_update(skip_locked=True, of=('self',))
+            .filter(id__in=user_level_ids)
+            .values_list('id', 'user_id', 'level__daily_gain')
+        )
+        if not rows:
+            return []
+
+        UserLevel.objects.filter(id__in=[row[0] for row in rows]).update(last_daily_gain_date=now)
+
+        # Créditos em lote: um UPDATE por valor de ganho distinto + entradas no livro-razão
+        apply_bulk([
+            (user_id, LedgerEntry.REASON_DAILY_GAIN, daily_gain, ZERO, UserLevel(pk=user_level_id))
+            for user_level_id, user_id, daily_gain in rows
+        ])
+
+        # Histórico: ganho diário não está associado a uma TaskDefinition
+        Task.objects.bulk_create([
+            Task(user_id=user_id, task_definition=None, earnings=daily_gain)
+            for _, user_id, daily_gain in rows
+        ])
+
+        # bulk_create não dispara sinais: atualiza o resumo de rendimentos diretamente
+        add_task_earnings({user_id: daily_gain for _, user_id, daily_gain in rows})
+    return rows
+
+
+def apply_due_daily_gains(now=None, chunk_size=DEFAULT_CHUNK_SIZE, user_ids=None):
+    """
+    Motor de ganhos diários em lote.
+
+    Percorre os UserLevels devidos em blocos ordenados por id (keyset), de
+    forma que uma execução interrompida pode simplesmente ser retomada.
+    Se 'user_ids' for informado, processa apenas esses usuários.
+
+    Retorna (quantidade de ganhos aplicados, valor total creditado).
+    """
+    now = now or timezone.now()
+    queryset = due_user_levels(now).order_by('id')
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+
+    applied = 0
+    total = ZERO
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        rows = _credit_chunk(now, ids)
+        applied += len(rows)
+        total += sum((row[2] for row in rows), ZERO)
+
+    return applied, total
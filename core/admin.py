@@ -1,9 +1,16 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe # Importação necessária para renderizar HTML no Admin
 from .models import (
     CustomUser, PlatformSettings, Level, BankDetails, Deposit, 
-    Withdrawal, Task, Roulette, RouletteSettings, UserLevel, PlatformBankDetails
+    Withdrawal, Task, Roulette, RouletteSettings, UserLevel, PlatformBankDetails, LedgerEntry,
+    RoulettePrize, TaskMonthlySummary, WithdrawalDailyCounter, WithdrawalPolicy
 )
+from .deposits import RESULT_APPROVED, approve_deposits
+from .payouts import aiter_payout_csv, approve_withdrawals, reject_withdrawals
 
 # ---
 
@@ -11,10 +18,22 @@ from .models import (
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
-    list_display = ('phone_number', 'available_balance', 'subsidy_balance', 'is_staff', 'is_active', 'date_joined', 'roulette_spins')
+    list_display = ('phone_number', 'available_balance', 'subsidy_balance', 'active_level_name', 'withdrawn', 'is_staff', 'is_active', 'date_joined', 'roulette_spins')
     search_fields = ('phone_number', 'invite_code')
     list_filter = ('is_staff', 'is_active', 'level_active')
 
+    def get_queryset(self, request):
+        # Nível ativo e total sacado anotados na consulta da listagem (sem N+1)
+        return super().get_queryset(request).with_summary()
+
+    @admin.display(description='Nível Ativo')
+    def active_level_name(self, obj):
+        return obj.active_level.name if obj.active_level else '-'
+
+    @admin.display(description='Total Sacado', ordering='prefetched_total_withdrawn')
+    def withdrawn(self, obj):
+        return obj.total_withdrawn
+
 @admin.register(PlatformSettings)
 class PlatformSettingsAdmin(admin.ModelAdmin):
     # Adicionado 'app_download_link' se você atualizou o models.py para exibir no admin
@@ -36,18 +55,41 @@ class PlatformBankDetailsAdmin(admin.ModelAdmin):
     list_display = ('bank_name', 'account_holder_name')
     search_fields = ('bank_name', 'account_holder_name')
 
+class DuplicateProofFilter(admin.SimpleListFilter):
+    title = 'comprovativo repetido'
+    parameter_name = 'duplicate_proof'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Sim'), ('no', 'Não')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(has_duplicate_proof=True)
+        if self.value() == 'no':
+            return queryset.filter(has_duplicate_proof=False)
+        return queryset
+
+
 @admin.register(Deposit)
 class DepositAdmin(admin.ModelAdmin):
     # Adicionamos 'proof_link' para mostrar o link na lista de depósitos
-    list_display = ('user', 'amount', 'is_approved', 'created_at', 'proof_link') 
-    search_fields = ('user__phone_number',)
-    list_filter = ('is_approved',)
+    list_display = ('user', 'amount', 'is_approved', 'created_at', 'proof_link', 'duplicate_proof') 
+    search_fields = ('user__phone_number', 'proof_sha256')
+    list_filter = ('is_approved', DuplicateProofFilter, 'proof_status')
+    list_select_related = ('user',)
+    actions = ['approve_selected']
     
     # Campos que serão apenas de leitura na página de edição/criação
     readonly_fields = ('current_proof_display',)
 
     # Método para criar o link do comprovativo na LISTA de depósitos
+    # (miniatura gerada por core.proofs, para a listagem carregar poucos KB)
     def proof_link(self, obj):
+        if obj.proof_thumbnail:
+            return format_html(
+                '<a href="{}" target="_blank"><img src="{}" style="max-height:60px; width:auto;" loading="lazy" /></a>',
+                obj.proof_of_payment.url, obj.proof_thumbnail.url,
+            )
         if obj.proof_of_payment:
             # obj.proof_of_payment.url usa o Cloudinary Storage para obter o URL completo.
             return mark_safe(f'<a href="{obj.proof_of_payment.url}" target="_blank">Ver Comprovativo</a>')
@@ -59,6 +101,7 @@ class DepositAdmin(admin.ModelAdmin):
     def current_proof_display(self, obj):
         if obj.proof_of_payment:
             # Exibe a imagem diretamente e fornece um link para visualização
+            # (após o processamento, a imagem já tem no máximo DEPOSIT_PROOF_MAX_SIZE px)
             return mark_safe(f'''
                 <a href="{obj.proof_of_payment.url}" target="_blank">Ver Imagem em Tamanho Real</a><br/>
                 <img src="{obj.proof_of_payment.url}" style="max-width:300px; height:auto; margin-top: 10px;" />
@@ -67,6 +110,25 @@ class DepositAdmin(admin.ModelAdmin):
     
     current_proof_display.short_description = 'Comprovativo Atual'
 
+    # --- NOVO: comprovativo repetido (mesmo SHA-256 em outro depósito) ---
+    def get_queryset(self, request):
+        same_proof = Deposit.objects.filter(proof_sha256=OuterRef('proof_sha256')).exclude(pk=OuterRef('pk')).exclude(proof_sha256='')
+        return super().get_queryset(request).annotate(has_duplicate_proof=Exists(same_proof))
+
+    @admin.display(boolean=True, description='Comprovativo repetido', ordering='has_duplicate_proof')
+    def duplicate_proof(self, obj):
+        return obj.has_duplicate_proof
+    # --- FIM NOVO ---
+
+    @admin.action(description='Aprovar depósitos selecionados (credita o saldo)')
+    def approve_selected(self, request, queryset):
+        report = approve_deposits(queryset.values_list('pk', flat=True))
+        approved = sum(1 for result in report.values() if result == RESULT_APPROVED)
+        skipped = len(report) - approved
+        self.message_user(request, f'{approved} depósito(s) aprovado(s).', messages.SUCCESS)
+        if skipped:
+            self.message_user(request, f'{skipped} depósito(s) já aprovado(s) ou em aprovação por outra pessoa.', messages.WARNING)
+
 @admin.register(Withdrawal)
 class WithdrawalAdmin(admin.ModelAdmin):
     # --- ALTERAÇÃO AQUI: Adicionado 'user_iban' e 'account_details' ---
@@ -74,44 +136,88 @@ class WithdrawalAdmin(admin.ModelAdmin):
     # --- FIM ALTERAÇÃO ---
     search_fields = ('user__phone_number',)
     list_filter = ('status',)
-    
-    # --- NOVO MÉTODO PARA PEGAR IBAN ---
-    def user_iban(self, obj):
+    # Usuário e detalhes bancários vêm no mesmo SELECT da listagem (sem consultas por linha)
+    list_select_related = ('user', 'user__bankdetails')
+    actions = ['approve_selected', 'reject_selected', 'export_payouts_csv']
+
+    @staticmethod
+    def _bank_details(obj):
         try:
-            # Tenta obter os detalhes bancários do usuário
-            bank_details = BankDetails.objects.get(user=obj.user)
-            return bank_details.IBAN
+            return obj.user.bankdetails
         except BankDetails.DoesNotExist:
-            return "N/A (Adicionar)"
-            
+            return None
+
+    # --- NOVO MÉTODO PARA PEGAR IBAN ---
+    def user_iban(self, obj):
+        bank_details = self._bank_details(obj)
+        return bank_details.IBAN if bank_details else "N/A (Adicionar)"
+
     user_iban.short_description = 'IBAN do Cliente'
     # --- FIM NOVO MÉTODO ---
-    
+
     # --- NOVO MÉTODO PARA PEGAR DETALHES DA CONTA (Nome/Banco) ---
     def account_details(self, obj):
-        try:
-            bank_details = BankDetails.objects.get(user=obj.user)
-            return f"{bank_details.account_holder_name} ({bank_details.bank_name})"
-        except BankDetails.DoesNotExist:
+        bank_details = self._bank_details(obj)
+        if bank_details is None:
             return "N/A (Adicionar)"
+        return f"{bank_details.account_holder_name} ({bank_details.bank_name})"
 
     account_details.short_description = 'Nome/Banco'
     # --- FIM NOVO MÉTODO ---
 
+    # --- AÇÕES EM LOTE (core.payouts) ---
+    @admin.action(description='Aprovar saques pendentes selecionados')
+    def approve_selected(self, request, queryset):
+        count = approve_withdrawals(queryset)
+        self.message_user(request, f'{count} saque(s) aprovado(s).', messages.SUCCESS)
+
+    @admin.action(description='Rejeitar saques pendentes selecionados (estorna o saldo)')
+    def reject_selected(self, request, queryset):
+        count = reject_withdrawals(queryset)
+        self.message_user(request, f'{count} saque(s) rejeitado(s) e estornado(s).', messages.SUCCESS)
+
+    @admin.action(description='Exportar pagamentos aprovados (CSV por banco)')
+    def export_payouts_csv(self, request, queryset):
+        response = StreamingHttpResponse(aiter_payout_csv(queryset), content_type='text/csv; charset=utf-8')
+        filename = f"pagamentos-{timezone.localtime():%Y%m%d-%H%M}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    # --- FIM AÇÕES EM LOTE ---
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ('user', 'earnings', 'completed_at')
     search_fields = ('user__phone_number',)
 
+@admin.register(TaskMonthlySummary)
+class TaskMonthlySummaryAdmin(admin.ModelAdmin):
+    # Gerados pelo comando 'archive_tasks' (core.task_archive): somente leitura
+    list_display = ('user', 'month', 'task_count', 'earnings_total')
+    search_fields = ('user__phone_number',)
+    list_filter = ('month',)
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Roulette)
 class RouletteAdmin(admin.ModelAdmin):
     list_display = ('user', 'prize', 'is_approved', 'spin_date')
     search_fields = ('user__phone_number',)
     list_filter = ('is_approved',)
 
+class RoulettePrizeInline(admin.TabularInline):
+    model = RoulettePrize
+    extra = 1
+
 @admin.register(RouletteSettings)
 class RouletteSettingsAdmin(admin.ModelAdmin):
     list_display = ('id', 'prizes')
+    # Prêmios e pesos editáveis na própria configuração da roleta
+    inlines = [RoulettePrizeInline]
 
 @admin.register(UserLevel)
 class UserLevelAdmin(admin.ModelAdmin):
@@ -119,4 +225,40 @@ class UserLevelAdmin(admin.ModelAdmin):
     search_fields = ('user__phone_number', 'level__name')
     list_filter = ('is_active',)
 
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    # Livro-razão: somente leitura, as entradas são criadas pelo serviço de saldos (core.ledger)
+    list_display = ('user', 'reason', 'amount', 'subsidy_amount', 'source_type', 'source_id', 'created_at')
+    search_fields = ('user__phone_number',)
+    list_filter = ('reason',)
+    list_select_related = ('user', 'source_type')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # ---
+
+@admin.register(WithdrawalPolicy)
+class WithdrawalPolicyAdmin(admin.ModelAdmin):
+    # Vale a primeira política ativa (core.withdrawal_policy); alterações invalidam o cache
+    list_display = ('id', 'min_amount', 'max_amount', 'window_start', 'window_end', 'max_per_day', 'max_daily_amount', 'is_active')
+
+@admin.register(WithdrawalDailyCounter)
+class WithdrawalDailyCounterAdmin(admin.ModelAdmin):
+    # Contadores mantidos por core.withdrawal_policy: somente leitura
+    list_display = ('user', 'day', 'count', 'total')
+    search_fields = ('user__phone_number',)
+    list_filter = ('day',)
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registra os sinais de invalidação do cache, do resumo de rendimentos, do usuário em cache,
+        # das notificações e do cache de convites do cadastro, e as verificações de configuração
+        from . import cache, checks, income, notifications, signup, user_cache  # noqa: F401
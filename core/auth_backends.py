@@ -0,0 +1,19 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .user_cache import aload_user, load_user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend que carrega o usuário da sessão pelo cache (core.user_cache),
+    sem consulta ao banco quando o retrato do usuário já está em cache.
+    """
+
+    def get_user(self, user_id):
+        user = load_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # Usado por request.auser() nas views assíncronas
+        user = await aload_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
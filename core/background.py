@@ -0,0 +1,47 @@
+"""
+Fila de tarefas em segundo plano do processo web.
+
+Trabalho não crítico (ex.: efeitos colaterais do cadastro, core.signup) é
+enviado a um pool de threads depois do commit da transação atual, fora do
+tempo de resposta da requisição. Com BACKGROUND_WORKERS=0 as tarefas rodam
+na própria thread, logo após o commit.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Erro na tarefa em segundo plano %s.', func.__name__)
+
+
+def _run_in_thread(func, args):
+    try:
+        _run(func, args)
+    finally:
+        close_old_connections()
+
+
+def run_after_commit(func, *args):
+    """Executa func(*args) em segundo plano após o commit da transação atual."""
+    global _executor
+    workers = getattr(settings, 'BACKGROUND_WORKERS', 2)
+    if workers <= 0:
+        transaction.on_commit(lambda: _run(func, args))
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='core-background')
+    transaction.on_commit(lambda: _executor.submit(_run_in_thread, func, args))
@@ -0,0 +1,124 @@
+"""
+Cache das configurações e catálogos da plataforma.
+
+PlatformSettings, RouletteSettings, PlatformBankDetails, Level e
+WithdrawalPolicy mudam raramente (pelo Admin), mas eram consultados em
+quase todas as views.
+Cada conjunto tem uma chave de versão no cache do Django; os sinais
+post_save/post_delete incrementam a versão, e as leituras seguintes
+passam a usar uma chave nova. Funciona com LocMemCache, FileBasedCache ou
+DatabaseCache (configurado em settings.CACHES).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import Level, PlatformBankDetails, PlatformSettings, RoulettePrize, RouletteSettings, WithdrawalPolicy
+
+
+KEY_PREFIX = 'core:config'
+
+# Limite de segurança: mesmo sem invalidação (ex.: outro worker com LocMemCache),
+# os valores expiram depois deste tempo.
+CONFIG_CACHE_TIMEOUT = getattr(settings, 'CONFIG_CACHE_TIMEOUT', 300)
+
+_MISSING = object()
+
+
+def _version_key(name):
+    return f'{KEY_PREFIX}:{name}:version'
+
+
+def _new_version():
+    # Baseada no relógio, para nunca reutilizar uma versão antiga após a expulsão da chave
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    version = cache.get(_version_key(name))
+    if version is None:
+        version = _new_version()
+        cache.add(_version_key(name), version, None)
+        version = cache.get(_version_key(name), version)
+    return version
+
+
+def _bump_version(name):
+    try:
+        return cache.incr(_version_key(name))
+    except ValueError:
+        version = _new_version()
+        cache.set(_version_key(name), version, None)
+        return version
+
+
+def invalidate(name):
+    """
+    Incrementa a versão do conjunto 'name', descartando os valores em cache.
+    Repete após o commit da transação atual: uma leitura concorrente que viu
+    as linhas antigas pode tê-las guardado na versão nova (como em
+    core.user_cache.invalidate_users).
+    """
+    version = _bump_version(name)
+    transaction.on_commit(lambda: _bump_version(name))
+    return version
+
+
+def _get_or_load(name, loader):
+    key = f'{KEY_PREFIX}:{name}:v{get_version(name)}'
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = loader()
+        cache.set(key, value, CONFIG_CACHE_TIMEOUT)
+    return value
+
+
+# --- ACESSORES ---
+
+def get_platform_settings():
+    """Retorna o PlatformSettings ativo (o primeiro) ou None."""
+    return _get_or_load('platform_settings', lambda: PlatformSettings.objects.first())
+
+
+def get_roulette_settings():
+    """Retorna o RouletteSettings ativo (o primeiro) ou None."""
+    return _get_or_load('roulette_settings', lambda: RouletteSettings.objects.first())
+
+
+def get_platform_bank_details():
+    """Retorna a lista de PlatformBankDetails."""
+    return _get_or_load('platform_bank_details', lambda: list(PlatformBankDetails.objects.all()))
+
+
+def get_levels():
+    """Retorna a lista de Levels ordenada por valor de depósito."""
+    return _get_or_load('levels', lambda: list(Level.objects.all().order_by('deposit_value')))
+
+
+def get_withdrawal_policy():
+    """Retorna a primeira WithdrawalPolicy ativa ou None."""
+    return _get_or_load('withdrawal_policy', lambda: WithdrawalPolicy.objects.filter(is_active=True).order_by('pk').first())
+
+
+# --- INVALIDAÇÃO POR SINAIS ---
+
+CACHED_MODELS = {
+    PlatformSettings: 'platform_settings',
+    RouletteSettings: 'roulette_settings',
+    RoulettePrize: 'roulette_settings',
+    PlatformBankDetails: 'platform_bank_details',
+    Level: 'levels',
+    WithdrawalPolicy: 'withdrawal_policy',
+}
+
+
+def invalidate_cached_model(sender, **kwargs):
+    invalidate(CACHED_MODELS[sender])
+
+
+for _model in CACHED_MODELS:
+    post_save.connect(invalidate_cached_model, sender=_model, dispatch_uid=f'core.cache.save.{_model.__name__}')
+    post_delete.connect(invalidate_cached_model, sender=_model, dispatch_uid=f'core.cache.delete.{_model.__name__}')
@@ -0,0 +1,38 @@
+"""
+Verificações de configuração (manage.py check / início do servidor).
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+from django.core.files.storage import FileSystemStorage, default_storage
+
+
+@register()
+def user_snapshot_cache_is_shared(app_configs, **kwargs):
+    """O retrato do usuário em cache (core.user_cache) exige um cache compartilhado entre processos."""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.USER_SNAPSHOT_CACHE and backend.endswith(('LocMemCache', 'DummyCache')) and not settings.DEBUG:
+        return [Error(
+            'USER_SNAPSHOT_CACHE está ligado com um cache local a cada processo.',
+            hint=(
+                'Os saldos alterados pelo worker e pelo processamento de comprovativos ficariam '
+                'desatualizados nos processos web. Use um cache compartilhado (CACHE_BACKEND) '
+                'ou desligue USER_SNAPSHOT_CACHE.'
+            ),
+            id='core.E001',
+        )]
+    return []
+
+
+@register()
+def media_is_not_on_ephemeral_disk(app_configs, **kwargs):
+    """No Render o disco é temporário: a mídia (comprovativos) precisa de um bucket."""
+    if settings.RENDER_EXTERNAL_HOSTNAME and isinstance(default_storage, FileSystemStorage):
+        return [Warning(
+            'A mídia (comprovativos de depósito) está sendo gravada no disco local do Render.',
+            hint=(
+                'O disco é apagado a cada deploy. Defina AWS_STORAGE_BUCKET_NAME e as credenciais '
+                'AWS_* para usar core.storage.ContentAddressedS3Storage.'
+            ),
+            id='core.W001',
+        )]
+    return []
@@ -0,0 +1,60 @@
+"""
+Aprovação de depósitos em lote (Admin e endpoint JSON da equipe).
+
+Os depósitos pendentes são bloqueados com select_for_update(skip_locked):
+dois membros da equipe aprovando ao mesmo tempo nunca creditam o mesmo
+depósito duas vezes. Os saldos são creditados com um UPDATE por valor
+distinto (core.ledger.apply_bulk), e os totais de depósitos aprovados com
+UPDATEs agregados por usuário.
+"""
+from django.db import transaction
+
+from .income import add_approved_deposits
+from .ledger import ZERO, apply_bulk
+from .models import Deposit, LedgerEntry
+from .notifications import deposit_event, notify
+
+
+# Resultado por depósito no relatório de approve_deposits
+RESULT_APPROVED = 'approved'
+RESULT_ALREADY_APPROVED = 'already_approved'
+RESULT_LOCKED = 'locked'  # Sendo aprovado por outra pessoa neste momento
+RESULT_NOT_FOUND = 'not_found'
+
+
+def approve_deposits(deposit_ids):
+    """
+    Aprova os depósitos 'deposit_ids' numa única transação.
+    Retorna {deposit_id: resultado} com um dos RESULT_* acima.
+    """
+    deposit_ids = set(deposit_ids)
+    with transaction.atomic():
+        rows = list(
+            Deposit.objects.filter(id__in=deposit_ids, is_approved=False)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by()
+            .values_list('id', 'user_id', 'amount')
+        )
+        if rows:
+            Deposit.objects.filter(id__in=[row[0] for row in rows]).update(is_approved=True)
+            apply_bulk([
+                (user_id, LedgerEntry.REASON_DEPOSIT, amount, ZERO, Deposit(pk=deposit_id))
+                for deposit_id, user_id, amount in rows
+            ])
+
+            totals = {}
+            for _, user_id, amount in rows:
+                totals[user_id] = totals.get(user_id, ZERO) + amount
+            add_approved_deposits(totals)
+            notify((user_id, deposit_event(deposit_id, True)) for deposit_id, user_id, _ in rows)
+
+    report = {deposit_id: RESULT_APPROVED for deposit_id, _, _ in rows}
+    others = deposit_ids - report.keys()
+    if others:
+        existing = dict(Deposit.objects.filter(id__in=others).values_list('id', 'is_approved'))
+        for deposit_id in others:
+            if deposit_id not in existing:
+                report[deposit_id] = RESULT_NOT_FOUND
+            else:
+                report[deposit_id] = RESULT_ALREADY_APPROVED if existing[deposit_id] else RESULT_LOCKED
+    return report
@@ -1,6 +1,10 @@
 from django import forms
+from django.conf import settings
 from .models import CustomUser, Deposit, BankDetails
 
+# Tamanho máximo do comprovativo enviado (bytes)
+MAX_PROOF_UPLOAD_SIZE = getattr(settings, 'DEPOSIT_PROOF_MAX_UPLOAD_SIZE', 15 * 1024 * 1024)
+
 class RegisterForm(forms.ModelForm):
     password = forms.CharField(label="Senha", widget=forms.PasswordInput)
     confirm_password = forms.CharField(label="Confirme a Senha", widget=forms.PasswordInput)
@@ -26,6 +30,11 @@ class RegisterForm(forms.ModelForm):
         
         return cleaned_data
 
+    def validate_unique(self):
+        # Sem SELECT prévio: o telefone repetido é detectado pela restrição UNIQUE
+        # no INSERT (core.signup.register_user -> PhoneNumberTaken)
+        pass
+
     def save(self, commit=True):
         user = super().save(commit=False)
         user.set_password(self.cleaned_data["password"])
@@ -45,6 +54,12 @@ class DepositForm(forms.ModelForm):
         model = Deposit
         fields = ['amount', 'proof_of_payment']
 
+    def clean_proof_of_payment(self):
+        proof = self.cleaned_data.get('proof_of_payment')
+        if proof and proof.size > MAX_PROOF_UPLOAD_SIZE:
+            raise forms.ValidationError(f'O comprovativo deve ter no máximo {MAX_PROOF_UPLOAD_SIZE // (1024 * 1024)} MB.')
+        return proof
+
 class WithdrawalForm(forms.Form):
     amount = forms.DecimalField(max_digits=10, decimal_places=2, label="Valor a Sacar")
 
@@ -0,0 +1,104 @@
+"""
+Histórico de transações do usuário: saques, depósitos, tarefas e giros da
+roleta numa única lista, do mais recente para o mais antigo.
+
+Cada origem é paginada por cursor (core.pagination) sobre o seu índice
+(user, data): por página são lidas no máximo page_size + 1 linhas de cada
+tabela e as listas são intercaladas em memória. A ordem global é
+(data desc, origem, id desc), e o cursor guarda essa posição completa
+(data, origem, id), então empates de data entre tabelas diferentes não
+repetem nem pulam registros. O custo de qualquer página é de uma consulta
+por origem, independentemente da idade da conta.
+"""
+import heapq
+
+from django.db.models import F, Q
+
+from .models import Deposit, Roulette, Task, Withdrawal
+from .pagination import KeysetPage, decode_cursor, encode_cursor
+
+
+STATUS_LABELS = {
+    Withdrawal.STATUS_PENDING: 'Pendente',
+    Withdrawal.STATUS_APPROVED: 'Aprovado',
+    Withdrawal.STATUS_REJECTED: 'Rejeitado',
+}
+
+
+def _withdrawal(row):
+    return -row['amount'], STATUS_LABELS.get(row['status'], row['status'])
+
+
+def _deposit(row):
+    return row['amount'], 'Aprovado' if row['is_approved'] else 'Pendente'
+
+
+def _task(row):
+    return row['earnings'], 'Concluída'
+
+
+def _roulette(row):
+    return row['prize'], 'Aprovado' if row['is_approved'] else 'Pendente'
+
+
+# (tipo, rótulo, modelo, campo de data, colunas lidas, valor com sinal e status)
+# A posição na lista desempata registros de tabelas diferentes com a mesma data.
+SOURCES = (
+    ('withdrawal', 'Levantamento', Withdrawal, 'created_at', ('amount', 'status'), _withdrawal),
+    ('deposit', 'Depósito', Deposit, 'created_at', ('amount', 'is_approved'), _deposit),
+    ('task', 'Tarefa', Task, 'completed_at', ('earnings',), _task),
+    ('roulette', 'Roleta', Roulette, 'spin_date', ('prize', 'is_approved'), _roulette),
+)
+HISTORY_TYPES = tuple(source[0] for source in SOURCES)
+TYPE_LABELS = {source[0]: source[1] for source in SOURCES}
+
+HISTORY_PAGE_SIZE = 20
+
+
+def _after_cursor(field, rank, cursor):
+    """Filtro das linhas da origem 'rank' que vêm depois de 'cursor' na ordem global."""
+    timestamp, cursor_rank, pk = cursor
+    if rank > cursor_rank:
+        return Q(**{f'{field}__lte': timestamp})
+    if rank == cursor_rank:
+        return Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk})
+    return Q(**{f'{field}__lt': timestamp})
+
+
+def _source_entries(user_id, rank, cursor, limit):
+    kind, label, model, field, columns, describe = SOURCES[rank]
+    queryset = model.objects.filter(user_id=user_id)
+    if cursor:
+        queryset = queryset.filter(_after_cursor(field, rank, cursor))
+    rows = queryset.order_by(f'-{field}', '-pk').values('id', *columns, timestamp=F(field))[:limit]
+    for row in rows:
+        amount, status = describe(row)
+        yield {
+            'type': kind, 'label': label, 'id': row['id'], 'rank': rank,
+            'timestamp': row['timestamp'], 'amount': amount, 'status': status,
+        }
+
+
+def _sort_key(entry):
+    # Usada em ordem decrescente: data desc, origem asc, id desc
+    return entry['timestamp'], -entry['rank'], entry['id']
+
+
+def history_page(user_id, cursor=None, page_size=HISTORY_PAGE_SIZE, types=None):
+    """
+    Página do histórico de 'user_id' depois de 'cursor' (None = início),
+    opcionalmente restrita aos tipos 'types'. Levanta InvalidCursor.
+    """
+    position = decode_cursor(cursor, size=3) if cursor else None
+    ranks = [rank for rank, source in enumerate(SOURCES) if not types or source[0] in types]
+    streams = [list(_source_entries(user_id, rank, position, page_size + 1)) for rank in ranks]
+    merged = list(heapq.merge(*streams, key=_sort_key, reverse=True))
+
+    entries = merged[:page_size]
+    next_cursor = None
+    if len(merged) > page_size:
+        last = entries[-1]
+        next_cursor = encode_cursor(last['timestamp'], last['rank'], last['id'])
+    for entry in entries:
+        del entry['rank']
+    return KeysetPage(entries, next_cursor)
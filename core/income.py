@@ -0,0 +1,234 @@
+"""
+Manutenção do resumo de rendimentos (UserIncomeSummary).
+
+Os contadores são atualizados com UPDATEs incrementais (F()) sempre que um
+depósito/saque é aprovado ou um ganho de tarefa é registrado, de modo que
+as páginas Renda e Perfil leem uma única linha.
+"""
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import CustomUser, Deposit, Task, UserIncomeSummary, Withdrawal
+from .task_archive import lifetime_task_earnings
+
+
+ZERO = Decimal('0.00')
+
+
+def _ensure_summaries(user_ids):
+    UserIncomeSummary.objects.bulk_create(
+        [UserIncomeSummary(user_id=user_id) for user_id in set(user_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def create_income_summaries(user_ids):
+    """Cria os resumos vazios que ainda não existem (ex.: logo após o cadastro)."""
+    _ensure_summaries(user_ids)
+
+
+def add_approved_deposit(user_id, amount):
+    """Soma 'amount' (negativo = estorno) ao total de depósitos aprovados."""
+    _ensure_summaries([user_id])
+    UserIncomeSummary.objects.filter(user_id=user_id).update(
+        approved_deposit_total=F('approved_deposit_total') + amount
+    )
+
+
+def add_approved_withdrawal(user_id, amount):
+    """Soma 'amount' (negativo = estorno) ao total de saques aprovados."""
+    _ensure_summaries([user_id])
+    UserIncomeSummary.objects.filter(user_id=user_id).update(
+        approved_withdrawal_total=F('approved_withdrawal_total') + amount
+    )
+
+
+def _add_totals(field, amounts_by_user):
+    if not amounts_by_user:
+        return
+    _ensure_summaries(amounts_by_user.keys())
+
+    users_by_amount = {}
+    for user_id, amount in amounts_by_user.items():
+        users_by_amount.setdefault(Decimal(amount), []).append(user_id)
+    for amount, user_ids in users_by_amount.items():
+        UserIncomeSummary.objects.filter(user_id__in=user_ids).update(**{field: F(field) + amount})
+
+
+def add_approved_deposits(amounts_by_user):
+    """Versão em lote de add_approved_deposit: 'amounts_by_user' é {user_id: valor}."""
+    _add_totals('approved_deposit_total', amounts_by_user)
+
+
+def add_approved_withdrawals(amounts_by_user):
+    """Versão em lote de add_approved_withdrawal: 'amounts_by_user' é {user_id: valor}."""
+    _add_totals('approved_withdrawal_total', amounts_by_user)
+
+
+def add_task_earnings(earnings_by_user, day=None):
+    """
+    Registra ganhos de tarefas. 'earnings_by_user' é {user_id: valor}.
+    O contador do dia é reiniciado quando 'today_date' é de um dia anterior.
+    Usuários com o mesmo valor são atualizados num único UPDATE.
+    """
+    if not earnings_by_user:
+        return
+    day = day or timezone.localdate()
+    _ensure_summaries(earnings_by_user.keys())
+
+    users_by_amount = {}
+    for user_id, amount in earnings_by_user.items():
+        users_by_amount.setdefault(Decimal(amount), []).append(user_id)
+    for amount, user_ids in users_by_amount.items():
+        UserIncomeSummary.objects.filter(user_id__in=user_ids).update(
+            task_earnings_total=F('task_earnings_total') + amount,
+            today_task_earnings=Case(
+                When(today_date=day, then=F('today_task_earnings') + amount),
+                default=Value(amount),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            today_date=day,
+        )
+
+
+def get_income_summary(user):
+    """
+    Retorna o UserIncomeSummary de 'user' (criando-o vazio se necessário),
+    com 'today_task_earnings' zerado se o contador for de outro dia.
+    """
+    summary, _ = UserIncomeSummary.objects.get_or_create(user=user)
+    if summary.today_date != timezone.localdate():
+        summary.today_task_earnings = ZERO
+    return summary
+
+
+def rebuild_income_summaries(user_ids=None, batch_size=1000):
+    """
+    Recalcula os resumos a partir das tabelas originais (Deposit, Withdrawal, Task
+    e os meses arquivados em TaskMonthlySummary),
+    em blocos de 'batch_size' usuários. Retorna a quantidade de resumos que
+    estavam divergentes.
+    """
+    users = CustomUser.objects.order_by('id')
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    all_ids = list(users.values_list('id', flat=True))
+
+    changed = 0
+    for start in range(0, len(all_ids), batch_size):
+        changed += _rebuild_chunk(all_ids[start:start + batch_size])
+    return changed
+
+
+def _rebuild_chunk(user_ids):
+    today = timezone.localdate()
+    start_of_today = timezone.make_aware(datetime.combine(today, time.min))
+
+    def totals(queryset, field):
+        rows = queryset.filter(user_id__in=user_ids).order_by().values('user_id').annotate(total=Sum(field))
+        return {row['user_id']: row['total'] or ZERO for row in rows}
+
+    deposits = totals(Deposit.objects.filter(is_approved=True), 'amount')
+    withdrawals = totals(Withdrawal.objects.filter(status=Withdrawal.STATUS_APPROVED), 'amount')
+    # Meses arquivados (TaskMonthlySummary) + tarefas ainda na tabela
+    tasks = lifetime_task_earnings(user_ids)
+    tasks_today = totals(Task.objects.filter(completed_at__gte=start_of_today), 'earnings')
+
+    _ensure_summaries(user_ids)
+    existing = UserIncomeSummary.objects.in_bulk(user_ids)
+
+    changed = []
+    for user_id in user_ids:
+        summary = existing[user_id]
+        expected = (
+            deposits.get(user_id, ZERO),
+            withdrawals.get(user_id, ZERO),
+            tasks.get(user_id, ZERO),
+            tasks_today.get(user_id, ZERO),
+        )
+        today_value = summary.today_task_earnings if summary.today_date == today else ZERO
+        current = (
+            summary.approved_deposit_total,
+            summary.approved_withdrawal_total,
+            summary.task_earnings_total,
+            today_value,
+        )
+        if current != expected or summary.today_date != today:
+            (summary.approved_deposit_total, summary.approved_withdrawal_total,
+             summary.task_earnings_total, summary.today_task_earnings) = expected
+            summary.today_date = today
+            changed.append(summary)
+
+    UserIncomeSummary.objects.bulk_update(
+        changed,
+        ['approved_deposit_total', 'approved_withdrawal_total', 'task_earnings_total', 'today_task_earnings', 'today_date'],
+    )
+    return len(changed)
+
+
+# --- SINAIS: alterações feitas por save() (views, Admin) ---
+# Operações em lote (QuerySet.update/bulk_create) chamam as funções acima diretamente.
+
+# Campo que indica a aprovação em cada modelo acompanhado
+_APPROVAL_FIELDS = {Deposit: 'is_approved', Withdrawal: 'status'}
+
+
+def _remember_previous_state(sender, instance, **kwargs):
+    instance._income_previous = None
+    if instance.pk:
+        instance._income_previous = sender.objects.filter(pk=instance.pk).values(_APPROVAL_FIELDS[sender], 'amount').first()
+
+
+def _deposit_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_income_previous', None)
+    was_approved = bool(previous and previous['is_approved'])
+    previous_amount = previous['amount'] if previous else ZERO
+    if was_approved or instance.is_approved:
+        delta = (instance.amount if instance.is_approved else ZERO) - (previous_amount if was_approved else ZERO)
+        if delta:
+            add_approved_deposit(instance.user_id, delta)
+
+
+def _withdrawal_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_income_previous', None)
+    was_approved = bool(previous and previous['status'] == Withdrawal.STATUS_APPROVED)
+    is_approved = instance.status == Withdrawal.STATUS_APPROVED
+    previous_amount = previous['amount'] if previous else ZERO
+    if was_approved or is_approved:
+        delta = (instance.amount if is_approved else ZERO) - (previous_amount if was_approved else ZERO)
+        if delta:
+            add_approved_withdrawal(instance.user_id, delta)
+
+
+def _task_saved(sender, instance, created, **kwargs):
+    if created:
+        add_task_earnings({instance.user_id: instance.earnings})
+
+
+# Na exclusão não se cria um resumo novo (o usuário pode estar sendo excluído em cascata)
+
+def _deposit_deleted(sender, instance, **kwargs):
+    if instance.is_approved:
+        UserIncomeSummary.objects.filter(user_id=instance.user_id).update(
+            approved_deposit_total=F('approved_deposit_total') - instance.amount
+        )
+
+
+def _withdrawal_deleted(sender, instance, **kwargs):
+    if instance.status == Withdrawal.STATUS_APPROVED:
+        UserIncomeSummary.objects.filter(user_id=instance.user_id).update(
+            approved_withdrawal_total=F('approved_withdrawal_total') - instance.amount
+        )
+
+
+pre_save.connect(_remember_previous_state, sender=Deposit, dispatch_uid='core.income.deposit_pre')
+pre_save.connect(_remember_previous_state, sender=Withdrawal, dispatch_uid='core.income.withdrawal_pre')
+post_save.connect(_deposit_saved, sender=Deposit, dispatch_uid='core.income.deposit_post')
+post_save.connect(_withdrawal_saved, sender=Withdrawal, dispatch_uid='core.income.withdrawal_post')
+post_save.connect(_task_saved, sender=Task, dispatch_uid='core.income.task_post')
+post_delete.connect(_deposit_deleted, sender=Deposit, dispatch_uid='core.income.deposit_delete')
+post_delete.connect(_withdrawal_deleted, sender=Withdrawal, dispatch_uid='core.income.withdrawal_delete')
@@ -0,0 +1,40 @@
+"""
+Códigos de convite.
+
+Os códigos são sorteados (módulo secrets) num alfabeto de 31 símbolos sem
+caracteres ambíguos (0/o, 1/i/l): com 8 símbolos são ~8,5 * 10^11
+combinações, de modo que uma colisão é raríssima. Em vez de consultar o
+banco antes de cada cadastro (consulta extra e ainda sujeita a corrida
+entre a verificação e o INSERT), quem garante a unicidade é a restrição
+UNIQUE da coluna: se o INSERT falhar por causa do código, um novo código é
+sorteado e o INSERT é repetido (CustomUser.save e
+CustomUserQuerySet.bulk_create, em core.models).
+"""
+import secrets
+
+
+ALPHABET = '23456789abcdefghjkmnpqrstuvwxyz'
+CODE_LENGTH = 8
+
+# Tentativas de INSERT antes de desistir (só falham todas se algo estiver errado)
+MAX_ATTEMPTS = 5
+
+
+def generate_invite_code():
+    return ''.join(secrets.choice(ALPHABET) for _ in range(CODE_LENGTH))
+
+
+def generate_invite_codes(count, exclude=()):
+    """'count' códigos distintos entre si e diferentes dos de 'exclude'."""
+    exclude = set(exclude)
+    codes = set()
+    while len(codes) < count:
+        code = generate_invite_code()
+        if code not in exclude:
+            codes.add(code)
+    return list(codes)
+
+
+def is_invite_code_conflict(error):
+    """True se o IntegrityError foi causado pela restrição UNIQUE de invite_code."""
+    return 'invite_code' in str(error)
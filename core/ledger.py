@@ -0,0 +1,128 @@
+"""
+Serviço de saldos.
+
+Toda alteração de 'available_balance'/'subsidy_balance' passa por aqui: o
+saldo é alterado com um único UPDATE atômico (coluna = coluna + valor),
+sem ler-modificar-gravar em Python, e cada alteração gera uma LedgerEntry.
+O usuário em cache (core.user_cache) é invalidado a cada alteração, e o
+novo saldo é enviado às páginas abertas (core.notifications).
+"""
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+
+from .models import CustomUser, LedgerEntry
+from .notifications import notify_balance
+from .user_cache import invalidate_users
+
+
+ZERO = Decimal('0.00')
+
+
+class LedgerConditionFailed(Exception):
+    """O UPDATE condicional não alterou nenhuma linha (a condição 'guard' falhou)."""
+
+
+class InsufficientBalance(LedgerConditionFailed):
+    """O saldo disponível não cobre o débito solicitado."""
+
+
+def _source_fields(source):
+    if source is None:
+        return {'source_type': None, 'source_id': None}
+    return {'source_type': ContentType.objects.get_for_model(source), 'source_id': source.pk}
+
+
+def apply_change(user, reason, amount=ZERO, subsidy_amount=ZERO, source=None, require_funds=False,
+                 guard=None, extra_updates=None):
+    """
+    Aplica uma variação aos saldos de 'user' e registra a LedgerEntry.
+
+    'amount' altera o saldo disponível e 'subsidy_amount' o saldo de
+    subsídios (valores negativos = débito). Com 'require_funds', o UPDATE só
+    acontece se o saldo disponível cobrir o débito; caso contrário levanta
+    InsufficientBalance, sem efeito colateral.
+
+    'guard' (filtros extras, ex.: {'roulette_spins__gt': 0}) e 'extra_updates'
+    (outras colunas, ex.: {'roulette_spins': F('roulette_spins') - 1}) entram
+    no mesmo UPDATE; se o guard falhar levanta LedgerConditionFailed. As
+    colunas de 'extra_updates' não são atualizadas na instância em memória.
+    """
+    amount = Decimal(amount)
+    subsidy_amount = Decimal(subsidy_amount)
+
+    with transaction.atomic():
+        balances = CustomUser.objects.filter(pk=user.pk)
+        if require_funds and amount < 0:
+            balances = balances.filter(available_balance__gte=-amount)
+        if guard:
+            balances = balances.filter(**guard)
+
+        updated = balances.update(
+            available_balance=F('available_balance') + amount,
+            subsidy_balance=F('subsidy_balance') + subsidy_amount,
+            **(extra_updates or {})
+        )
+        if not updated:
+            raise InsufficientBalance() if require_funds else LedgerConditionFailed()
+        invalidate_users([user.pk])
+        notify_balance([user.pk])
+
+        entry = LedgerEntry.objects.create(
+            user=user, reason=reason, amount=amount, subsidy_amount=subsidy_amount,
+            **_source_fields(source)
+        )
+
+    # Mantém a instância em memória coerente sem uma nova consulta
+    user.available_balance = Decimal(user.available_balance) + amount
+    user.subsidy_balance = Decimal(user.subsidy_balance) + subsidy_amount
+    return entry
+
+
+def credit(user, amount, reason, source=None, subsidy=False, **kwargs):
+    """Credita 'amount' no saldo disponível (e também nos subsídios, se 'subsidy')."""
+    return apply_change(
+        user, reason, amount=amount, subsidy_amount=amount if subsidy else ZERO, source=source, **kwargs
+    )
+
+
+def debit(user, amount, reason, source=None):
+    """Debita 'amount' do saldo disponível; levanta InsufficientBalance se não houver saldo."""
+    return apply_change(user, reason, amount=-Decimal(amount), source=source, require_funds=True)
+
+
+def apply_bulk(changes):
+    """
+    Versão em lote de apply_change, para créditos de muitos usuários.
+
+    'changes' é uma lista de tuplas (user_id, reason, amount, subsidy_amount, source).
+    As variações são somadas por usuário e os usuários com a mesma variação
+    total são atualizados num único UPDATE. As entradas são gravadas com
+    bulk_create. Deve ser chamada dentro de uma transação.
+    """
+    totals = {}
+    entries = []
+    for user_id, reason, amount, subsidy_amount, source in changes:
+        amount = Decimal(amount)
+        subsidy_amount = Decimal(subsidy_amount)
+        current = totals.get(user_id, (ZERO, ZERO))
+        totals[user_id] = (current[0] + amount, current[1] + subsidy_amount)
+        entries.append(LedgerEntry(
+            user_id=user_id, reason=reason, amount=amount, subsidy_amount=subsidy_amount,
+            **_source_fields(source)
+        ))
+
+    users_by_delta = {}
+    for user_id, delta in totals.items():
+        users_by_delta.setdefault(delta, []).append(user_id)
+    for (amount, subsidy_amount), user_ids in users_by_delta.items():
+        CustomUser.objects.filter(id__in=user_ids).update(
+            available_balance=F('available_balance') + amount,
+            subsidy_balance=F('subsidy_balance') + subsidy_amount,
+        )
+    invalidate_users(totals.keys())
+    notify_balance(totals.keys())
+
+    return LedgerEntry.objects.bulk_create(entries)
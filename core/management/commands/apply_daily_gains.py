@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.accrual import DEFAULT_CHUNK_SIZE, apply_due_daily_gains
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica em lote os ganhos diários de todos os níveis ativos cujo ciclo de 24h terminou. "
+        "Pode ser executado várias vezes sem duplicar ganhos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Quantidade de níveis processados por transação.'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Se maior que zero, repete a execução a cada N segundos (modo worker).'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        interval = options['interval']
+
+        while True:
+            applied, total = apply_due_daily_gains(chunk_size=chunk_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'{applied} ganho(s) diário(s) aplicado(s), total de {total} KZ.'
+            ))
+            if interval <= 0:
+                break
+            time.sleep(interval)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.task_archive import KEEP_MONTHS, archive_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Arquiva as tarefas dos meses antigos: soma as linhas de cada usuário em "
+        "TaskMonthlySummary e as remove (no PostgreSQL, descarta a partição do mês). "
+        "Os ganhos totais não mudam. Pode ser executado várias vezes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=KEEP_MONTHS,
+            help='Meses mais recentes mantidos linha a linha, incluindo o atual (mínimo 1).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Quantidade de resumos gravados por bloco.'
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_tasks(keep_months=options['keep_months'], batch_size=options['batch_size'])
+        for month, rows in archived:
+            self.stdout.write(f'{month:%m/%Y}: {rows} tarefa(s) arquivada(s).')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(rows for _, rows in archived)} tarefa(s) arquivada(s) em {len(archived)} mês(es).'
+        ))
@@ -0,0 +1,157 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client
+from django.urls import reverse
+
+from core.models import CustomUser
+from core.user_cache import invalidate_users
+
+
+# (nome, método, nome da URL, requer equipe)
+SCENARIOS = [
+    ('menu', 'get', 'menu', False),
+    ('tarefa', 'get', 'tarefa', False),
+    ('equipa', 'get', 'equipa', False),
+    ('renda', 'get', 'renda', False),
+    ('saque', 'get', 'saque', False),
+    ('spin_roulette', 'post', 'spin_roulette', False),
+    ('admin_users', 'get', 'admin:core_customuser_changelist', True),
+    ('admin_deposits', 'get', 'admin:core_deposit_changelist', True),
+    ('admin_withdrawals', 'get', 'admin:core_withdrawal_changelist', True),
+    ('admin_tasks', 'get', 'admin:core_task_changelist', True),
+]
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede vazão e latência das principais páginas através do handler WSGI do Django "
+        "(django.test.Client), usando usuários existentes (ver 'seed_synthetic_data'). "
+        "Gera um relatório JSON para comparar commits. Não execute em produção: "
+        "o cenário spin_roulette grava dados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requisições por cenário.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Threads simultâneas por cenário.')
+        parser.add_argument('--sample-users', type=int, default=50, help='Usuários sorteados para as requisições.')
+        parser.add_argument('--scenario', action='append', help='Executa apenas o(s) cenário(s) indicado(s).')
+        parser.add_argument('--output', help='Arquivo onde gravar o relatório JSON (padrão: saída padrão).')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do sorteio de usuários.')
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options['scenario']:
+            scenarios = [s for s in SCENARIOS if s[0] in options['scenario']]
+            if not scenarios:
+                raise CommandError(f"Cenários disponíveis: {', '.join(s[0] for s in SCENARIOS)}")
+
+        rng = random.Random(options['seed'])
+        user_ids = list(CustomUser.objects.filter(is_staff=False).values_list('id', flat=True)[:options['sample_users'] * 20])
+        if not user_ids:
+            raise CommandError('Nenhum usuário encontrado. Execute primeiro o comando seed_synthetic_data.')
+        users = list(CustomUser.objects.filter(id__in=rng.sample(user_ids, min(options['sample_users'], len(user_ids)))))
+        staff = CustomUser.objects.filter(is_staff=True, is_superuser=True).first()
+
+        report = {
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'git_revision': _git_revision(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'total_users': CustomUser.objects.count(),
+            'requests_per_scenario': options['requests'],
+            'concurrency': options['concurrency'],
+            'scenarios': {},
+        }
+
+        for name, method, url_name, needs_staff in scenarios:
+            if needs_staff and staff is None:
+                self.stderr.write(f'{name}: ignorado (nenhum superusuário).')
+                continue
+            result = self._run_scenario(
+                method, reverse(url_name), [staff] if needs_staff else users,
+                options['requests'], options['concurrency'],
+            )
+            report['scenarios'][name] = result
+            self.stderr.write(
+                f"{name}: {result['throughput_rps']} req/s, p50 {result['latency_ms']['p50']} ms, "
+                f"p95 {result['latency_ms']['p95']} ms, {result['queries']['p50']} consultas (p50)"
+            )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+        else:
+            self.stdout.write(output)
+
+    def _run_scenario(self, method, path, users, total_requests, concurrency):
+        latencies, queries, statuses = [], [], {}
+        lock = threading.Lock()
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h and h != '*'), 'localhost')
+
+        def worker(count, worker_index):
+            # Um cliente (sessão) por usuário, autenticado antes da medição
+            clients = {}
+            for n in range(count):
+                user = users[(worker_index + n * concurrency) % len(users)]
+                client = clients.get(user.pk)
+                if client is None:
+                    if method == 'post':
+                        CustomUser.objects.filter(pk=user.pk).update(roulette_spins=total_requests)
+                        invalidate_users([user.pk])
+                    client = clients[user.pk] = Client(HTTP_HOST=host)
+                    client.force_login(user)
+                started = time.perf_counter()
+                response = getattr(client, method)(path)
+                elapsed = time.perf_counter() - started
+                metrics = getattr(response, 'request_metrics', None) or {}
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(metrics.get('queries', 0))
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            close_old_connections()
+
+        per_worker = [total_requests // concurrency + (1 if i < total_requests % concurrency else 0) for i in range(concurrency)]
+        threads = [threading.Thread(target=worker, args=(count, i)) for i, count in enumerate(per_worker)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        return {
+            'requests': len(latencies),
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+            'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+            'latency_ms': {
+                'mean': round(statistics.mean(latencies) * 1000, 2),
+                'p50': round(_percentile(latencies, 50) * 1000, 2),
+                'p95': round(_percentile(latencies, 95) * 1000, 2),
+                'p99': round(_percentile(latencies, 99) * 1000, 2),
+            },
+            'queries': {'p50': _percentile(queries, 50), 'max': max(queries)},
+        }
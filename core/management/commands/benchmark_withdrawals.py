@@ -0,0 +1,128 @@
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+
+from core.ledger import InsufficientBalance, credit
+from core.models import CustomUser, LedgerEntry, WithdrawalDailyCounter, WithdrawalPolicy
+from core.withdrawal_policy import WithdrawalDenied, day_bounds, daily_usage, request_withdrawal
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o caminho de validação de saques (core.withdrawal_policy) com envios "
+        "simultâneos dos mesmos usuários e confere que nenhum ultrapassou o limite diário. "
+        "Não execute em produção: credita saldo e cria saques nos usuários sorteados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Usuários sorteados.')
+        parser.add_argument('--attempts', type=int, default=10, help='Envios por usuário.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Threads simultâneas.')
+        parser.add_argument('--max-per-day', type=int, default=1, help='Limite diário da política usada no teste.')
+        parser.add_argument('--amount', type=Decimal, default=Decimal('2000'), help='Valor de cada saque.')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do sorteio de usuários.')
+        parser.add_argument('--output', help='Arquivo onde gravar o relatório JSON (padrão: saída padrão).')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user_ids = list(CustomUser.objects.filter(is_staff=False).values_list('id', flat=True)[:options['users'] * 20])
+        if not user_ids:
+            raise CommandError('Nenhum usuário encontrado. Execute primeiro o comando seed_synthetic_data.')
+        users = list(CustomUser.objects.filter(id__in=rng.sample(user_ids, min(options['users'], len(user_ids)))))
+
+        # Política sem restrição de horário (o benchmark pode rodar a qualquer hora)
+        policy = WithdrawalPolicy(
+            min_amount=options['amount'], window_start=dt_time.min, window_end=dt_time.max,
+            max_per_day=options['max_per_day'],
+        )
+        amount = options['amount']
+        for user in users:
+            credit(user, amount * options['attempts'], LedgerEntry.REASON_ADJUSTMENT)
+        before = {user.pk: daily_usage(user.pk)[0] for user in users}
+
+        tasks = [user for user in users for _ in range(options['attempts'])]
+        rng.shuffle(tasks)
+        latencies, outcomes = [], {}
+        lock = threading.Lock()
+
+        def worker(chunk):
+            for user in chunk:
+                # Cópia por envio: cada requisição carrega o próprio usuário
+                user = CustomUser(pk=user.pk, available_balance=amount)
+                started = time.perf_counter()
+                try:
+                    request_withdrawal(user, amount, policy=policy)
+                    outcome = 'accepted'
+                except WithdrawalDenied:
+                    outcome = 'denied'
+                except InsufficientBalance:
+                    outcome = 'insufficient_balance'
+                except OperationalError:
+                    outcome = 'database_busy'  # SQLite: escrita concorrente bloqueada
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            close_old_connections()
+
+        concurrency = max(1, options['concurrency'])
+        threads = [threading.Thread(target=worker, args=(tasks[i::concurrency],)) for i in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        # Nenhum usuário pode ter mais saques no dia do que o limite (nem divergir do contador)
+        day = day_bounds()[0]
+        counters = dict(WithdrawalDailyCounter.objects.filter(user__in=users, day=day).values_list('user_id', 'count'))
+        violations = []
+        for user in users:
+            count = daily_usage(user.pk)[0]
+            if count > max(options['max_per_day'], before[user.pk]) or counters.get(user.pk, count) != count:
+                violations.append({'user_id': user.pk, 'withdrawals': count, 'counter': counters.get(user.pk)})
+
+        report = {
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'users': len(users),
+            'submits': len(latencies),
+            'concurrency': concurrency,
+            'max_per_day': options['max_per_day'],
+            'outcomes': dict(sorted(outcomes.items())),
+            'throughput_per_s': round(len(latencies) / wall, 2) if wall else None,
+            'latency_ms': {
+                'mean': round(statistics.mean(latencies) * 1000, 2),
+                'p50': round(_percentile(latencies, 50) * 1000, 2),
+                'p95': round(_percentile(latencies, 95) * 1000, 2),
+                'p99': round(_percentile(latencies, 99) * 1000, 2),
+            },
+            'limit_violations': violations,
+        }
+        self.stderr.write(
+            f"{report['throughput_per_s']} envios/s, p50 {report['latency_ms']['p50']} ms, "
+            f"p95 {report['latency_ms']['p95']} ms, {report['outcomes']}, violações: {len(violations)}"
+        )
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output)
+        else:
+            self.stdout.write(output)
+        if violations:
+            raise CommandError('Limite diário ultrapassado em envios simultâneos.')
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.media_cleanup import GRACE, purge_unreferenced_media
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove a mídia endereçada pelo conteúdo que nenhum registro usa mais "
+        "(ex.: originais de comprovativos já recodificados). Arquivos recentes são mantidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=int, default=int(GRACE.total_seconds() // 3600),
+            help='Arquivos gravados há menos horas que isso nunca são removidos.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas lista os arquivos que seriam removidos.'
+        )
+
+    def handle(self, *args, **options):
+        removed = purge_unreferenced_media(grace=timedelta(hours=options['grace_hours']), dry_run=options['dry_run'])
+        for name in removed:
+            self.stdout.write(name)
+        verb = 'seriam removido(s)' if options['dry_run'] else 'removido(s)'
+        self.stdout.write(self.style.SUCCESS(f'{len(removed)} arquivo(s) {verb}.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.task_archive import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "PostgreSQL: cria as partições mensais da tabela de tarefas (core_task) até N meses "
+        "à frente, movendo para elas as linhas que estiverem na partição DEFAULT. "
+        "Execute mensalmente (cron). Em outros bancos não faz nada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=2,
+            help='Quantidade de meses futuros com partição já criada.'
+        )
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write('A tabela de tarefas não é particionada neste banco (apenas PostgreSQL); nada a fazer.')
+            return
+
+        created = ensure_partitions(months_ahead=max(options['months_ahead'], 0))
+        for month, moved in created:
+            self.stdout.write(f'Partição {month:%m/%Y} criada ({moved} linha(s) movida(s) da DEFAULT).')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partição(ões) criada(s).'))
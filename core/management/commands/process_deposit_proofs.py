@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.proofs import process_pending_proofs, requeue_stuck_proofs
+
+
+class Command(BaseCommand):
+    help = (
+        "Processa os comprovativos de depósito pendentes: remove metadados, limita o tamanho "
+        "da imagem e gera a miniatura usada pelo Admin. Seguro para vários workers ao mesmo tempo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Comprovativos processados por rodada.')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Se maior que zero, repete a execução a cada N segundos (modo worker).'
+        )
+        parser.add_argument(
+            '--requeue', action='store_true',
+            help="Antes de começar, devolve à fila os comprovativos presos em 'processing'."
+        )
+        parser.add_argument('--retry-failed', action='store_true', help='Também devolve à fila os que falharam.')
+
+    def handle(self, *args, **options):
+        if options['requeue'] or options['retry_failed']:
+            requeued = requeue_stuck_proofs(include_failed=options['retry_failed'])
+            self.stdout.write(f'{requeued} comprovativo(s) devolvido(s) à fila.')
+
+        while True:
+            results = process_pending_proofs(limit=options['limit'])
+            if results or options['interval'] <= 0:
+                summary = ', '.join(f'{count} {status}' for status, count in sorted(results.items())) or 'nenhum pendente'
+                self.stdout.write(self.style.SUCCESS(f'Comprovativos: {summary}.'))
+            if options['interval'] <= 0:
+                break
+            # Rodada cheia: provavelmente há mais na fila, continua sem esperar
+            if sum(results.values()) < options['limit']:
+                time.sleep(options['interval'])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.income import rebuild_income_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcilia os resumos de rendimentos (UserIncomeSummary) com as tabelas de "
+        "depósitos, saques e tarefas, corrigindo as linhas divergentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Quantidade de usuários processados por bloco.'
+        )
+
+    def handle(self, *args, **options):
+        changed = rebuild_income_summaries(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{changed} resumo(s) corrigido(s).'))
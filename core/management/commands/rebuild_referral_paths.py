@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.referrals import rebuild_referral_paths
+
+
+class Command(BaseCommand):
+    help = "Recalcula o índice da árvore de convites (referral_path/referral_depth) de todos os usuários."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Quantidade de usuários gravados por lote.'
+        )
+
+    def handle(self, *args, **options):
+        changed = rebuild_referral_paths(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{changed} usuário(s) atualizado(s).'))
@@ -0,0 +1,171 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.income import rebuild_income_summaries
+from core.models import CustomUser, Deposit, Level, Roulette, Task, UserLevel, Withdrawal
+
+
+# Catálogo usado quando o banco ainda não tem níveis
+DEFAULT_LEVELS = [
+    ('VIP 1', Decimal('5000'), Decimal('250')),
+    ('VIP 2', Decimal('15000'), Decimal('800')),
+    ('VIP 3', Decimal('40000'), Decimal('2200')),
+    ('VIP 4', Decimal('100000'), Decimal('6000')),
+    ('VIP 5', Decimal('250000'), Decimal('16000')),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos em escala de produção: usuários com árvores de convites, "
+        "níveis e meses de histórico de tarefas, depósitos, saques e roleta. "
+        "Apenas para ambientes de teste/benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Quantidade de usuários a criar.')
+        parser.add_argument('--months', type=int, default=3, help='Meses de histórico por usuário.')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Usuários gravados por lote.')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador aleatório.')
+        parser.add_argument('--investor-ratio', type=float, default=0.6, help='Fração de usuários com nível ativo.')
+        parser.add_argument('--password', default='benchmark123', help='Senha de todos os usuários gerados.')
+        parser.add_argument('--skip-summaries', action='store_true', help='Não reconstruir os resumos de rendimentos.')
+
+    def handle(self, *args, **options):
+        if options['users'] <= 0:
+            raise CommandError('--users deve ser maior que zero.')
+
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.days = max(options['months'], 0) * 30
+        self.password_hash = make_password(options['password'])  # Um único hash para todos
+        self.levels = self._ensure_levels()
+
+        total = options['users']
+        batch_size = options['batch_size']
+        self.offset = (CustomUser.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        # (id, referral_path, referral_depth) dos usuários já criados, para sortear convidadores
+        self.tree = []
+
+        created = 0
+        while created < total:
+            count = min(batch_size, total - created)
+            with transaction.atomic():
+                users = self._create_users(created, count)
+                self._create_history(users, options['investor_ratio'])
+            created += count
+            self.stdout.write(f'{created}/{total} usuários gerados...')
+
+        if not options['skip_summaries']:
+            rebuild_income_summaries()
+        self.stdout.write(self.style.SUCCESS(f'{total} usuário(s) sintético(s) gerado(s).'))
+
+    def _ensure_levels(self):
+        levels = list(Level.objects.all())
+        if levels:
+            return levels
+        return [
+            Level.objects.create(
+                name=name, deposit_value=deposit, daily_gain=gain, monthly_gain=gain * 30,
+                cycle_days=30, image='level_images/placeholder.png'
+            )
+            for name, deposit, gain in DEFAULT_LEVELS
+        ]
+
+    def _pick_inviter(self):
+        # ~15% de raízes; os demais preferem usuários antigos (grandes promotores)
+        if not self.tree or self.rng.random() < 0.15:
+            return None
+        index = int(len(self.tree) * (self.rng.random() ** 3))
+        return self.tree[index]
+
+    def _create_users(self, start, count):
+        users = []
+        for n in range(start, start + count):
+            number = self.offset + n
+            inviter = self._pick_inviter()
+            joined = self.now - timedelta(days=self.rng.randint(0, max(self.days, 1)), seconds=self.rng.randint(0, 86399))
+            users.append(CustomUser(
+                phone_number=f'8{number:09d}',
+                password=self.password_hash,
+                invited_by_id=inviter[0] if inviter else None,
+                referral_path=f'{inviter[1]}{inviter[0]}/' if inviter else '/',
+                referral_depth=inviter[2] + 1 if inviter else 0,
+                date_joined=joined,
+                roulette_spins=self.rng.randint(0, 5),
+            ))
+        users = CustomUser.objects.bulk_create(users)
+        self.tree.extend((user.id, user.referral_path, user.referral_depth) for user in users)
+        return users
+
+    def _create_history(self, users, investor_ratio):
+        # Cada lista guarda (objeto, data desejada), aplicada em _create_with_dates
+        user_levels, tasks, deposits, withdrawals, spins = [], [], [], [], []
+        balances = []
+
+        for user in users:
+            history_days = max((self.now - user.date_joined).days, 0)
+            if self.rng.random() < investor_ratio:
+                level = self.rng.choice(self.levels)
+                purchase_date = user.date_joined + timedelta(hours=1)
+                user_levels.append((UserLevel(user=user, level=level, is_active=True), purchase_date))
+                deposits.append((Deposit(
+                    user=user, amount=level.deposit_value, is_approved=True,
+                    proof_of_payment='deposit_proofs/synthetic.png',
+                ), user.date_joined))
+                # Um ganho diário por dia desde a compra do nível
+                tasks.extend(
+                    (Task(user=user, earnings=level.daily_gain, task_definition=None), purchase_date + timedelta(days=day))
+                    for day in range(1, history_days + 1)
+                )
+                earned = level.daily_gain * history_days
+                for n in range(1, history_days // 15 + 1):
+                    amount = Decimal(self.rng.choice([2000, 3000, 5000]))
+                    withdrawals.append((Withdrawal(
+                        user=user, amount=amount,
+                        status=self.rng.choice([Withdrawal.STATUS_APPROVED, Withdrawal.STATUS_APPROVED, Withdrawal.STATUS_PENDING]),
+                    ), purchase_date + timedelta(days=15 * n)))
+                    earned -= amount
+                balances.append((user, max(earned, Decimal('0'))))
+            elif self.rng.random() < 0.3:
+                deposits.append((Deposit(
+                    user=user, amount=self.rng.choice(self.levels).deposit_value, is_approved=False,
+                    proof_of_payment='deposit_proofs/synthetic.png',
+                ), self.now - timedelta(minutes=self.rng.randint(0, 600))))
+            spins.extend(
+                (Roulette(user=user, prize=Decimal(self.rng.choice([100, 200, 300, 500, 1000])), is_approved=True),
+                 user.date_joined + timedelta(days=self.rng.randint(0, history_days)))
+                for _ in range(self.rng.randint(0, 4))
+            )
+
+        self._create_with_dates(UserLevel, 'purchase_date', user_levels)
+        self._create_with_dates(Deposit, 'created_at', deposits)
+        self._create_with_dates(Withdrawal, 'created_at', withdrawals)
+        self._create_with_dates(Roulette, 'spin_date', spins)
+        self._create_with_dates(Task, 'completed_at', tasks)
+
+        for user, balance in balances:
+            user.available_balance = balance
+            user.level_active = True
+        CustomUser.objects.bulk_update([user for user, _ in balances], ['available_balance', 'level_active'], batch_size=1000)
+
+    @staticmethod
+    def _create_with_dates(model, field, rows):
+        objects = [obj for obj, _ in rows]
+        for obj, when in rows:
+            setattr(obj, field, when)
+
+        # auto_now_add sobrescreveria as datas: desativado apenas durante a inserção
+        date_field = model._meta.get_field(field)
+        date_field.auto_now_add = False
+        try:
+            model.objects.bulk_create(objects, batch_size=2000)
+        finally:
+            date_field.auto_now_add = True
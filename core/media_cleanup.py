@@ -0,0 +1,84 @@
+"""
+Remoção da mídia que nenhum registro usa mais.
+
+No armazenamento endereçado pelo conteúdo (core.storage), delete() não
+remove nada, porque um mesmo arquivo pode pertencer a vários registros.
+Assim, os arquivos abandonados (ex.: o original de um comprovativo depois
+de recodificado por core.proofs) ficam para o comando 'cleanup_media'.
+
+Um arquivo só é removido se:
+- o nome for endereçado pelo conteúdo (arquivos antigos nunca são tocados);
+- nenhum FileField do projeto apontar para ele;
+- tiver sido gravado há mais de GRACE: um envio em andamento grava o
+  arquivo antes de inserir a linha que o referencia.
+"""
+import posixpath
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import models
+from django.utils import timezone
+
+from .storage import digest_from_name
+
+
+GRACE = timedelta(hours=24)
+
+
+def _file_fields():
+    return [
+        (model, field.attname)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def referenced_names():
+    """Nomes de arquivo apontados por algum FileField."""
+    names = set()
+    for model, attname in _file_fields():
+        names.update(model._default_manager.exclude(**{attname: ''}).values_list(attname, flat=True).iterator())
+    names.discard(None)
+    return names
+
+
+def _is_referenced(name):
+    return any(model._default_manager.filter(**{attname: name}).exists() for model, attname in _file_fields())
+
+
+def _walk(storage, directory=''):
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from _walk(storage, posixpath.join(directory, subdirectory))
+
+
+def purge_unreferenced_media(storage=None, grace=GRACE, dry_run=False):
+    """
+    Remove de 'storage' (padrão: o armazenamento de mídia) os arquivos
+    endereçados pelo conteúdo sem referência. Retorna os nomes removidos
+    (com 'dry_run', os que seriam removidos).
+    """
+    storage = storage or default_storage
+    referenced = referenced_names()
+    cutoff = timezone.now() - grace
+
+    removed = []
+    for name in _walk(storage):
+        if not digest_from_name(name) or name in referenced:
+            continue
+        if storage.get_modified_time(name) > cutoff:
+            continue
+        # Nova verificação: um envio do mesmo conteúdo pode ter reutilizado o arquivo agora
+        if _is_referenced(name):
+            continue
+        if not dry_run:
+            getattr(storage, 'purge', storage.delete)(name)
+        removed.append(name)
+    return removed
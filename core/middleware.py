@@ -0,0 +1,190 @@
+"""
+Instrumentação por requisição: quantidade de consultas SQL, tempo de banco,
+tempo de renderização de template e tempo total, agrupados pelo nome da URL.
+
+Os valores são enviados no cabeçalho Server-Timing e guardados em memória
+(janela móvel por URL) para o endpoint de métricas da equipe.
+
+O middleware funciona em WSGI e em ASGI. As consultas são contadas por um
+execute_wrapper instalado em cada conexão, que soma na métrica da
+requisição atual (ContextVar): assim também são contadas as consultas que
+as views assíncronas executam em threads (sync_to_async).
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+
+# Quantidade de amostras mantidas por nome de URL
+METRICS_WINDOW = getattr(settings, 'REQUEST_METRICS_WINDOW', 500)
+
+_current_metrics = ContextVar('core_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'template_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+def record_template_time(seconds):
+    """Chamado pelo backend de templates (core.template_backend) após cada render."""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.template_time += seconds
+
+
+class MetricsStore:
+    """Amostras recentes por nome de URL, protegidas por um lock (workers com threads)."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = defaultdict(int)
+
+    def add(self, url_name, wall_time, db_time, template_time, queries):
+        with self._lock:
+            self._samples[url_name].append((wall_time, db_time, template_time, queries))
+            self._totals[url_name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    @staticmethod
+    def _percentile(values, percent):
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self):
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            totals = dict(self._totals)
+
+        report = {}
+        for name, values in samples.items():
+            wall, db, template, queries = zip(*values)
+            report[name] = {
+                'requests': totals[name],
+                'window': len(values),
+                'wall_ms': {'p50': round(self._percentile(wall, 50) * 1000, 2), 'p95': round(self._percentile(wall, 95) * 1000, 2)},
+                'db_ms': {'p50': round(self._percentile(db, 50) * 1000, 2), 'p95': round(self._percentile(db, 95) * 1000, 2)},
+                'template_ms': {'p50': round(self._percentile(template, 50) * 1000, 2), 'p95': round(self._percentile(template, 95) * 1000, 2)},
+                'queries': {'p50': self._percentile(queries, 50), 'p95': self._percentile(queries, 95), 'max': max(queries)},
+            }
+        return report
+
+
+metrics_store = MetricsStore()
+
+
+def _count_query(execute, sql, params, many, context):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def _install_query_counter(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+connection_created.connect(_install_query_counter, dispatch_uid='core.middleware.query_counter')
+
+
+class QueryBudgetMiddleware:
+    """
+    Mede cada requisição e adiciona o cabeçalho Server-Timing.
+    As métricas também ficam em 'response.request_metrics' (usado pelos testes).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Conexão aberta antes do carregamento deste módulo (sem connection_created)
+        _install_query_counter(connection)
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self._record(request, response, metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self._record(request, response, metrics, time.perf_counter() - started)
+
+    @staticmethod
+    def _record(request, response, metrics, wall_time):
+        match = getattr(request, 'resolver_match', None)
+        url_name = (match.view_name if match else None) or 'unresolved'
+        metrics_store.add(url_name, wall_time, metrics.db_time, metrics.template_time, metrics.queries)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.2f}',
+            f'total;dur={wall_time * 1000:.2f}',
+        ])
+        response.request_metrics = {
+            'url_name': url_name,
+            'queries': metrics.queries,
+            'db_time': metrics.db_time,
+            'template_time': metrics.template_time,
+            'wall_time': wall_time,
+        }
+        return response
+
+
+def assert_within_query_budget(response, budgets=None):
+    """
+    Auxiliar de testes: falha se a view que gerou 'response' executou mais
+    consultas que o orçamento definido em settings.QUERY_BUDGETS.
+    """
+    budgets = budgets if budgets is not None else getattr(settings, 'QUERY_BUDGETS', {})
+    metrics = getattr(response, 'request_metrics', None)
+    if metrics is None:
+        raise AssertionError('A resposta não foi medida: QueryBudgetMiddleware não está ativo.')
+
+    budget = budgets.get(metrics['url_name'])
+    if budget is None:
+        raise AssertionError(f"Nenhum orçamento de consultas definido para '{metrics['url_name']}'.")
+    if metrics['queries'] > budget:
+        raise AssertionError(
+            f"A view '{metrics['url_name']}' executou {metrics['queries']} consultas "
+            f"(orçamento: {budget})."
+        )
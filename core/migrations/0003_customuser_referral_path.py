@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_task_task_definition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='referral_depth',
+            field=models.PositiveIntegerField(default=0, verbose_name='Profundidade na Rede'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='referral_path',
+            field=models.CharField(db_index=True, default='/', max_length=1024, verbose_name='Caminho de Convites'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0003_customuser_referral_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('deposit', 'Depósito aprovado'), ('withdrawal', 'Saque'), ('level_purchase', 'Compra de nível'), ('daily_gain', 'Ganho diário'), ('roulette', 'Prêmio da roleta'), ('commission', 'Comissão de convite'), ('adjustment', 'Ajuste manual')], max_length=20, verbose_name='Motivo')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Variação do Saldo Disponível')),
+                ('subsidy_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Variação do Saldo de Subsídios')),
+                ('source_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Id da Origem')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data')),
+                ('source_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype', verbose_name='Tipo de Origem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Movimentação de Saldo',
+                'verbose_name_plural': 'Movimentações de Saldo',
+            },
+        ),
+    ]
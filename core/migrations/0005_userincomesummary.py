@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserIncomeSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='income_summary', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+                ('approved_deposit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total de Depósitos Aprovados')),
+                ('approved_withdrawal_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total de Saques Aprovados')),
+                ('task_earnings_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total de Ganhos de Tarefas')),
+                ('today_task_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Ganhos de Tarefas do Dia')),
+                ('today_date', models.DateField(blank=True, null=True, verbose_name='Dia dos Ganhos do Dia')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Resumo de Rendimentos',
+                'verbose_name_plural': 'Resumos de Rendimentos',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0005_userincomesummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'is_approved'], name='deposit_user_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(condition=models.Q(('is_approved', False)), fields=['created_at'], name='deposit_pending_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['user', 'created_at'], name='ledger_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roulette',
+            index=models.Index(fields=['user', 'spin_date'], name='roulette_user_spin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'completed_at'], name='task_user_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userlevel',
+            index=models.Index(fields=['user', 'is_active'], name='userlevel_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userlevel',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'id'], name='userlevel_active_partial_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['user', 'created_at'], name='withdrawal_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['user', 'status'], name='withdrawal_user_status_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def prizes_from_csv(apps, schema_editor):
+    """
+    Converte a lista CSV de cada RouletteSettings em linhas RoulettePrize,
+    mantendo os pesos usados até agora (prêmios <= 1000 valiam 3x).
+    """
+    RouletteSettings = apps.get_model('core', 'RouletteSettings')
+    RoulettePrize = apps.get_model('core', 'RoulettePrize')
+    for roulette_settings in RouletteSettings.objects.exclude(prizes__isnull=True).exclude(prizes=''):
+        amounts = []
+        for value in roulette_settings.prizes.split(','):
+            value = value.strip()
+            if value.isdigit():
+                amounts.append(int(value))
+        RoulettePrize.objects.bulk_create([
+            RoulettePrize(settings=roulette_settings, amount=amount, weight=3 if amount <= 1000 else 1)
+            for amount in amounts
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoulettePrize',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Prêmio (KZ)')),
+                ('weight', models.PositiveIntegerField(default=1, help_text='Chance relativa do prêmio. Ex: peso 3 sai três vezes mais que peso 1. Peso 0 desativa.', verbose_name='Peso')),
+                ('settings', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prize_rows', to='core.roulettesettings', verbose_name='Configuração da Roleta')),
+            ],
+            options={
+                'verbose_name': 'Prêmio da Roleta',
+                'verbose_name_plural': 'Prêmios da Roleta',
+                'ordering': ['amount'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='roulettesettings',
+            name='prizes',
+            field=models.CharField(blank=True, help_text='Legado: lista de prêmios separados por vírgula (ex: 100,200,500,1000), usada apenas se não houver Prêmios da Roleta cadastrados.', max_length=255, null=True, verbose_name='Prêmios da Roleta'),
+        ),
+        migrations.RunPython(prizes_from_csv, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0007_rouletteprize'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_status',
+            field=models.CharField(choices=[('pending', 'Aguardando processamento'), ('processing', 'Em processamento'), ('ready', 'Processado'), ('failed', 'Falhou (original mantido)')], default='pending', max_length=12, verbose_name='Processamento do Comprovativo'),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, upload_to='deposit_proofs/thumbs/', verbose_name='Miniatura do Comprovativo'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(condition=models.Q(('proof_status', 'pending')), fields=['created_at'], name='deposit_proof_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'created_at'], name='deposit_user_created_idx'),
+        ),
+        # O índice próprio da FK só é removido depois que os compostos por user existem
+        migrations.AlterField(
+            model_name='deposit',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Usuário'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_deposit_proof_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Hash do Comprovativo'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:00
+
+import datetime
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_deposit_proof_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WithdrawalPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_amount', models.DecimalField(decimal_places=2, default=Decimal('2000'), max_digits=10, verbose_name='Valor Mínimo')),
+                ('max_amount', models.DecimalField(blank=True, decimal_places=2, help_text='Vazio = sem limite.', max_digits=10, null=True, verbose_name='Valor Máximo')),
+                ('window_start', models.TimeField(default=datetime.time(9, 0), help_text='Horário local (TIME_ZONE).', verbose_name='Início do Horário')),
+                ('window_end', models.TimeField(default=datetime.time(18, 0), verbose_name='Fim do Horário')),
+                ('max_per_day', models.PositiveIntegerField(default=1, verbose_name='Saques por Dia')),
+                ('max_daily_amount', models.DecimalField(blank=True, decimal_places=2, help_text='Vazio = sem limite.', max_digits=12, null=True, verbose_name='Valor Máximo por Dia')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativa')),
+            ],
+            options={
+                'verbose_name': 'Política de Saques',
+                'verbose_name_plural': 'Políticas de Saques',
+            },
+        ),
+        migrations.CreateModel(
+            name='WithdrawalDailyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Saques')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor Total')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='withdrawal_counters', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Contador Diário de Saques',
+                'verbose_name_plural': 'Contadores Diários de Saques',
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='withdrawal_counter_user_day_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_task_table(apps, schema_editor):
+    """
+    PostgreSQL: transforma core_task numa tabela particionada por intervalo de
+    completed_at. A tabela atual (com todas as linhas) vira a partição DEFAULT;
+    as partições mensais são criadas pelo comando 'create_task_partitions'.
+    A chave primária passa a ser (id, completed_at), exigência do particionamento,
+    também na partição DEFAULT (senão o ATTACH falha com duas chaves primárias),
+    e os ids continuam vindo de uma sequência (sem IDENTITY, que só é aceita em
+    tabelas particionadas a partir do PostgreSQL 17). Outros bancos: nada muda.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('core', 'Task')._meta.db_table
+    default = f'{table}_default'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [table, f'{table}_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT attidentity <> '' FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'", [table]
+        )
+        is_identity = cursor.fetchone()[0]
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        last_id = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {default}')
+        cursor.execute(f'ALTER TABLE {default} RENAME CONSTRAINT {table}_pkey TO {default}_pkey')
+        # A chave da partição precisa ser a mesma da tabela particionada: o ATTACH passa a usá-la
+        cursor.execute(
+            f'ALTER TABLE {default} DROP CONSTRAINT {default}_pkey, '
+            f'ADD CONSTRAINT {default}_pkey PRIMARY KEY (id, completed_at)'
+        )
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {name} RENAME TO {name[:55]}_default')
+        if is_identity:
+            cursor.execute(f'ALTER TABLE {default} ALTER COLUMN id DROP IDENTITY')
+        else:
+            cursor.execute(f'ALTER TABLE {default} ALTER COLUMN id DROP DEFAULT')
+            cursor.execute(f'DROP SEQUENCE IF EXISTS {table}_id_seq')
+
+        cursor.execute(f'CREATE TABLE {table} (LIKE {default} INCLUDING DEFAULTS) PARTITION BY RANGE (completed_at)')
+        cursor.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        cursor.execute(f"SELECT setval('{table}_id_seq', %s, %s)", [max(last_id, 1), last_id > 0])
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, completed_at)')
+        for _, definition in indexes:
+            cursor.execute(definition)  # O texto aponta para o nome da tabela, agora a particionada
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT')
+
+
+def unpartition_task_table(apps, schema_editor):
+    """
+    Inverso de partition_task_table: as linhas das partições mensais voltam
+    para a partição DEFAULT, que volta a ser a tabela core_task comum, com a
+    chave primária (id) e id IDENTITY como o Django cria.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('core', 'Task')._meta.db_table
+    default = f'{table}_default'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [table])
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [table, f'{table}_pkey'],
+        )
+        index_names = [name for name, in cursor.fetchall()]
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        last_id = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {default}')
+        cursor.execute(f'INSERT INTO {default} SELECT * FROM {table}')
+        # Verifica já as FKs adiadas do INSERT: o ALTER TABLE não aceita eventos pendentes
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        # Leva junto as partições mensais e a sequência dos ids
+        cursor.execute(f'DROP TABLE {table}')
+
+        cursor.execute(f'ALTER TABLE {default} RENAME TO {table}')
+        cursor.execute(
+            f'ALTER TABLE {table} DROP CONSTRAINT {default}_pkey, ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)'
+        )
+        for name in index_names:
+            cursor.execute(f'ALTER INDEX {name[:55]}_default RENAME TO {name}')
+        cursor.execute(f'ALTER TABLE {table} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)", [table, max(last_id, 1), last_id > 0]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_withdrawal_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mês')),
+                ('task_count', models.PositiveIntegerField(default=0, verbose_name='Tarefas')),
+                ('earnings_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Ganhos')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='task_summaries', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal de Tarefas',
+                'verbose_name_plural': 'Resumos Mensais de Tarefas',
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='task_summary_user_month_uniq')],
+            },
+        ),
+        migrations.RunPython(partition_task_table, unpartition_task_table),
+    ]
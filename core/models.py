@@ -1,13 +1,67 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
-from django.db.models import Sum # Import necessário para a propriedade total_withdrawn
-import uuid
+from django.db.models import OuterRef, Subquery, Sum, Value # Sum: propriedade total_withdrawn
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+from decimal import Decimal
+import datetime
 import os
 
+from .invite_codes import MAX_ATTEMPTS, generate_invite_code, generate_invite_codes, is_invite_code_conflict
+
 # ---
 
-class CustomUserManager(BaseUserManager):
+class CustomUserQuerySet(models.QuerySet):
+    def with_summary(self):
+        """
+        Anota o nível ativo e o total de saques aprovados na própria consulta,
+        para listas de usuários: 'active_level' e 'total_withdrawn' passam a
+        não fazer consultas por usuário (o Level vem do catálogo em cache).
+        """
+        active_level_id = UserLevel.objects.filter(
+            user=OuterRef('pk'), is_active=True
+        ).order_by('pk').values('level_id')[:1]
+        approved_withdrawals = Withdrawal.objects.filter(
+            user=OuterRef('pk'), status=Withdrawal.STATUS_APPROVED
+        ).order_by().values('user').annotate(total=Sum('amount')).values('total')
+        return self.annotate(
+            prefetched_active_level_id=Subquery(active_level_id),
+            # Resumo de rendimentos (core.income); sem resumo, soma os saques
+            prefetched_total_withdrawn=Coalesce(
+                'income_summary__approved_withdrawal_total',
+                Subquery(approved_withdrawals),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        QuerySet.bulk_create que também gera o invite_code dos usuários sem
+        código (ex.: importação em lote): códigos distintos dentro do lote e,
+        se algum já existir no banco, novos códigos e uma nova tentativa.
+        """
+        objs = list(objs)
+        pending = [user for user in objs if not user.invite_code]
+        if not pending:
+            return super().bulk_create(objs, *args, **kwargs)
+
+        taken = {user.invite_code for user in objs if user.invite_code}
+        for attempt in range(MAX_ATTEMPTS):
+            for user, code in zip(pending, generate_invite_codes(len(pending), exclude=taken)):
+                user.invite_code = code
+            try:
+                with transaction.atomic(using=self.db):
+                    return super().bulk_create(objs, *args, **kwargs)
+            except IntegrityError as error:
+                if attempt == MAX_ATTEMPTS - 1 or not is_invite_code_conflict(error):
+                    raise
+
+
+class CustomUserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     def create_user(self, phone_number, password=None, **extra_fields):
         if not phone_number:
             raise ValueError('O número de telefone deve ser fornecido')
@@ -37,6 +91,13 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     level_active = models.BooleanField(default=False, verbose_name="Nível Ativo")
     roulette_spins = models.IntegerField(default=0, verbose_name="Giros da Roleta")
 
+    # --- ÍNDICE DA ÁRVORE DE CONVITES (caminho materializado) ---
+    # Ids dos ancestrais, da raiz até quem convidou, no formato "/1/5/12/".
+    # Mantido em core.referrals (cadastro) e pelo comando 'rebuild_referral_paths'.
+    referral_path = models.CharField(max_length=1024, default='/', db_index=True, verbose_name="Caminho de Convites")
+    referral_depth = models.PositiveIntegerField(default=0, verbose_name="Profundidade na Rede")
+    # --- FIM ÍNDICE DA ÁRVORE DE CONVITES ---
+
     USERNAME_FIELD = 'phone_number'
     REQUIRED_FIELDS = []
 
@@ -46,38 +107,66 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         return self.phone_number
 
     def save(self, *args, **kwargs):
-        if not self.invite_code:
-            while True:
-                new_invite_code = uuid.uuid4().hex[:8]
-                if not CustomUser.objects.filter(invite_code=new_invite_code).exists():
-                    self.invite_code = new_invite_code
-                    break
-        super().save(*args, **kwargs)
+        if self.invite_code:
+            return super().save(*args, **kwargs)
+
+        # Sem consulta prévia: a restrição UNIQUE detecta a colisão (core.invite_codes)
+        for attempt in range(MAX_ATTEMPTS):
+            self.invite_code = generate_invite_code()
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    return super().save(*args, **kwargs)
+            except IntegrityError as error:
+                if attempt == MAX_ATTEMPTS - 1 or not is_invite_code_conflict(error):
+                    raise
         
+    def get_session_auth_hash(self):
+        # Usuário do retrato em cache (core.user_cache): a senha não foi carregada e o
+        # hash de sessão já vem calculado. Depois de set_password(), calcula de novo.
+        if 'password' in self.get_deferred_fields() and getattr(self, 'prefetched_session_auth_hash', None):
+            return self.prefetched_session_auth_hash
+        return super().get_session_auth_hash()
+
     # --- PROPRIEDADES ADICIONADAS PARA O PERFIL ---
-    @property
+    # Calculadas uma vez por instância (cached_property). Em listas, use
+    # CustomUser.objects.with_summary() para não consultar o banco por usuário.
+    @cached_property
     def active_level(self):
         """
         Retorna o objeto Level ativo do usuário. 
         Necessário para a exibição de {{ user.active_level.name }} no template.
         """
+        # Id do nível já anotado por with_summary() ou vindo do usuário em cache
+        # (core.user_cache): o Level sai do catálogo em cache, sem consultas
+        if hasattr(self, 'prefetched_active_level_id'):
+            if self.prefetched_active_level_id is None:
+                return None
+            from .cache import get_levels
+            level = next((level for level in get_levels() if level.id == self.prefetched_active_level_id), None)
+            return level or Level.objects.filter(pk=self.prefetched_active_level_id).first()
+
         # Acessa o UserLevel ativo, que tem uma FK para o Level
-        active_user_level = self.userlevel_set.filter(is_active=True).first()
+        active_user_level = self.userlevel_set.filter(is_active=True).select_related('level').order_by('pk').first()
         
         # Se houver um nível ativo, retorna o objeto Level. Se não, retorna None.
         return active_user_level.level if active_user_level else None
 
-    @property
+    @cached_property
     def total_withdrawn(self):
         """
         Calcula e retorna o total de saques aprovados do usuário.
         Necessário para a exibição de {{ user.total_withdrawn }} no template.
         """
-        # Calcula a soma dos saques com status 'Aprovado' (assumindo o status que usa)
-        total = Withdrawal.objects.filter(user=self, status='Aprovado').aggregate(
-            Sum('amount')
-        )['amount__sum'] or 0.00
-        return total
+        if hasattr(self, 'prefetched_total_withdrawn'):
+            return self.prefetched_total_withdrawn
+
+        # Lido do resumo de rendimentos (uma linha), mantido por core.income
+        try:
+            return self.income_summary.approved_withdrawal_total
+        except UserIncomeSummary.DoesNotExist:
+            return Withdrawal.objects.filter(user=self, status=Withdrawal.STATUS_APPROVED).aggregate(
+                Sum('amount')
+            )['amount__sum'] or 0.00
     # --- FIM DAS PROPRIEDADES ADICIONADAS ---
 
 # ---
@@ -145,15 +234,44 @@ class BankDetails(models.Model):
 # ---
 
 class Deposit(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
+    # Processamento do comprovativo (core.proofs), fora do ciclo da requisição
+    PROOF_PENDING = 'pending'
+    PROOF_PROCESSING = 'processing'
+    PROOF_READY = 'ready'
+    PROOF_FAILED = 'failed'
+    PROOF_STATUS_CHOICES = [
+        (PROOF_PENDING, 'Aguardando processamento'),
+        (PROOF_PROCESSING, 'Em processamento'),
+        (PROOF_READY, 'Processado'),
+        (PROOF_FAILED, 'Falhou (original mantido)'),
+    ]
+
+    # Sem índice próprio: os índices compostos (user, is_approved) e (user, created_at) já cobrem as buscas por usuário
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False, verbose_name="Usuário")
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
     proof_of_payment = models.ImageField(upload_to='deposit_proofs/', verbose_name="Comprovativo")
+    # --- NOVO: miniatura e estado do processamento do comprovativo ---
+    proof_thumbnail = models.ImageField(upload_to='deposit_proofs/thumbs/', blank=True, verbose_name="Miniatura do Comprovativo")
+    proof_status = models.CharField(max_length=12, choices=PROOF_STATUS_CHOICES, default=PROOF_PENDING, verbose_name="Processamento do Comprovativo")
+    # SHA-256 do arquivo enviado: o mesmo comprovativo em outro depósito é um sinal de fraude
+    proof_sha256 = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Hash do Comprovativo")
+    # --- FIM NOVO ---
     is_approved = models.BooleanField(default=False, verbose_name="Aprovado")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
     
     class Meta:
         verbose_name = "Depósito"
         verbose_name_plural = "Depósitos"
+        indexes = [
+            # Totais por usuário (Renda) e fila de aprovação do Admin
+            models.Index(fields=['user', 'is_approved'], name='deposit_user_approved_idx'),
+            # Depósitos do usuário por data (exclusão em cascata, histórico paginado em core.history)
+            models.Index(fields=['user', 'created_at'], name='deposit_user_created_idx'),
+            # Índice parcial: apenas a fila de depósitos pendentes
+            models.Index(fields=['created_at'], condition=models.Q(is_approved=False), name='deposit_pending_created_idx'),
+            # Fila de comprovativos a processar
+            models.Index(fields=['created_at'], condition=models.Q(proof_status='pending'), name='deposit_proof_pending_idx'),
+        ]
 
     def __str__(self):
         return f"Depósito de {self.amount} por {self.user.phone_number}"
@@ -161,14 +279,23 @@ class Deposit(models.Model):
 # ---
 
 class Withdrawal(models.Model):
+    STATUS_PENDING = 'Pending'
+    STATUS_APPROVED = 'Aprovado'
+    STATUS_REJECTED = 'Rejeitado'
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
-    status = models.CharField(max_length=20, default='Pending', verbose_name="Status")
+    status = models.CharField(max_length=20, default=STATUS_PENDING, verbose_name="Status")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
     
     class Meta:
         verbose_name = "Saque"
         verbose_name_plural = "Saques"
+        indexes = [
+            # Histórico/limite diário por usuário e totais aprovados
+            models.Index(fields=['user', 'created_at'], name='withdrawal_user_created_idx'),
+            models.Index(fields=['user', 'status'], name='withdrawal_user_status_idx'),
+        ]
 
     def __str__(self):
         return f"Saque de {self.amount} por {self.user.phone_number} ({self.status})"
@@ -210,6 +337,11 @@ class UserLevel(models.Model):
     class Meta:
         verbose_name = "Nível do Usuário"
         verbose_name_plural = "Níveis dos Usuários"
+        indexes = [
+            models.Index(fields=['user', 'is_active'], name='userlevel_user_active_idx'),
+            # Índice parcial: apenas os níveis ativos (motor de ganhos diários)
+            models.Index(fields=['user', 'id'], condition=models.Q(is_active=True), name='userlevel_active_partial_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.phone_number} - {self.level.name}"
@@ -273,6 +405,9 @@ class Task(models.Model):
     class Meta:
         verbose_name = "Tarefa Concluída"
         verbose_name_plural = "Tarefas Concluídas"
+        indexes = [
+            models.Index(fields=['user', 'completed_at'], name='task_user_completed_idx'),
+        ]
 
     def __str__(self):
         # Tratamento para não falhar se task_definition for None
@@ -280,6 +415,30 @@ class Task(models.Model):
         return f"Conclusão de '{task_name}' por {self.user.phone_number}"
 # --- FIM MODELO TASK CORRIGIDO ---
 
+# --- RESUMO MENSAL DAS TAREFAS ARQUIVADAS (core.task_archive) ---
+class TaskMonthlySummary(models.Model):
+    """
+    Tarefas de um usuário num mês já arquivado. O comando 'archive_tasks' soma
+    as linhas de Task do mês aqui e as remove (no PostgreSQL, descarta a
+    partição do mês). Ganhos totais = resumos + tarefas ainda não arquivadas.
+    """
+    # Sem índice próprio: a restrição única (user, month) já cobre as buscas por usuário
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='task_summaries', db_index=False, verbose_name="Usuário")
+    month = models.DateField(verbose_name="Mês")  # Primeiro dia do mês (hora local)
+    task_count = models.PositiveIntegerField(default=0, verbose_name="Tarefas")
+    earnings_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Ganhos")
+
+    class Meta:
+        verbose_name = "Resumo Mensal de Tarefas"
+        verbose_name_plural = "Resumos Mensais de Tarefas"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='task_summary_user_month_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Tarefas de {self.user_id} em {self.month:%m/%Y}: {self.earnings_total}"
+# --- FIM RESUMO MENSAL DAS TAREFAS ---
+
 # ---
 
 class Roulette(models.Model):
@@ -291,6 +450,9 @@ class Roulette(models.Model):
     class Meta:
         verbose_name = "Roleta"
         verbose_name_plural = "Roletas"
+        indexes = [
+            models.Index(fields=['user', 'spin_date'], name='roulette_user_spin_idx'),
+        ]
 
     def __str__(self):
         return f"Roleta de {self.user.phone_number} - Prêmio: {self.prize}"
@@ -301,7 +463,7 @@ class RouletteSettings(models.Model):
     prizes = models.CharField(
         max_length=255, blank=True, null=True,
         verbose_name="Prêmios da Roleta",
-        help_text="Uma lista de prêmios separados por vírgula. Ex: 100,200,500,1000"
+        help_text="Legado: lista de prêmios separados por vírgula (ex: 100,200,500,1000), usada apenas se não houver Prêmios da Roleta cadastrados."
     )
 
     class Meta:
@@ -310,4 +472,142 @@ class RouletteSettings(models.Model):
 
     def __str__(self):
         return "Configurações da Roleta"
-        
\ No newline at end of file
+
+# ---
+
+class RoulettePrize(models.Model):
+    """
+    Prêmio da roleta com o seu peso (probabilidade relativa).
+    Substitui a lista CSV de RouletteSettings.prizes; a tabela de sorteio é
+    compilada por core.roulette.
+    """
+    settings = models.ForeignKey(RouletteSettings, on_delete=models.CASCADE, related_name='prize_rows', verbose_name="Configuração da Roleta")
+    amount = models.PositiveIntegerField(verbose_name="Prêmio (KZ)")
+    weight = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Peso",
+        help_text="Chance relativa do prêmio. Ex: peso 3 sai três vezes mais que peso 1. Peso 0 desativa."
+    )
+
+    class Meta:
+        verbose_name = "Prêmio da Roleta"
+        verbose_name_plural = "Prêmios da Roleta"
+        ordering = ['amount']
+
+    def __str__(self):
+        return f"{self.amount} KZ (peso {self.weight})"
+        
+# ---
+# --- LIVRO-RAZÃO DE SALDOS (somente inserção) ---
+class LedgerEntry(models.Model):
+    """
+    Registra cada crédito/débito aplicado aos saldos de um usuário.
+    As entradas são gravadas por core.ledger junto com o UPDATE atômico do saldo.
+    """
+    REASON_DEPOSIT = 'deposit'
+    REASON_WITHDRAWAL = 'withdrawal'
+    REASON_LEVEL_PURCHASE = 'level_purchase'
+    REASON_DAILY_GAIN = 'daily_gain'
+    REASON_ROULETTE = 'roulette'
+    REASON_COMMISSION = 'commission'
+    REASON_ADJUSTMENT = 'adjustment'
+    REASON_CHOICES = [
+        (REASON_DEPOSIT, 'Depósito aprovado'),
+        (REASON_WITHDRAWAL, 'Saque'),
+        (REASON_LEVEL_PURCHASE, 'Compra de nível'),
+        (REASON_DAILY_GAIN, 'Ganho diário'),
+        (REASON_ROULETTE, 'Prêmio da roleta'),
+        (REASON_COMMISSION, 'Comissão de convite'),
+        (REASON_ADJUSTMENT, 'Ajuste manual'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name="Usuário")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, verbose_name="Motivo")
+    # Variações (positivas = crédito, negativas = débito)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Variação do Saldo Disponível")
+    subsidy_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Variação do Saldo de Subsídios")
+    # Origem da movimentação (Deposit, Withdrawal, UserLevel, Roulette...)
+    source_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Tipo de Origem")
+    source_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Id da Origem")
+    source = GenericForeignKey('source_type', 'source_id')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data")
+
+    class Meta:
+        verbose_name = "Movimentação de Saldo"
+        verbose_name_plural = "Movimentações de Saldo"
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='ledger_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_reason_display()} de {self.amount} para {self.user.phone_number}"
+# --- FIM LIVRO-RAZÃO ---
+
+# ---
+# --- RESUMO DE RENDIMENTOS POR USUÁRIO (contadores desnormalizados) ---
+class UserIncomeSummary(models.Model):
+    """
+    Totais usados pelas páginas Renda e Perfil, atualizados de forma incremental
+    por core.income a cada aprovação/ganho. O comando 'rebuild_income_summaries'
+    reconcilia estes valores com as tabelas originais.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='income_summary', verbose_name="Usuário")
+    approved_deposit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total de Depósitos Aprovados")
+    approved_withdrawal_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total de Saques Aprovados")
+    task_earnings_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total de Ganhos de Tarefas")
+    today_task_earnings = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Ganhos de Tarefas do Dia")
+    today_date = models.DateField(null=True, blank=True, verbose_name="Dia dos Ganhos do Dia")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Resumo de Rendimentos"
+        verbose_name_plural = "Resumos de Rendimentos"
+
+    def __str__(self):
+        return f"Resumo de rendimentos de {self.user.phone_number}"
+# --- FIM RESUMO DE RENDIMENTOS ---
+
+# ---
+# --- POLÍTICA DE SAQUES (regras editáveis no Admin, avaliadas por core.withdrawal_policy) ---
+class WithdrawalPolicy(models.Model):
+    """
+    Regras de saque. Vale a primeira política ativa; sem nenhuma, valem os
+    padrões abaixo (as regras que antes estavam fixas na view 'saque').
+    """
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('2000'), verbose_name="Valor Mínimo")
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Valor Máximo", help_text="Vazio = sem limite.")
+    window_start = models.TimeField(default=datetime.time(9, 0), verbose_name="Início do Horário", help_text="Horário local (TIME_ZONE).")
+    window_end = models.TimeField(default=datetime.time(18, 0), verbose_name="Fim do Horário")
+    max_per_day = models.PositiveIntegerField(default=1, verbose_name="Saques por Dia")
+    max_daily_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Valor Máximo por Dia", help_text="Vazio = sem limite.")
+    is_active = models.BooleanField(default=True, verbose_name="Ativa")
+
+    class Meta:
+        verbose_name = "Política de Saques"
+        verbose_name_plural = "Políticas de Saques"
+
+    def __str__(self):
+        return f"Saques de {self.min_amount} KZ, {self.window_start:%H:%M}-{self.window_end:%H:%M}, {self.max_per_day}/dia"
+
+
+class WithdrawalDailyCounter(models.Model):
+    """
+    Saques solicitados por usuário e por dia (data local). Incrementado com um
+    UPDATE condicional na mesma transação do saque, o que torna os limites
+    diários seguros contra envios simultâneos.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='withdrawal_counters', db_index=False, verbose_name="Usuário")
+    day = models.DateField(verbose_name="Dia")
+    count = models.PositiveIntegerField(default=0, verbose_name="Saques")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Valor Total")
+
+    class Meta:
+        verbose_name = "Contador Diário de Saques"
+        verbose_name_plural = "Contadores Diários de Saques"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='withdrawal_counter_user_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} em {self.day}: {self.count} saque(s)"
+# --- FIM POLÍTICA DE SAQUES ---
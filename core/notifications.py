@@ -0,0 +1,214 @@
+"""
+Notificações em tempo real para o usuário logado (Server-Sent Events).
+
+Em vez de recarregar /renda/, /saque/ e /menu/ para ver se um depósito foi
+aprovado ou um saque pago, as páginas mantêm uma conexão com o endpoint
+'events' (view assíncrona, servida pelo app ASGI) e recebem:
+
+- 'balance': saldos atuais, sempre que o livro-razão (core.ledger) altera
+  o saldo. São lidos do banco, não do retrato em cache (core.user_cache):
+  o evento pode vir de outro processo antes de o retrato ser descartado;
+- 'deposit' / 'withdrawal': mudanças de status (views, Admin e ações em lote).
+
+Os eventos são publicados após o commit e distribuídos por um pub/sub local:
+- PostgreSQL: NOTIFY no canal CHANNEL; cada processo mantém uma thread com
+  LISTEN, então um evento publicado pelo worker ou pelo Admin chega a todos
+  os processos web;
+- outros bancos (SQLite): somente dentro do próprio processo.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+
+from .models import CustomUser, Deposit, Withdrawal
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'core_events'
+
+# Comentário enviado periodicamente para manter a conexão aberta em proxies
+KEEPALIVE_SECONDS = getattr(settings, 'SSE_KEEPALIVE_SECONDS', 20)
+# Duração máxima de uma conexão; o navegador reconecta sozinho depois de RETRY_MS
+MAX_STREAM_SECONDS = getattr(settings, 'SSE_MAX_STREAM_SECONDS', 300)
+RETRY_MS = 5000
+
+# Eventos pendentes por conexão; um cliente lento perde eventos em vez de acumular memória
+QUEUE_SIZE = 100
+
+# 'auto' usa LISTEN/NOTIFY no PostgreSQL; 'local' força o pub/sub dentro do processo
+BACKEND = getattr(settings, 'NOTIFICATIONS_BACKEND', 'auto')
+
+
+def _put(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+class LocalBroker:
+    """Assinantes (fila asyncio + event loop) por usuário, neste processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({item for item in subscribers if item[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def dispatch(self, user_id, event):
+        """Entrega 'event' aos assinantes de 'user_id'; pode ser chamado de qualquer thread."""
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_put, queue, event)
+            except RuntimeError:
+                pass  # Event loop já encerrado
+
+
+broker = LocalBroker()
+
+
+def _use_postgres():
+    return BACKEND == 'auto' and connections['default'].vendor == 'postgresql'
+
+
+# --- PUBLICAÇÃO ---
+
+def _publish(events):
+    if _use_postgres():
+        payloads = [json.dumps({'user': user_id, 'event': event}) for user_id, event in events]
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload', [CHANNEL, payloads])
+        return
+    for user_id, event in events:
+        broker.dispatch(user_id, event)
+
+
+def notify(events):
+    """Publica [(user_id, evento)] após o commit da transação atual."""
+    events = list(events)
+    if events:
+        transaction.on_commit(lambda: _publish(events))
+
+
+def notify_balance(user_ids):
+    notify((user_id, {'type': 'balance'}) for user_id in user_ids)
+
+
+def deposit_event(deposit_id, is_approved):
+    return {'type': 'deposit', 'id': deposit_id, 'status': 'Aprovado' if is_approved else 'Pendente'}
+
+
+def withdrawal_event(withdrawal_id, status):
+    return {'type': 'withdrawal', 'id': withdrawal_id, 'status': status}
+
+
+# --- LISTEN (PostgreSQL) ---
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _listen_forever():
+    database = connections['default']
+    while True:
+        try:
+            raw = database.get_new_connection(database.get_connection_params())
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                if select.select([raw], [], [], KEEPALIVE_SECONDS) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    message = json.loads(raw.notifies.pop(0).payload)
+                    broker.dispatch(message['user'], message['event'])
+        except Exception:
+            logger.exception('Conexão LISTEN das notificações perdida; reconectando.')
+            time.sleep(RETRY_MS / 1000)
+
+
+def _ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_listen_forever, name='core-notifications', daemon=True)
+            _listener.start()
+
+
+# --- STREAM SSE ---
+
+def _format(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+async def _balance(user_id):
+    row = await CustomUser.objects.filter(pk=user_id).values('available_balance', 'subsidy_balance').afirst()
+    if row is None:
+        return None
+    return {'available_balance': str(row['available_balance']), 'subsidy_balance': str(row['subsidy_balance'])}
+
+
+async def event_stream(user_id, max_seconds=MAX_STREAM_SECONDS, keepalive=KEEPALIVE_SECONDS):
+    """Gerador assíncrono com as mensagens SSE de 'user_id'."""
+    if _use_postgres():
+        _ensure_listener()
+    queue = broker.subscribe(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        last_balance = await _balance(user_id)
+        yield _format('balance', last_balance)
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(keepalive, remaining))
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event['type'] == 'balance':
+                balance = await _balance(user_id)
+                if balance == last_balance:
+                    continue  # Saldo já enviado (vários eventos para o mesmo commit)
+                last_balance = balance
+                yield _format('balance', balance)
+            else:
+                yield _format(event['type'], event)
+    finally:
+        broker.unsubscribe(user_id, queue)
+
+
+# --- SINAIS: mudanças feitas por save() (views, Admin) ---
+# As ações em lote (core.deposits, core.payouts) chamam notify() diretamente.
+
+def _deposit_saved(sender, instance, **kwargs):
+    notify([(instance.user_id, deposit_event(instance.pk, instance.is_approved))])
+
+
+def _withdrawal_saved(sender, instance, **kwargs):
+    notify([(instance.user_id, withdrawal_event(instance.pk, instance.status))])
+
+
+post_save.connect(_deposit_saved, sender=Deposit, dispatch_uid='core.notifications.deposit')
+post_save.connect(_withdrawal_saved, sender=Withdrawal, dispatch_uid='core.notifications.withdrawal')
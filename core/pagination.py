@@ -0,0 +1,88 @@
+"""
+Paginação por cursor (keyset).
+
+Com LIMIT/OFFSET o banco lê e descarta todas as linhas anteriores à página
+pedida: a página 50 do histórico de uma conta antiga custa 50 vezes mais
+que a primeira. Aqui cada página continua a partir da última linha da
+anterior, com o filtro (data, id) < (data da última, id da última) sobre o
+índice (user, data) do modelo, de modo que toda página custa o mesmo,
+qualquer que seja a idade da conta. O cursor entregue ao cliente é opaco
+(JSON em base64) e só permite avançar.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado ou adulterado."""
+
+
+def encode_cursor(timestamp, *keys):
+    """Cursor opaco para a posição (timestamp, *keys); as chaves são inteiros."""
+    raw = json.dumps([timestamp.isoformat(), *keys], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size=2):
+    """Inverso de encode_cursor: (datetime, *chaves). Levanta InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        timestamp, *keys = json.loads(raw)
+        timestamp = datetime.fromisoformat(timestamp)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as error:
+        raise InvalidCursor('Cursor inválido.') from error
+    if len(keys) != size - 1 or not all(type(key) is int for key in keys) or timezone.is_naive(timestamp):
+        raise InvalidCursor('Cursor inválido.')
+    return (timestamp, *keys)
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Tamanho de página vindo da query string, limitado a [1, MAX_PAGE_SIZE]."""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def _value(item, name):
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+class KeysetPage:
+    __slots__ = ('items', 'next_cursor')
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_page(queryset, field, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Página de 'queryset' em ordem decrescente de ('field', id), começando
+    depois de 'cursor' (None = primeira página). Funciona com instâncias e
+    com .values() (desde que incluam 'field' e 'id').
+    """
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk}))
+    rows = list(queryset.order_by(f'-{field}', '-pk')[:page_size + 1])
+
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_cursor(_value(last, field), _value(last, 'id'))
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,119 @@
+"""
+Processamento em lote de saques (Admin).
+
+O saldo já é debitado quando o saque é solicitado (view 'saque'). Aprovar
+muda só o status e o total de saques aprovados. Rejeitar devolve o valor
+ao saldo disponível. Em ambos os casos são UPDATEs por conjunto, numa única
+transação, e apenas saques ainda pendentes são alterados, o que torna as
+ações idempotentes.
+"""
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
+
+from .income import add_approved_withdrawals
+from .ledger import apply_bulk
+from .models import LedgerEntry, Withdrawal
+from .notifications import notify, withdrawal_event
+
+
+EXPORT_HEADER = ['Banco', 'IBAN', 'Titular', 'Telefone', 'Valor', 'Saque', 'Data']
+
+
+def _lock_pending(queryset):
+    # skip_locked: saques já sendo processados por outro operador ficam de fora
+    return list(
+        queryset.filter(status=Withdrawal.STATUS_PENDING)
+        .select_for_update(skip_locked=True, of=('self',))
+        .order_by()
+        .values_list('id', 'user_id', 'amount')
+    )
+
+
+def approve_withdrawals(queryset):
+    """Aprova os saques pendentes de 'queryset'. Retorna a quantidade aprovada."""
+    with transaction.atomic():
+        rows = _lock_pending(queryset)
+        if not rows:
+            return 0
+        Withdrawal.objects.filter(id__in=[row[0] for row in rows]).update(status=Withdrawal.STATUS_APPROVED)
+
+        totals = {}
+        for _, user_id, amount in rows:
+            totals[user_id] = totals.get(user_id, 0) + amount
+        add_approved_withdrawals(totals)
+        notify((user_id, withdrawal_event(withdrawal_id, Withdrawal.STATUS_APPROVED)) for withdrawal_id, user_id, _ in rows)
+    return len(rows)
+
+
+def reject_withdrawals(queryset):
+    """Rejeita os saques pendentes de 'queryset', estornando o valor. Retorna a quantidade rejeitada."""
+    with transaction.atomic():
+        rows = _lock_pending(queryset)
+        if not rows:
+            return 0
+        Withdrawal.objects.filter(id__in=[row[0] for row in rows]).update(status=Withdrawal.STATUS_REJECTED)
+
+        # Estorno: entrada positiva com o próprio saque como origem
+        apply_bulk([
+            (user_id, LedgerEntry.REASON_WITHDRAWAL, amount, 0, Withdrawal(pk=withdrawal_id))
+            for withdrawal_id, user_id, amount in rows
+        ])
+        notify((user_id, withdrawal_event(withdrawal_id, Withdrawal.STATUS_REJECTED)) for withdrawal_id, user_id, _ in rows)
+    return len(rows)
+
+
+class _Echo:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de gravá-la."""
+
+    def write(self, value):
+        return value
+
+
+# Início de célula que o Excel/LibreOffice interpreta como fórmula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _safe_cell(value):
+    """Texto digitado pelo usuário, neutralizado contra injeção de fórmulas na planilha."""
+    value = value or ''
+    return f"'{value}" if value.startswith(FORMULA_PREFIXES) else value
+
+
+async def aiter_payout_csv(queryset, chunk_size=2000):
+    """
+    Gera, linha a linha, o CSV dos saques aprovados de 'queryset', agrupados
+    por banco. Usuários sem detalhes bancários aparecem primeiro, com banco
+    vazio, para serem corrigidos (NULLS FIRST explícito: o PostgreSQL ordena
+    os nulos por último).
+
+    Gerador assíncrono: sob ASGI o StreamingHttpResponse só transmite de fato
+    um iterador assíncrono (um iterador síncrono é lido inteiro antes do envio).
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADER)
+
+    rows = (
+        queryset.filter(status=Withdrawal.STATUS_APPROVED)
+        .order_by(F('user__bankdetails__bank_name').asc(nulls_first=True), 'created_at', 'id')
+        .values_list(
+            'user__bankdetails__bank_name', 'user__bankdetails__IBAN', 'user__bankdetails__account_holder_name',
+            'user__phone_number', 'amount', 'id', 'created_at',
+        )
+    )
+    # Consulta com cursor no servidor, lida em blocos numa thread (sempre a mesma conexão)
+    rows = rows.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    try:
+        while chunk := await next_chunk():
+            for bank, iban, holder, phone, amount, withdrawal_id, created_at in chunk:
+                yield writer.writerow([
+                    _safe_cell(bank), _safe_cell(iban), _safe_cell(holder), _safe_cell(phone),
+                    amount, withdrawal_id, created_at.isoformat(),
+                ])
+    finally:
+        # Download interrompido: fecha o cursor na thread da conexão
+        await sync_to_async(rows.close)()
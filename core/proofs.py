@@ -0,0 +1,154 @@
+"""
+Processamento dos comprovativos de depósito, fora do ciclo da requisição.
+
+A view 'deposito' apenas grava o arquivo enviado (o Django já transmite
+uploads grandes direto para o disco) e cria o Deposit com
+proof_status='pending'. Depois, um worker:
+
+- registra o SHA-256 do arquivo enviado (comprovativos repetidos no Admin);
+- decodifica a imagem com o Pillow e aplica a orientação do EXIF;
+- regrava uma versão limitada (DEPOSIT_PROOF_MAX_SIZE px, JPEG) sem metadados;
+- gera a miniatura usada na listagem do Admin.
+
+O worker pode ser o pool de threads do próprio processo web (enfileirado
+após o commit) e/ou o comando 'process_deposit_proofs', que consome a fila
+pelo banco e também recupera o que ficou pendente.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Deposit
+from .storage import digest_from_name
+
+
+logger = logging.getLogger(__name__)
+
+# Lado maior (px) da imagem regravada e da miniatura
+MAX_SIZE = getattr(settings, 'DEPOSIT_PROOF_MAX_SIZE', 1600)
+THUMBNAIL_SIZE = getattr(settings, 'DEPOSIT_PROOF_THUMBNAIL_SIZE', 240)
+JPEG_QUALITY = getattr(settings, 'DEPOSIT_PROOF_JPEG_QUALITY', 82)
+
+# Threads do pool local; 0 = somente o comando process_deposit_proofs
+WORKERS = getattr(settings, 'DEPOSIT_PROOF_WORKERS', 2)
+
+# Imagens com mais pixels que isso são recusadas antes de decodificar (proteção contra
+# "bombas" de descompressão). Verificado por imagem: Image.MAX_IMAGE_PIXELS é global do processo.
+MAX_PIXELS = getattr(settings, 'DEPOSIT_PROOF_MAX_PIXELS', 40_000_000)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _encode_jpeg(image, max_size):
+    image = image.copy()
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    # Sem o argumento exif: os metadados (GPS, aparelho...) não são gravados
+    image.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _claim(deposit_id):
+    """Marca o depósito como 'processing' se ainda estiver pendente (nenhum outro worker o pegou)."""
+    return Deposit.objects.filter(pk=deposit_id, proof_status=Deposit.PROOF_PENDING).update(
+        proof_status=Deposit.PROOF_PROCESSING
+    )
+
+
+def process_proof(deposit_id):
+    """
+    Processa o comprovativo de um depósito pendente. Retorna o novo
+    proof_status, ou None se o depósito já estava com outro worker.
+    """
+    if not _claim(deposit_id):
+        return None
+
+    deposit = Deposit.objects.only('id', 'proof_of_payment').get(pk=deposit_id)
+    original = deposit.proof_of_payment
+    # Hash do arquivo original (para detectar comprovativos repetidos): vem do
+    # nome quando o armazenamento é endereçado pelo conteúdo (core.storage)
+    digest = digest_from_name(original.name)
+    try:
+        with original.open('rb') as handle:
+            data = handle.read()
+        digest = digest or hashlib.sha256(data).hexdigest()
+        with Image.open(BytesIO(data)) as image:
+            # Só o cabeçalho foi lido até aqui
+            if image.width * image.height > MAX_PIXELS:
+                raise Image.DecompressionBombError(f'{image.width}x{image.height} px acima do limite de {MAX_PIXELS}.')
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            proof_bytes = _encode_jpeg(image, MAX_SIZE)
+            thumbnail_bytes = _encode_jpeg(image, THUMBNAIL_SIZE)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError, ValueError):
+        logger.warning('Comprovativo do depósito %s não pôde ser processado.', deposit_id, exc_info=True)
+        Deposit.objects.filter(pk=deposit_id).update(proof_status=Deposit.PROOF_FAILED, proof_sha256=digest or '')
+        return Deposit.PROOF_FAILED
+
+    stem = os.path.splitext(os.path.basename(original.name))[0]
+    storage = original.storage
+    proof_name = storage.save(f'deposit_proofs/{stem}.jpg', ContentFile(proof_bytes))
+    thumbnail_name = storage.save(f'deposit_proofs/thumbs/{stem}.jpg', ContentFile(thumbnail_bytes))
+
+    # UPDATE direto: não dispara os sinais de save() (resumo de rendimentos)
+    Deposit.objects.filter(pk=deposit_id).update(
+        proof_of_payment=proof_name, proof_thumbnail=thumbnail_name, proof_status=Deposit.PROOF_READY,
+        proof_sha256=digest,
+    )
+    if proof_name != original.name:
+        # No armazenamento endereçado pelo conteúdo fica para o comando 'cleanup_media'
+        storage.delete(original.name)
+    return Deposit.PROOF_READY
+
+
+def process_pending_proofs(limit=100):
+    """Processa até 'limit' comprovativos pendentes, dos mais antigos para os mais novos."""
+    pending = list(
+        Deposit.objects.filter(proof_status=Deposit.PROOF_PENDING)
+        .order_by('created_at')
+        .values_list('id', flat=True)[:limit]
+    )
+    results = {}
+    for deposit_id in pending:
+        status = process_proof(deposit_id)
+        if status is not None:
+            results[status] = results.get(status, 0) + 1
+    return results
+
+
+def requeue_stuck_proofs(include_failed=False):
+    """Devolve à fila os comprovativos presos em 'processing' (worker interrompido) e, opcionalmente, os que falharam."""
+    statuses = [Deposit.PROOF_PROCESSING] + ([Deposit.PROOF_FAILED] if include_failed else [])
+    return Deposit.objects.filter(proof_status__in=statuses).update(proof_status=Deposit.PROOF_PENDING)
+
+
+def _run_in_thread(deposit_id):
+    try:
+        process_proof(deposit_id)
+    except Exception:
+        # O depósito fica em 'processing'; o comando com --requeue o devolve à fila
+        logger.exception('Erro ao processar o comprovativo do depósito %s.', deposit_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue_proof(deposit_id):
+    """
+    Agenda o processamento no pool local após o commit da transação atual.
+    Sem workers locais (DEPOSIT_PROOF_WORKERS=0), o comando process_deposit_proofs cuida da fila.
+    """
+    global _executor
+    if WORKERS <= 0:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='deposit-proofs')
+    transaction.on_commit(lambda: _executor.submit(_run_in_thread, deposit_id))
@@ -0,0 +1,55 @@
+"""
+Limitador de taxa por usuário (token bucket), sem Redis.
+
+O estado de cada balde fica no cache do Django (settings.CACHES): com o
+LocMemCache padrão o limite vale por processo; com DatabaseCache ou
+FileBasedCache é compartilhado entre workers. A leitura/gravação do balde
+não é atômica entre processos, então o limite é aproximado: ele só serve
+para conter rajadas; a consistência dos dados fica com os UPDATEs
+condicionais de cada operação.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+
+KEY_PREFIX = 'core:ratelimit'
+
+_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    'capacity' fichas no máximo, repostas à razão de 'refill_rate' fichas por
+    segundo. Cada chamada a 'consume' gasta uma ficha, se houver.
+    """
+
+    def __init__(self, name, capacity, refill_rate):
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        # Depois deste tempo sem uso o balde está cheio de novo: a chave pode expirar
+        self.timeout = max(int(capacity / refill_rate) + 1, 1) if refill_rate > 0 else None
+
+    def _key(self, identifier):
+        return f'{KEY_PREFIX}:{self.name}:{identifier}'
+
+    def consume(self, identifier, now=None):
+        """Gasta uma ficha de 'identifier'. Retorna False se o balde estiver vazio."""
+        if self.capacity <= 0:
+            return True  # Limite desativado
+
+        now = time.time() if now is None else now
+        key = self._key(identifier)
+        with _lock:
+            tokens, updated_at = cache.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + max(now - updated_at, 0) * self.refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            cache.set(key, (tokens, now), self.timeout)
+        return allowed
+
+    def reset(self, identifier):
+        cache.delete(self._key(identifier))
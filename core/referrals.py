@@ -0,0 +1,105 @@
+"""
+Índice da árvore de convites (caminho materializado em CustomUser).
+
+Cada usuário guarda em 'referral_path' os ids de todos os seus ancestrais
+("/1/5/12/") e em 'referral_depth' a sua profundidade. Assim, a rede
+(downline) de um usuário é um simples filtro por prefixo, que usa o
+índice da coluna, em vez de consultas recursivas sobre 'invited_by'.
+"""
+from django.db.models import Count, Sum
+
+from .cache import invalidate
+from .models import CustomUser, UserLevel
+from .user_cache import invalidate_users
+
+
+def descendant_prefix(user):
+    """Prefixo compartilhado pelo 'referral_path' de todos os descendentes de 'user'."""
+    return f'{user.referral_path}{user.id}/'
+
+
+def assign_inviter(user, inviter):
+    """
+    Define quem convidou 'user' e preenche o caminho materializado.
+    Deve ser chamado antes de salvar o novo usuário.
+    """
+    user.invited_by = inviter
+    if inviter is None:
+        user.referral_path = '/'
+        user.referral_depth = 0
+    else:
+        user.referral_path = descendant_prefix(inviter)
+        user.referral_depth = inviter.referral_depth + 1
+
+
+def downline(user, max_depth=None):
+    """
+    Queryset de todos os membros da rede de 'user'.
+    Com 'max_depth', limita aos níveis 1..max_depth (1 = convidados diretos).
+    """
+    members = CustomUser.objects.filter(referral_path__startswith=descendant_prefix(user))
+    if max_depth is not None:
+        members = members.filter(referral_depth__lte=user.referral_depth + max_depth)
+    return members
+
+
+def downline_size_by_depth(user, max_depth=None):
+    """Retorna {nível relativo: quantidade de membros} da rede de 'user'."""
+    rows = (
+        downline(user, max_depth)
+        .order_by()
+        .values('referral_depth')
+        .annotate(total=Count('id'))
+    )
+    return {row['referral_depth'] - user.referral_depth: row['total'] for row in rows}
+
+
+def downline_investment(user, max_depth=None):
+    """Soma dos valores dos níveis ativos comprados pela rede de 'user'."""
+    members = downline(user, max_depth)
+    total = UserLevel.objects.filter(
+        user__in=members.values('id'), is_active=True
+    ).aggregate(total=Sum('level__deposit_value'))['total']
+    return total or 0
+
+
+def rebuild_referral_paths(batch_size=1000):
+    """
+    Recalcula 'referral_path' e 'referral_depth' de todos os usuários a partir
+    de 'invited_by', nível a nível (busca em largura), gravando em lotes.
+
+    Usuários presos num ciclo de convites (que não alcançam uma raiz) são
+    tratados como raízes. Retorna a quantidade de linhas alteradas.
+    """
+    children = {}
+    current = {}
+    for user_id, invited_by_id, path, depth in CustomUser.objects.values_list(
+        'id', 'invited_by_id', 'referral_path', 'referral_depth'
+    ).iterator(chunk_size=batch_size):
+        children.setdefault(invited_by_id, []).append(user_id)
+        current[user_id] = (path, depth)
+
+    computed = {}
+    frontier = [(user_id, '/', 0) for user_id in children.get(None, [])]
+    while frontier:
+        next_frontier = []
+        for user_id, path, depth in frontier:
+            computed[user_id] = (path, depth)
+            child_path = f'{path}{user_id}/'
+            for child_id in children.get(user_id, []):
+                next_frontier.append((child_id, child_path, depth + 1))
+        frontier = next_frontier
+
+    for user_id in current.keys() - computed.keys():
+        computed[user_id] = ('/', 0)
+
+    changed = [
+        CustomUser(id=user_id, referral_path=path, referral_depth=depth)
+        for user_id, (path, depth) in computed.items()
+        if current[user_id] != (path, depth)
+    ]
+    CustomUser.objects.bulk_update(changed, ['referral_path', 'referral_depth'], batch_size=batch_size)
+    invalidate_users(user.id for user in changed)
+    if changed:
+        invalidate('inviters')  # Caminhos guardados por core.signup.resolve_inviter
+    return len(changed)
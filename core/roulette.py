@@ -0,0 +1,172 @@
+"""
+Sorteio dos prêmios da roleta.
+
+Os prêmios e pesos (RoulettePrize) são compilados numa tabela de alias
+(método de Vose) uma única vez por versão da configuração (core.cache),
+com expiração após CONFIG_CACHE_TIMEOUT, e cada giro custa O(1): um
+índice e uma "moeda" sorteados com o gerador do módulo secrets. Toda a
+aritmética é inteira, então as probabilidades são exatamente peso / soma
+dos pesos.
+"""
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .cache import CONFIG_CACHE_TIMEOUT, get_roulette_settings, get_version
+from .ledger import LedgerConditionFailed, credit
+from .models import CustomUser, LedgerEntry, Roulette, RoulettePrize
+from .ratelimit import TokenBucket
+
+
+# Prêmios usados quando nada foi configurado no Admin (sorteio uniforme)
+DEFAULT_PRIZES = [100, 200, 300, 500, 1000, 2000]
+
+_rng = secrets.SystemRandom()
+
+# Toques repetidos no app: no máximo ROULETTE_SPIN_BURST giros seguidos, depois
+# ROULETTE_SPIN_RATE giros por segundo
+spin_limiter = TokenBucket(
+    'roulette_spin',
+    capacity=getattr(settings, 'ROULETTE_SPIN_BURST', 5),
+    refill_rate=getattr(settings, 'ROULETTE_SPIN_RATE', 1.0),
+)
+
+
+class NoSpinsLeft(Exception):
+    """O usuário não tem giros disponíveis."""
+
+
+class SpinRateLimited(Exception):
+    """Giros demais em pouco tempo."""
+
+
+class AliasTable:
+    """Tabela de alias de Vose para pesos inteiros."""
+
+    def __init__(self, values, weights):
+        pairs = [(value, int(weight)) for value, weight in zip(values, weights) if int(weight) > 0]
+        if not pairs:
+            raise ValueError('A roleta precisa de pelo menos um prêmio com peso positivo.')
+
+        self.values = [value for value, _ in pairs]
+        n = len(pairs)
+        self.total = sum(weight for _, weight in pairs)
+
+        # Probabilidades escaladas por n * total, para manter tudo em inteiros
+        scaled = [weight * n for _, weight in pairs]
+        self.threshold = [self.total] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < self.total]
+        large = [i for i, p in enumerate(scaled) if p >= self.total]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.threshold[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] += scaled[s] - self.total
+            (small if scaled[l] < self.total else large).append(l)
+
+    def __len__(self):
+        return len(self.values)
+
+    def sample(self, rng=_rng):
+        i = rng.randrange(len(self.values))
+        if rng.randrange(self.total) < self.threshold[i]:
+            return self.values[i]
+        return self.values[self.alias[i]]
+
+    def probabilities(self):
+        """Probabilidade de cada valor (para testes e diagnóstico)."""
+        n = len(self.values)
+        result = {}
+        for i, value in enumerate(self.values):
+            result[value] = result.get(value, 0) + self.threshold[i] / (n * self.total)
+            alias_value = self.values[self.alias[i]]
+            result[alias_value] = result.get(alias_value, 0) + (self.total - self.threshold[i]) / (n * self.total)
+        return result
+
+
+def _load_prizes(roulette_settings):
+    if roulette_settings is not None:
+        rows = list(RoulettePrize.objects.filter(settings=roulette_settings, weight__gt=0).values_list('amount', 'weight'))
+        if rows:
+            return rows
+        if roulette_settings.prizes:
+            # Configuração legada em CSV, com os pesos antigos (<= 1000 vale 3x)
+            amounts = [int(p.strip()) for p in roulette_settings.prizes.split(',') if p.strip().isdigit()]
+            if amounts:
+                return [(amount, 3 if amount <= 1000 else 1) for amount in amounts]
+    return [(amount, 1) for amount in DEFAULT_PRIZES]
+
+
+# (versão, instante da compilação, tabela) compilada neste processo
+_compiled = (None, None, None)
+_compile_lock = threading.Lock()
+
+
+def _is_current(compiled_version, compiled_at, version):
+    # Com um cache por processo (LocMem), a edição feita no Admin por outro worker não
+    # muda a versão vista aqui: como em core.cache, a tabela expira após CONFIG_CACHE_TIMEOUT
+    return compiled_version == version and time.monotonic() - compiled_at < CONFIG_CACHE_TIMEOUT
+
+
+def get_prize_table():
+    """
+    Retorna a AliasTable da configuração atual, recompilando quando a versão
+    muda ou depois de CONFIG_CACHE_TIMEOUT segundos.
+    """
+    global _compiled
+    version = get_version('roulette_settings')
+    compiled_version, compiled_at, table = _compiled
+    if _is_current(compiled_version, compiled_at, version):
+        return table
+
+    with _compile_lock:
+        compiled_version, compiled_at, table = _compiled
+        if not _is_current(compiled_version, compiled_at, version):
+            amounts, weights = zip(*_load_prizes(get_roulette_settings()))
+            table = AliasTable(amounts, weights)
+            _compiled = (version, time.monotonic(), table)
+    return table
+
+
+def draw_prize():
+    """Sorteia um prêmio (em KZ) da configuração atual."""
+    return get_prize_table().sample()
+
+
+def spin(user):
+    """
+    Gasta um giro de 'user' e credita o prêmio sorteado.
+
+    O giro é debitado e o prêmio creditado no mesmo UPDATE condicional
+    (roulette_spins > 0), junto com a linha de Roulette e a LedgerEntry, numa
+    única transação: toques simultâneos nunca gastam o mesmo giro duas vezes.
+    Retorna (prêmio, giros restantes).
+
+    Os giros de 'user' em memória não são consultados: o usuário da requisição
+    pode ser um retrato em cache, e giros concedidos por outro processo só
+    aparecem no banco. Quem decide é a condição do UPDATE.
+    """
+    if not spin_limiter.consume(user.pk):
+        raise SpinRateLimited()
+
+    prize = draw_prize()
+    try:
+        with transaction.atomic():
+            roulette = Roulette.objects.create(user=user, prize=prize, is_approved=True)
+            credit(
+                user, prize, LedgerEntry.REASON_ROULETTE, source=roulette, subsidy=True,
+                guard={'roulette_spins__gt': 0},
+                extra_updates={'roulette_spins': F('roulette_spins') - 1},
+            )
+            remaining = CustomUser.objects.filter(pk=user.pk).values_list('roulette_spins', flat=True).get()
+    except LedgerConditionFailed:
+        raise NoSpinsLeft()
+
+    return prize, remaining
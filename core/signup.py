@@ -0,0 +1,96 @@
+"""
+Serviço de cadastro.
+
+Caminho da requisição, pensado para picos de cadastros (campanhas com link
+de convite):
+
+- a senha é processada (PBKDF2) uma única vez;
+- quem convidou é resolvido pelo cache (id e caminho na árvore de
+  convites), sem consulta ao banco depois da primeira vez;
+- a unicidade do telefone e do código de convite é garantida pelas
+  restrições UNIQUE, sem consultas prévias;
+- o INSERT acontece numa única transação.
+
+O que não precisa estar pronto na resposta (por ora, o resumo de
+rendimentos vazio do novo usuário) vai para a fila em segundo plano
+(core.background).
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete
+
+from .background import run_after_commit
+from .cache import get_version, invalidate
+from .income import create_income_summaries
+from .models import CustomUser
+from .referrals import assign_inviter
+
+
+INVITER_CACHE_TIMEOUT = 600
+
+# Conjunto versionado (core.cache): invalidado quando os caminhos mudam ou um usuário é excluído
+INVITERS = 'inviters'
+
+
+class InvalidInviteCode(Exception):
+    """Nenhum usuário com o código de convite informado."""
+
+
+class PhoneNumberTaken(Exception):
+    """Já existe um usuário com este número de telefone."""
+
+
+def resolve_inviter(invite_code):
+    """
+    Retorna o dono de 'invite_code' como um CustomUser parcial (id e caminho
+    na árvore de convites, o suficiente para assign_inviter) ou None.
+    """
+    key = f'core:inviter:v{get_version(INVITERS)}:{invite_code}'
+    row = cache.get(key)
+    if row is None:
+        row = (
+            CustomUser.objects.filter(invite_code=invite_code)
+            .values_list('id', 'referral_path', 'referral_depth')
+            .first()
+        )
+        if row is None:
+            return None
+        cache.set(key, row, INVITER_CACHE_TIMEOUT)
+    user_id, referral_path, referral_depth = row
+    return CustomUser(id=user_id, referral_path=referral_path, referral_depth=referral_depth)
+
+
+def _after_signup(user_id):
+    create_income_summaries([user_id])
+
+
+def register_user(phone_number, password, invite_code=None):
+    """
+    Cria o usuário. Levanta InvalidInviteCode ou PhoneNumberTaken.
+    Os efeitos não críticos rodam em segundo plano após o commit.
+    """
+    inviter = None
+    if invite_code:
+        inviter = resolve_inviter(invite_code)
+        if inviter is None:
+            raise InvalidInviteCode()
+
+    user = CustomUser(phone_number=phone_number)
+    user.set_password(password)
+    assign_inviter(user, inviter)
+    try:
+        with transaction.atomic():
+            user.save()
+            run_after_commit(_after_signup, user.pk)
+    except IntegrityError as error:
+        if 'phone_number' in str(error):
+            raise PhoneNumberTaken()
+        raise
+    return user
+
+
+def _user_deleted(sender, **kwargs):
+    invalidate(INVITERS)
+
+
+post_delete.connect(_user_deleted, sender=CustomUser, dispatch_uid='core.signup.user_delete')
@@ -0,0 +1,153 @@
+"""
+Armazenamento dos arquivos estáticos com otimização no collectstatic.
+
+O collectstatic executado pelo build.sh também:
+
+- recomprime PNG/JPEG sem perda visível, mantendo o original se não ficar
+  menor. Isso acontece antes do hash do ManifestFilesMixin, para que o hash
+  no nome corresponda sempre ao conteúdo servido com cache "immutable";
+
+depois do processamento do WhiteNoise (nomes com hash + .gz/.br):
+
+- deduplica arquivos idênticos: o manifesto passa a apontar todos os nomes
+  para uma única cópia (ex.: roulette_wheel.png e roulette_wheel_animated.png);
+- gera variantes WebP/AVIF (quando o Pillow tem suporte), com o hash do
+  próprio conteúdo no nome, registradas no manifesto como 'pasta/nome.webp'
+  e usadas pela tag {% picture %} (core.templatetags.assets).
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, features
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Formatos das variantes, do mais para o menos eficiente (ordem dos <source>)
+VARIANT_FORMATS = [('avif', 'AVIF'), ('webp', 'WEBP')]
+
+VARIANT_QUALITY = getattr(settings, 'STATIC_IMAGE_VARIANT_QUALITY', 80)
+
+
+def variant_name(name, extension):
+    """'icons/tarefa.png' -> 'icons/tarefa.webp'"""
+    return f'{os.path.splitext(name)[0]}.{extension}'
+
+
+def available_variant_formats():
+    return [(extension, image_format) for extension, image_format in VARIANT_FORMATS if features.check(extension)]
+
+
+class OptimizedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = self._recompress_images(paths)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        self._deduplicate()
+        for name, hashed_name in self._create_variants():
+            yield name, hashed_name, True
+        # O manifesto já foi gravado pelo ManifestFilesMixin: grava de novo com as alterações
+        self.save_manifest()
+
+    def _read(self, name):
+        with self.open(name) as handle:
+            return handle.read()
+
+    def _recompress_images(self, paths):
+        """
+        Regrava a cópia sem hash das imagens (já copiada pelo collectstatic)
+        recomprimida e faz o ManifestFilesMixin calcular o hash a partir dela.
+        """
+        paths = dict(paths)
+        for name, (storage, path) in list(paths.items()):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            with storage.open(path) as handle:
+                data = handle.read()
+            try:
+                with Image.open(BytesIO(data)) as image:
+                    optimized = self._recompress(image)
+            except (OSError, ValueError):
+                continue
+            if optimized is None or len(optimized) >= len(data):
+                continue
+            self.delete(name)
+            self._save(name, ContentFile(optimized))
+            paths[name] = (self, name)
+        return paths
+
+    def _deduplicate(self):
+        canonical = {}
+        for hashed_name in sorted(set(self.hashed_files.values())):
+            if not self.exists(hashed_name):
+                continue
+            digest = hashlib.sha256(self._read(hashed_name)).hexdigest()
+            canonical.setdefault(digest, hashed_name)
+            if canonical[digest] == hashed_name:
+                continue
+            for name, value in self.hashed_files.items():
+                if value == hashed_name:
+                    self.hashed_files[name] = canonical[digest]
+            for path in (hashed_name, f'{hashed_name}.gz', f'{hashed_name}.br'):
+                self.delete(path)
+
+    def _create_variants(self):
+        formats = available_variant_formats()
+        if not formats:
+            return
+        names_by_file = {}
+        for name, hashed_name in list(self.hashed_files.items()):
+            if hashed_name.lower().endswith(IMAGE_EXTENSIONS):
+                names_by_file.setdefault(hashed_name, []).append(name)
+
+        for hashed_name, names in sorted(names_by_file.items()):
+            names.sort()
+            data = self._read(hashed_name)
+            with Image.open(BytesIO(data)) as image:
+                image.load()
+                for extension, image_format in formats:
+                    encoded = self._encode(image, image_format)
+                    if encoded is None or len(encoded) >= len(data):
+                        continue  # A variante não compensa: o <picture> usa só o original
+                    content = ContentFile(encoded)
+                    variant = self.hashed_name(variant_name(names[0], extension), content)
+                    if not self.exists(variant):
+                        self._save(variant, content)
+                    for name in names:
+                        # Um .webp/.avif de verdade com o mesmo nome tem prioridade
+                        self.hashed_files.setdefault(variant_name(name, extension), variant)
+                    yield names[0], variant
+
+    @staticmethod
+    def _recompress(image):
+        buffer = BytesIO()
+        try:
+            if image.format == 'PNG':
+                image.save(buffer, format='PNG', optimize=True)
+            elif image.format == 'JPEG':
+                # 'keep' reaproveita as tabelas de quantização: sem nova perda de qualidade
+                image.save(buffer, format='JPEG', quality='keep', optimize=True, progressive=True)
+            else:
+                return None
+        except (OSError, ValueError):
+            return None
+        return buffer.getvalue()
+
+    @staticmethod
+    def _encode(image, image_format):
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        buffer = BytesIO()
+        try:
+            image.save(buffer, format=image_format, quality=VARIANT_QUALITY)
+        except (OSError, ValueError, KeyError):
+            return None
+        return buffer.getvalue()
@@ -0,0 +1,128 @@
+"""
+Armazenamento de mídia endereçado pelo conteúdo.
+
+Cada arquivo enviado é gravado como '<pasta>/<aa>/<sha256><extensão>': o
+mesmo conteúdo (ex.: o mesmo print de comprovativo enviado várias vezes)
+é gravado uma única vez, e como o nome muda sempre que o conteúdo muda,
+o navegador pode guardar o arquivo por bastante tempo.
+
+Dois backends, com a lógica de nomes em ContentAddressedMixin:
+- ContentAddressedFileSystemStorage: disco local (MEDIA_ROOT);
+- ContentAddressedS3Storage: bucket privado compatível com S3 (AWS, MinIO,
+  R2...), configurado pelas variáveis AWS_* do django-storages. É o padrão
+  quando AWS_STORAGE_BUCKET_NAME está definido: o disco do Render é
+  temporário e perderia os comprovativos a cada deploy.
+
+Como um mesmo arquivo pode pertencer a vários registros, delete() não
+remove nada: os arquivos sem referência são removidos (purge) pelo comando
+'cleanup_media' (core.media_cleanup).
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.utils import validate_file_name
+from django.http import FileResponse, Http404
+from django.utils.cache import patch_cache_control
+from storages.backends.s3 import S3Storage
+
+
+# Tempo (segundos) que o navegador da equipe guarda um arquivo endereçado pelo
+# conteúdo. Sempre 'private': comprovativos não podem ficar em proxies/CDNs.
+MEDIA_BROWSER_CACHE_SECONDS = 86400
+
+_DIGEST_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/([0-9a-f]{64})(?:\.[^/]*)?$')
+
+
+def file_digest(content, chunk_size=64 * 1024):
+    """SHA-256 (hex) de um arquivo do Django, lido em blocos; a posição volta ao início."""
+    sha256 = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(chunk_size) if hasattr(content, 'chunks') else iter(lambda: content.read(chunk_size), b''):
+        sha256.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha256.hexdigest()
+
+
+def digest_from_name(name):
+    """Retorna o SHA-256 contido num nome gerado por estes backends (ou None)."""
+    match = _DIGEST_RE.search(name or '')
+    return match.group(1) if match else None
+
+
+class ContentAddressedMixin:
+    content_addressed = True
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        digest = file_digest(content)
+        name = posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+        # Conteúdo já gravado: reutiliza o arquivo existente
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        # O nome é definido pelo conteúdo: nunca é preciso gerar um nome alternativo
+        return name
+
+    def delete(self, name):
+        # O arquivo pode estar referenciado por outros registros
+        pass
+
+    def purge(self, name):
+        """Remove o arquivo de fato (somente os sem referência, ver core.media_cleanup)."""
+        super().delete(name)
+
+
+class ContentAddressedFileSystemStorage(ContentAddressedMixin, FileSystemStorage):
+    def __init__(self, *args, allow_overwrite=True, **kwargs):
+        # Dois envios simultâneos do mesmo conteúdo gravam bytes idênticos no mesmo nome
+        super().__init__(*args, allow_overwrite=allow_overwrite, **kwargs)
+
+
+class ContentAddressedS3Storage(ContentAddressedMixin, S3Storage):
+    def get_default_settings(self):
+        defaults = super().get_default_settings()
+        # Comprovativos: URLs sempre assinados e com validade (AWS_QUERYSTRING_EXPIRE),
+        # direto do bucket (um domínio próprio dispensaria a assinatura)
+        defaults['querystring_auth'] = True
+        defaults['custom_domain'] = None
+        defaults['object_parameters'] = {
+            **defaults.get('object_parameters', {}),
+            'CacheControl': f'private, max-age={MEDIA_BROWSER_CACHE_SECONDS}',
+        }
+        defaults['file_overwrite'] = True
+        return defaults
+
+
+@staff_member_required
+def serve_media(request, path):
+    """
+    Serve a mídia do armazenamento padrão somente para a equipe: os
+    comprovativos trazem os dados bancários dos usuários. Nomes endereçados
+    pelo conteúdo ficam no cache do navegador; os demais (arquivos antigos)
+    são revalidados a cada acesso.
+    """
+    if not path or not default_storage.exists(path):
+        raise Http404('Arquivo não encontrado.')
+    response = FileResponse(default_storage.open(path, 'rb'))
+    if digest_from_name(path):
+        patch_cache_control(response, private=True, max_age=MEDIA_BROWSER_CACHE_SECONDS)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,186 @@
+"""
+Particionamento e arquivamento do histórico de tarefas (Task).
+
+O motor de ganhos (core.accrual) grava uma linha de Task por nível ativo e
+por dia, então a tabela cresce sem parar. Duas peças mantêm o custo sob
+controle:
+
+- PostgreSQL: core_task é particionada por mês de completed_at (migração
+  0012; a tabela antiga virou a partição DEFAULT). O comando
+  'create_task_partitions' cria as partições mensais com antecedência e move
+  para elas as linhas que estiverem na DEFAULT. Nos outros bancos (SQLite)
+  a tabela continua única, com o índice (user, completed_at).
+- Arquivamento ('archive_tasks'): os meses anteriores aos KEEP_MONTHS mais
+  recentes são somados em TaskMonthlySummary (uma linha por usuário e mês)
+  e removidos; no PostgreSQL a partição inteira é desanexada e descartada,
+  sem DELETE linha a linha. A soma e a remoção acontecem na mesma transação.
+
+Ganhos totais de tarefas = resumos mensais + linhas ainda não arquivadas
+(lifetime_task_earnings). O histórico (core.history) lista apenas as
+tarefas não arquivadas.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+from .models import Task, TaskMonthlySummary
+
+
+ZERO = Decimal('0.00')
+
+# Meses mantidos linha a linha (o mês atual conta como um)
+KEEP_MONTHS = getattr(settings, 'TASK_ARCHIVE_KEEP_MONTHS', 3)
+
+TABLE = Task._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """(início, início do mês seguinte) do mês local 'month', com fuso horário."""
+    start = timezone.make_aware(datetime.combine(month, time.min))
+    end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min))
+    return start, end
+
+
+# --- PARTIÇÕES (PostgreSQL) ---
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def _partition_exists(cursor, month):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [partition_name(month)])
+    return cursor.fetchone()[0]
+
+
+def create_partition(month):
+    """
+    Cria a partição de 'month' (se ainda não existir), movendo para ela as
+    linhas do mês que estejam na partição DEFAULT. Retorna as linhas movidas
+    ou None se a partição já existia.
+    """
+    name = partition_name(month)
+    start, end = month_bounds(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if _partition_exists(cursor, month):
+            return None
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE completed_at >= %s AND completed_at < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end],
+        )
+        moved = cursor.rowcount
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [start, end])
+    return moved
+
+
+def ensure_partitions(months_ahead=2, now=None):
+    """
+    Cria as partições do mês mais antigo ainda na DEFAULT até 'months_ahead'
+    meses à frente. Retorna [(mês, linhas movidas)] das partições criadas.
+    """
+    current = month_start(timezone.localdate(now))
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(completed_at) FROM {DEFAULT_PARTITION}')
+        oldest = cursor.fetchone()[0]
+    month = min(current, month_start(timezone.localdate(oldest))) if oldest else current
+
+    created = []
+    while month <= add_months(current, months_ahead):
+        moved = create_partition(month)
+        if moved is not None:
+            created.append((month, moved))
+        month = add_months(month, 1)
+    return created
+
+
+def _drop_partition(cursor, month):
+    name = partition_name(month)
+    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+    cursor.execute(f'DROP TABLE {name}')
+
+
+# --- ARQUIVAMENTO ---
+
+def _add_to_summaries(month, rows, batch_size):
+    rows = {row['user_id']: row for row in rows}
+    user_ids = list(rows)
+    for offset in range(0, len(user_ids), batch_size):
+        chunk = user_ids[offset:offset + batch_size]
+        TaskMonthlySummary.objects.bulk_create(
+            [TaskMonthlySummary(user_id=user_id, month=month) for user_id in chunk], ignore_conflicts=True
+        )
+        # Um mês arquivado de novo (linhas criadas depois, ex.: pelo Admin) soma ao resumo existente
+        summaries = list(TaskMonthlySummary.objects.select_for_update().filter(month=month, user_id__in=chunk))
+        for summary in summaries:
+            summary.task_count += rows[summary.user_id]['count']
+            summary.earnings_total += rows[summary.user_id]['total']
+        TaskMonthlySummary.objects.bulk_update(summaries, ['task_count', 'earnings_total'])
+
+
+def archive_month(month, batch_size=1000):
+    """Soma as tarefas do mês local 'month' em TaskMonthlySummary e as remove. Retorna as linhas arquivadas."""
+    start, end = month_bounds(month)
+    tasks = Task.objects.filter(completed_at__gte=start, completed_at__lt=end)
+    with transaction.atomic():
+        rows = list(tasks.order_by().values('user_id').annotate(count=Count('id'), total=Sum('earnings')))
+        archived = sum(row['count'] for row in rows)
+        _add_to_summaries(month, rows, batch_size)
+
+        if is_partitioned():
+            with connection.cursor() as cursor:
+                if _partition_exists(cursor, month):
+                    _drop_partition(cursor, month)
+                    return archived
+        tasks.delete()  # Sem partição (SQLite ou linhas na DEFAULT): DELETE pelo intervalo
+    return archived
+
+
+def archive_tasks(keep_months=KEEP_MONTHS, now=None, batch_size=1000):
+    """
+    Arquiva os meses anteriores aos 'keep_months' mais recentes (mínimo 1:
+    o mês atual nunca é arquivado). Retorna [(mês, linhas arquivadas)].
+    """
+    cutoff = add_months(month_start(timezone.localdate(now)), -(max(keep_months, 1) - 1))
+    oldest = Task.objects.filter(completed_at__lt=month_bounds(cutoff)[0]).aggregate(oldest=Min('completed_at'))['oldest']
+    if oldest is None:
+        return []
+
+    archived = []
+    month = month_start(timezone.localdate(oldest))
+    while month < cutoff:
+        archived.append((month, archive_month(month, batch_size)))
+        month = add_months(month, 1)
+    return archived
+
+
+def lifetime_task_earnings(user_ids):
+    """{user_id: ganhos totais de tarefas} = resumos mensais + tarefas não arquivadas."""
+    totals = {}
+    for queryset, field in ((TaskMonthlySummary.objects, 'earnings_total'), (Task.objects, 'earnings')):
+        rows = queryset.filter(user_id__in=user_ids).order_by().values('user_id').annotate(total=Sum(field))
+        for row in rows:
+            totals[row['user_id']] = totals.get(row['user_id'], ZERO) + (row['total'] or ZERO)
+    return totals
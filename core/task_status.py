@@ -0,0 +1,80 @@
+"""
+Estado do ciclo de 24h para o contador da página 'tarefa'.
+
+A página consulta periodicamente o endpoint 'tarefa_status' (view
+assíncrona) em vez de recarregar o HTML. A resposta vem do cache do Django:
+o banco só é consultado quando a entrada não existe. A chave usa a versão
+do retrato do usuário, trocada por core.user_cache.invalidate_users(), ou
+seja, sempre que o saldo ou o nível ativo mudam (inclusive quando o motor
+core.accrual aplica um ganho). O tempo restante é calculado a cada
+resposta a partir do momento do próximo ganho guardado.
+
+Como o ganho é aplicado por outro processo (worker 'apply_daily_gains'),
+o cache só é usado se for compartilhado entre os processos
+(user_cache.snapshots_enabled); caso contrário o estado é lido do banco.
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .accrual import next_gain_time_for
+from .models import CustomUser, UserLevel
+from .user_cache import atask_status_key, snapshots_enabled, task_status_key
+
+
+TASK_STATUS_CACHE_TIMEOUT = 300
+
+
+def _load_status(user_id):
+    balance = CustomUser.objects.filter(pk=user_id).values_list('available_balance', flat=True).first()
+    user_level = (
+        UserLevel.objects.select_related('level')
+        .filter(user_id=user_id, is_active=True)
+        .order_by('id')
+        .only('purchase_date', 'last_daily_gain_date', 'level__daily_gain')
+        .first()
+    )
+    return {
+        'has_active_level': user_level is not None,
+        'daily_gain': str(user_level.level.daily_gain) if user_level else None,
+        'last_gain_at': user_level.last_daily_gain_date.isoformat() if user_level and user_level.last_daily_gain_date else None,
+        'next_gain_at': next_gain_time_for(user_level).isoformat() if user_level else None,
+        'available_balance': str(balance) if balance is not None else None,
+    }
+
+
+def _with_time_remaining(status, now=None):
+    status = dict(status)
+    remaining = 0
+    if status['next_gain_at']:
+        now = now or timezone.now()
+        remaining = max(0, int((parse_datetime(status['next_gain_at']) - now).total_seconds()))
+    status['time_remaining'] = remaining
+    status['gain_ready'] = status['has_active_level'] and remaining == 0
+    return status
+
+
+def get_task_status(user_id, now=None):
+    """Estado do ciclo de 'user_id' (do cache, se possível), com o tempo restante em segundos."""
+    if not snapshots_enabled():
+        return _with_time_remaining(_load_status(user_id), now)
+    # Chave obtida antes do banco: um estado lido antes de uma alteração fica na versão antiga
+    key = task_status_key(user_id)
+    status = cache.get(key)
+    if status is None:
+        status = _load_status(user_id)
+        cache.set(key, status, TASK_STATUS_CACHE_TIMEOUT)
+    return _with_time_remaining(status, now)
+
+
+async def aget_task_status(user_id, now=None):
+    """Versão assíncrona de get_task_status: o banco só é acessado (numa thread) sem o cache."""
+    if not snapshots_enabled():
+        return _with_time_remaining(await sync_to_async(_load_status)(user_id), now)
+    key = await atask_status_key(user_id)
+    status = await cache.aget(key)
+    if status is None:
+        status = await sync_to_async(_load_status)(user_id)
+        await cache.aset(key, status, TASK_STATUS_CACHE_TIMEOUT)
+    return _with_time_remaining(status, now)
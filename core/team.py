@@ -0,0 +1,76 @@
+"""
+Serviço de resumo da equipa (convidados diretos) de um usuário.
+
+O resumo traz apenas contagens (total, investidores, por nível); os
+membros são listados por páginas com cursor (core.pagination), tanto na
+página da equipa quanto na API, de modo que o custo de cada página não
+cresce com o tamanho da equipa.
+"""
+from django.db.models import Count, Exists, OuterRef
+
+from .cache import get_levels
+from .models import CustomUser, UserLevel
+from .pagination import keyset_page
+
+
+NON_INVESTED_LABEL = 'Não Investido'
+
+# Tamanho padrão de página dos membros (página da equipa e API)
+MEMBERS_PAGE_SIZE = 50
+
+
+def team_summary(user):
+    """
+    Calcula o resumo da equipa com duas consultas agregadas: uma para o
+    total de membros e de investidores, outra para a contagem por nível.
+
+    Retorna um dicionário com 'team_count', 'levels_data' (primeira entrada
+    = não investidos, com id 'none'), 'total_investors' e
+    'total_non_investors'.
+    """
+    active_level = UserLevel.objects.filter(user=OuterRef('pk'), is_active=True)
+    totals = CustomUser.objects.filter(invited_by=user).aggregate(
+        team_count=Count('id'),
+        total_investors=Count('id', filter=Exists(active_level)),
+    )
+
+    counts_by_level = dict(
+        UserLevel.objects.filter(user__invited_by=user, is_active=True)
+        .order_by()
+        .values('level_id')
+        .annotate(count=Count('user_id', distinct=True))
+        .values_list('level_id', 'count')
+    )
+
+    total_non_investors = totals['team_count'] - totals['total_investors']
+    levels_data = [{'id': 'none', 'name': NON_INVESTED_LABEL, 'count': total_non_investors}]
+    levels_data.extend(
+        {'id': level.id, 'name': level.name, 'count': counts_by_level.get(level.id, 0)}
+        for level in get_levels()
+    )
+
+    return {
+        'team_count': totals['team_count'],
+        'levels_data': levels_data,
+        'total_investors': totals['total_investors'],
+        'total_non_investors': total_non_investors,
+    }
+
+
+def team_members_page(user, level_id=None, cursor=None, page_size=MEMBERS_PAGE_SIZE):
+    """
+    Retorna uma página (core.pagination.KeysetPage) dos membros da equipa,
+    dos mais recentes para os mais antigos, começando depois de 'cursor'.
+    Levanta core.pagination.InvalidCursor se o cursor for inválido.
+
+    'level_id' None lista todos os membros; 'none' lista os não investidos;
+    qualquer outro valor lista os membros com aquele nível ativo.
+    """
+    members = CustomUser.objects.filter(invited_by=user)
+    if level_id == 'none':
+        members = members.exclude(userlevel__is_active=True)
+    elif level_id is not None:
+        members = members.filter(userlevel__level_id=level_id, userlevel__is_active=True).distinct()
+
+    members = members.only('id', 'phone_number', 'date_joined').with_summary()
+    return keyset_page(members, 'date_joined', cursor, page_size)
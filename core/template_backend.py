@@ -0,0 +1,27 @@
+"""
+Backend de templates do Django que mede o tempo de renderização
+(reportado pelo QueryBudgetMiddleware no cabeçalho Server-Timing).
+"""
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .middleware import record_template_time
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record_template_time(time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
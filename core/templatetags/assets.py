@@ -0,0 +1,43 @@
+"""
+{% picture 'images/neoleaf.png' alt='Logo' class='logo' %}
+
+Gera <picture> com as variantes AVIF/WebP criadas no collectstatic
+(core.static_storage) e o <img> original como alternativa. Sem manifesto
+(desenvolvimento) ou sem variantes, gera apenas o <img>.
+"""
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from ..static_storage import VARIANT_FORMATS, variant_name
+
+
+register = template.Library()
+
+
+def _variants(path):
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None) or {}
+    return [
+        (f'image/{extension}', static(variant_name(path, extension)))
+        for extension, _ in VARIANT_FORMATS
+        if variant_name(path, extension) in hashed_files
+    ]
+
+
+@register.simple_tag
+def picture(path, **attributes):
+    attributes.setdefault('alt', '')
+    img = format_html(
+        '<img src="{}"{}>',
+        static(path),
+        format_html_join('', ' {}="{}"', sorted(attributes.items())),
+    )
+    sources = _variants(path)
+    if not sources:
+        return img
+    return format_html(
+        '<picture>{}{}</picture>',
+        format_html_join('', '<source type="{}" srcset="{}">', sources),
+        img,
+    )
@@ -1,3 +1,1626 @@
-from django.test import TestCase
+import csv
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F, Sum
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from storages.backends.s3 import S3Storage
+
+from .checks import media_is_not_on_ephemeral_disk
+from .middleware import assert_within_query_budget
+from .referrals import assign_inviter, downline, rebuild_referral_paths
+from .notifications import broker, event_stream
+from . import task_status, user_cache
+from .user_cache import invalidate_users, load_user
+from .models import (
+    BankDetails, CustomUser, Deposit, LedgerEntry, Level, PlatformSettings, Roulette, RoulettePrize, RouletteSettings, Task,
+    TaskMonthlySummary, UserIncomeSummary, UserLevel, Withdrawal, WithdrawalDailyCounter, WithdrawalPolicy,
+)
+from .proofs import process_pending_proofs, process_proof
+from .accrual import _credit_chunk, apply_due_daily_gains
+from .cache import CONFIG_CACHE_TIMEOUT, get_levels, get_platform_settings, get_version
+from .invite_codes import generate_invite_codes
+from .ledger import ZERO, InsufficientBalance, LedgerConditionFailed, apply_bulk, apply_change, credit, debit
+from .history import history_page
+from .pagination import keyset_page
+from .task_archive import archive_tasks, ensure_partitions, is_partitioned, lifetime_task_earnings
+from .income import get_income_summary, rebuild_income_summaries
+from .payouts import approve_withdrawals, reject_withdrawals
+from .ratelimit import TokenBucket
+from .static_storage import OptimizedStaticFilesStorage
+from .storage import ContentAddressedS3Storage, digest_from_name
+from .media_cleanup import purge_unreferenced_media
+from .withdrawal_policy import request_withdrawal
+from .signup import register_user
+from .roulette import AliasTable, NoSpinsLeft, draw_prize, spin, spin_limiter
+
+
+class DailyGainAccrualTests(TestCase):
+    """Motor de ganhos diários em lote (core.accrual)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vip1 = Level.objects.create(
+            name='VIP 1', deposit_value=Decimal('5000'), daily_gain=Decimal('250'),
+            monthly_gain=Decimal('7500'), cycle_days=30, image='level_images/vip1.png'
+        )
+        cls.vip2 = Level.objects.create(
+            name='VIP 2', deposit_value=Decimal('15000'), daily_gain=Decimal('800'),
+            monthly_gain=Decimal('24000'), cycle_days=30, image='level_images/vip2.png'
+        )
+        cls.users = [CustomUser.objects.create_user(phone_number=f'920{i:06d}') for i in range(5)]
+        for user in cls.users:
+            UserLevel.objects.create(user=user, level=cls.vip1)
+        # Comprados há dois dias: o primeiro ganho já está devido
+        UserLevel.objects.update(purchase_date=timezone.now() - timedelta(days=2))
+
+    def _balances(self):
+        return dict(CustomUser.objects.filter(pk__in=[user.pk for user in self.users]).values_list('pk', 'available_balance'))
+
+    def test_second_run_does_not_credit_again(self):
+        self.assertEqual(apply_due_daily_gains(), (5, Decimal('1250')))
+        self.assertEqual(apply_due_daily_gains(), (0, Decimal('0')))
+
+        self.assertEqual(set(self._balances().values()), {Decimal('250')})
+        self.assertEqual(LedgerEntry.objects.filter(reason=LedgerEntry.REASON_DAILY_GAIN).count(), 5)
+        self.assertEqual(Task.objects.count(), 5)
+        self.assertEqual(UserIncomeSummary.objects.get(user=self.users[0]).task_earnings_total, Decimal('250'))
+
+    def test_interrupted_run_is_resumed(self):
+        calls = []
+
+        def crash_after_first_chunk(now, ids):
+            calls.append(ids)
+            if len(calls) > 1:
+                raise OperationalError('conexão perdida')
+            return _credit_chunk(now, ids)
+
+        with mock.patch('core.accrual._credit_chunk', side_effect=crash_after_first_chunk):
+            with self.assertRaises(OperationalError):
+                apply_due_daily_gains(chunk_size=2)
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+
+        # A nova execução só encontra os níveis que ainda não receberam o ganho
+        self.assertEqual(apply_due_daily_gains(chunk_size=2), (3, Decimal('750')))
+        self.assertEqual(set(self._balances().values()), {Decimal('250')})
+        self.assertEqual(LedgerEntry.objects.count(), 5)
+
+    def test_only_first_active_level_is_credited(self):
+        user = self.users[0]
+        first = UserLevel.objects.get(user=user)
+        second = UserLevel.objects.create(user=user, level=self.vip2)
+        UserLevel.objects.filter(pk=second.pk).update(purchase_date=timezone.now() - timedelta(days=2))
+
+        apply_due_daily_gains(user_ids=[user.pk])
+        user.refresh_from_db()
+        self.assertEqual(user.available_balance, Decimal('250'))
+        self.assertIsNone(UserLevel.objects.get(pk=second.pk).last_daily_gain_date)
+
+        # Desativado o primeiro, o seguinte passa a gerar o ganho
+        UserLevel.objects.filter(pk=first.pk).update(is_active=False)
+        self.assertEqual(apply_due_daily_gains(user_ids=[user.pk]), (1, Decimal('800')))
+
+
+class ConfigCacheTests(TestCase):
+    """Configurações e catálogo de níveis em cache versionado (core.cache)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.platform_settings = PlatformSettings.objects.create(
+            whatsapp_link='https://chat.whatsapp.com/antigo', history_text='Sobre',
+            deposit_instruction='Depósito', withdrawal_instruction='Saque',
+        )
+        cls.level = Level.objects.create(
+            name='VIP 1', deposit_value=Decimal('5000'), daily_gain=Decimal('250'),
+            monthly_gain=Decimal('7500'), cycle_days=30, image='level_images/vip1.png'
+        )
+
+    def test_platform_settings_are_cached_until_saved(self):
+        self.assertEqual(get_platform_settings().whatsapp_link, 'https://chat.whatsapp.com/antigo')
+        with self.assertNumQueries(0):
+            get_platform_settings()
+
+        self.platform_settings.whatsapp_link = 'https://chat.whatsapp.com/novo'
+        self.platform_settings.save()
+        self.assertEqual(get_platform_settings().whatsapp_link, 'https://chat.whatsapp.com/novo')
+
+        self.platform_settings.delete()
+        self.assertIsNone(get_platform_settings())
+
+    def test_stale_read_before_commit_is_discarded(self):
+        get_platform_settings()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.platform_settings.whatsapp_link = 'https://chat.whatsapp.com/novo'
+            self.platform_settings.save()
+            # Outra requisição leu a linha ainda não commitada como antiga e a guardou na versão nova
+            stale = PlatformSettings.objects.get(pk=self.platform_settings.pk)
+            stale.whatsapp_link = 'https://chat.whatsapp.com/antigo'
+            cache.set(f"core:config:platform_settings:v{get_version('platform_settings')}", stale)
+            self.assertEqual(get_platform_settings().whatsapp_link, 'https://chat.whatsapp.com/antigo')
+        self.assertEqual(get_platform_settings().whatsapp_link, 'https://chat.whatsapp.com/novo')
+
+    def test_level_catalog_follows_save_and_delete(self):
+        self.assertEqual(get_levels(), [self.level])
+        with self.assertNumQueries(0):
+            get_levels()
+
+        self.level.daily_gain = Decimal('300')
+        self.level.save()
+        self.assertEqual(get_levels()[0].daily_gain, Decimal('300'))
+
+        vip2 = Level.objects.create(
+            name='VIP 2', deposit_value=Decimal('15000'), daily_gain=Decimal('800'),
+            monthly_gain=Decimal('24000'), cycle_days=30, image='level_images/vip2.png'
+        )
+        self.assertEqual(get_levels(), [self.level, vip2])
+        self.level.delete()
+        self.assertEqual(get_levels(), [vip2])
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class TeamMembersApiTests(TestCase):
+    """Página da equipa e API paginada dos membros (core.team)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.level = Level.objects.create(
+            name='VIP 1', deposit_value=Decimal('5000'), daily_gain=Decimal('250'),
+            monthly_gain=Decimal('7500'), cycle_days=30, image='level_images/vip1.png'
+        )
+        cls.inviter = CustomUser.objects.create_user(phone_number='921000000')
+        cls.members = []
+        for i in range(5):
+            member = CustomUser.objects.create_user(phone_number=f'922{i:06d}', invited_by=cls.inviter)
+            CustomUser.objects.filter(pk=member.pk).update(date_joined=timezone.now() - timedelta(days=i))
+            if i % 2 == 0:
+                UserLevel.objects.create(user=member, level=cls.level)
+            cls.members.append(member)
+        # Membro de outro promotor: nunca aparece
+        CustomUser.objects.create_user(phone_number='923000000')
+
+    def setUp(self):
+        self.client.force_login(self.inviter)
+
+    def _get(self, **params):
+        response = self.client.get(reverse('equipa_membros'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_list_every_member_once_newest_first(self):
+        pages = [self._get(page_size=2)]
+        while pages[-1]['has_next']:
+            pages.append(self._get(page_size=2, cursor=pages[-1]['next_cursor']))
+        self.assertEqual([page['has_next'] for page in pages], [True, True, False])
+        self.assertEqual(
+            [member['phone_number'] for page in pages for member in page['members']],
+            [member.phone_number for member in self.members],
+        )
+        self.assertEqual(pages[0]['members'][0]['level'], 'VIP 1')
+        self.assertIsNone(pages[0]['members'][1]['level'])
+
+    def test_level_filter(self):
+        invested = self._get(level=self.level.pk)
+        self.assertEqual(len(invested['members']), 3)
+        self.assertEqual({member['level'] for member in invested['members']}, {'VIP 1'})
+
+        not_invested = self._get(level='none')
+        self.assertEqual([member['phone_number'] for member in not_invested['members']], ['922000001', '922000003'])
+
+    def test_invalid_level_or_cursor_is_rejected(self):
+        for params in ({'level': 'abc'}, {'level': '1.5'}, {'level': str(self.level.pk + 100)}, {'cursor': 'xyz'}):
+            response = self.client.get(reverse('equipa_membros'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_page_cost_does_not_grow_with_page_size(self):
+        get_levels()
+        with CaptureQueriesContext(connection) as small:
+            self._get(page_size=1)
+        with CaptureQueriesContext(connection) as large:
+            self._get(page_size=5)
+        self.assertEqual(len(small), len(large))
+
+    def test_team_page_shows_counts_and_only_the_first_page(self):
+        with mock.patch('core.views.MEMBERS_PAGE_SIZE', 1):
+            response = self.client.get(reverse('equipa'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context['team_count'], response.context['total_investors']), (5, 3))
+        self.assertEqual(
+            [(data['id'], data['count']) for data in response.context['levels_data']],
+            [('none', 2), (self.level.pk, 3)],
+        )
+        self.assertEqual([member.phone_number for member in response.context['first_members']], ['922000001'])
+        self.assertContains(response, f'data-cursor="{response.context["first_next_cursor"]}"')
+        self.assertNotContains(response, '922000003')
+
+    def test_team_page_cost_does_not_grow_with_team(self):
+        get_levels()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('equipa'))
+        for i in range(5, 15):
+            member = CustomUser.objects.create_user(phone_number=f'922{i:06d}', invited_by=self.inviter)
+            UserLevel.objects.create(user=member, level=self.level)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('equipa'))
+        self.assertEqual(len(small), len(large))
+
+
+class ReferralPathTests(TestCase):
+    """Caminho materializado da árvore de convites (core.referrals)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = register_user('924000000', 'senha-forte-123')
+        cls.child = register_user('924000001', 'senha-forte-123', cls.root.invite_code)
+        cls.grandchild = register_user('924000002', 'senha-forte-123', cls.child.invite_code)
+
+    def _paths(self, *users):
+        rows = dict(CustomUser.objects.values_list('pk', 'referral_path'))
+        return [rows[user.pk] for user in users]
+
+    def test_signup_fills_path_and_depth(self):
+        grandchild = CustomUser.objects.get(pk=self.grandchild.pk)
+        self.assertEqual(grandchild.referral_path, f'/{self.root.pk}/{self.child.pk}/')
+        self.assertEqual(grandchild.referral_depth, 2)
+        self.assertEqual(set(downline(self.root)), {self.child, self.grandchild})
+        self.assertEqual(list(downline(self.root, max_depth=1)), [self.child])
+
+    def test_rebuild_repairs_orphans(self):
+        self.assertEqual(rebuild_referral_paths(), 0)
+
+        # Quem convidou foi excluído (SET_NULL): o caminho antigo ainda aponta para ele
+        self.root.delete()
+        self.assertEqual(rebuild_referral_paths(), 2)
+        self.assertEqual(self._paths(self.child, self.grandchild), ['/', f'/{self.child.pk}/'])
+        self.assertEqual(CustomUser.objects.get(pk=self.grandchild.pk).referral_depth, 1)
+
+    def test_rebuild_terminates_on_cycles(self):
+        # Ciclo criado por edição direta: ninguém do ciclo alcança uma raiz
+        CustomUser.objects.filter(pk=self.root.pk).update(invited_by=self.grandchild)
+        output = StringIO()
+        call_command('rebuild_referral_paths', batch_size=1, stdout=output)
+        self.assertIn('2 usuário(s) atualizado(s)', output.getvalue())
+        self.assertEqual(self._paths(self.root, self.child, self.grandchild), ['/', '/', '/'])
+
+
+class LedgerTests(TestCase):
+    """Alterações atômicas de saldo com livro-razão (core.ledger)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [CustomUser.objects.create_user(phone_number=f'925{i:06d}') for i in range(4)]
+        cls.user = cls.users[0]
+        credit(cls.user, Decimal('1000'), LedgerEntry.REASON_ADJUSTMENT)
+
+    def _state(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        return user.available_balance, user.subsidy_balance, user.roulette_spins, LedgerEntry.objects.count()
+
+    def test_failed_conditions_change_nothing(self):
+        before = self._state()
+        with self.assertRaises(InsufficientBalance):
+            debit(self.user, Decimal('1000.01'), LedgerEntry.REASON_WITHDRAWAL)
+        with self.assertRaises(LedgerConditionFailed):
+            apply_change(
+                self.user, LedgerEntry.REASON_ROULETTE, amount=Decimal('500'),
+                guard={'roulette_spins__gt': 0}, extra_updates={'roulette_spins': F('roulette_spins') - 1},
+            )
+        self.assertEqual(self._state(), before)
+        self.assertEqual(self.user.available_balance, Decimal('1000'))
+
+        debit(self.user, Decimal('1000'), LedgerEntry.REASON_WITHDRAWAL)
+        self.assertEqual(self._state()[0], Decimal('0'))
+
+    def test_bulk_groups_users_by_total_delta(self):
+        first, second, third, fourth = self.users
+        with CaptureQueriesContext(connection) as queries:
+            entries = apply_bulk([
+                (first.pk, LedgerEntry.REASON_DAILY_GAIN, Decimal('250'), ZERO, None),
+                (second.pk, LedgerEntry.REASON_DAILY_GAIN, Decimal('250'), ZERO, None),
+                # Duas variações do mesmo usuário somam 250: entra no mesmo UPDATE
+                (third.pk, LedgerEntry.REASON_DAILY_GAIN, Decimal('100'), ZERO, None),
+                (third.pk, LedgerEntry.REASON_COMMISSION, Decimal('150'), ZERO, None),
+                (fourth.pk, LedgerEntry.REASON_COMMISSION, Decimal('800'), Decimal('800'), None),
+            ])
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE "core_customuser"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(len(entries), 5)
+
+        balances = dict(CustomUser.objects.values_list('pk', 'available_balance'))
+        self.assertEqual(
+            [balances[user.pk] for user in self.users],
+            [Decimal('1250'), Decimal('250'), Decimal('250'), Decimal('800')],
+        )
+        self.assertEqual(CustomUser.objects.get(pk=fourth.pk).subsidy_balance, Decimal('800'))
+
+
+class IncomeSummaryTests(TestCase):
+    """Resumo de rendimentos mantido pelos sinais e por rebuild_income_summaries (core.income)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(phone_number='926000000')
+
+    def _summary(self):
+        summary = get_income_summary(self.user)
+        return (
+            summary.approved_deposit_total, summary.approved_withdrawal_total,
+            summary.task_earnings_total, summary.today_task_earnings,
+        )
+
+    def test_signals_follow_approval_changes(self):
+        deposit = Deposit.objects.create(user=self.user, amount=Decimal('5000'), proof_of_payment='deposit_proofs/x.png')
+        withdrawal = Withdrawal.objects.create(user=self.user, amount=Decimal('2000'))
+        Task.objects.create(user=self.user, earnings=Decimal('250'))
+        self.assertEqual(self._summary(), (Decimal('0'), Decimal('0'), Decimal('250'), Decimal('250')))
+
+        deposit.is_approved = True
+        deposit.save()
+        withdrawal.status = Withdrawal.STATUS_APPROVED
+        withdrawal.save()
+        self.assertEqual(self._summary()[:2], (Decimal('5000'), Decimal('2000')))
+
+        # Valor corrigido depois da aprovação, estorno e exclusão
+        deposit.amount = Decimal('4000')
+        deposit.save()
+        withdrawal.status = Withdrawal.STATUS_PENDING
+        withdrawal.save()
+        self.assertEqual(self._summary()[:2], (Decimal('4000'), Decimal('0')))
+        deposit.delete()
+        self.assertEqual(self._summary()[:2], (Decimal('0'), Decimal('0')))
+
+    def test_rebuild_reconciles_with_source_tables(self):
+        Deposit.objects.create(user=self.user, amount=Decimal('5000'), proof_of_payment='deposit_proofs/x.png', is_approved=True)
+        Task.objects.create(user=self.user, earnings=Decimal('250'))
+        self.assertEqual(rebuild_income_summaries(), 0)
+
+        # UPDATEs em lote não disparam sinais: o resumo fica divergente até o rebuild
+        Withdrawal.objects.bulk_create([Withdrawal(user=self.user, amount=Decimal('1500'), status=Withdrawal.STATUS_APPROVED)])
+        UserIncomeSummary.objects.filter(user=self.user).update(task_earnings_total=Decimal('99'))
+
+        output = StringIO()
+        call_command('rebuild_income_summaries', stdout=output)
+        self.assertIn('1 resumo(s) corrigido(s)', output.getvalue())
+        self.assertEqual(self._summary(), (Decimal('5000'), Decimal('1500'), Decimal('250'), Decimal('250')))
+        self.assertEqual(rebuild_income_summaries(), 0)
+
+
+class HotPathIndexTests(TestCase):
+    """
+    Verifica, pelo plano de execução, que os filtros mais usados pelas views
+    utilizam os índices compostos da migração 0006.
+    """
+    USERS = 300
+    ROWS_PER_USER = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        level = Level.objects.create(
+            name='VIP 1', deposit_value=Decimal('5000'), daily_gain=Decimal('250'),
+            monthly_gain=Decimal('7500'), cycle_days=30, image='level_images/vip1.png'
+        )
+        users = CustomUser.objects.bulk_create([
+            CustomUser(phone_number=f'9{i:08d}', invite_code=f'{i:08x}') for i in range(cls.USERS)
+        ])
+        cls.user = users[0]
+        now = timezone.now()
+
+        UserLevel.objects.bulk_create([
+            UserLevel(user=user, level=level, is_active=(i % 4 != 0)) for i, user in enumerate(users)
+        ])
+        Task.objects.bulk_create([
+            Task(user=user, earnings=Decimal('250')) for user in users for _ in range(cls.ROWS_PER_USER)
+        ])
+        Withdrawal.objects.bulk_create([
+            Withdrawal(user=user, amount=Decimal('2000'), status='Aprovado' if n % 2 else 'Pending')
+            for user in users for n in range(cls.ROWS_PER_USER // 3)
+        ])
+        # Como em produção, a fila de depósitos pendentes é uma pequena fração do total
+        Deposit.objects.bulk_create([
+            Deposit(user=user, amount=Decimal('5000'), proof_of_payment='deposit_proofs/x.png', is_approved=(i % 20 != 0))
+            for i, user in enumerate(users) for _ in range(cls.ROWS_PER_USER // 3)
+        ])
+        Task.objects.update(completed_at=now - timedelta(days=1))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(
+            any(name in plan for name in index_names),
+            f'Nenhum dos índices {index_names} aparece no plano:\n{plan}'
+        )
+
+    def test_active_user_level(self):
+        self.assertUsesIndex(
+            UserLevel.objects.filter(user=self.user, is_active=True),
+            'userlevel_user_active_idx', 'userlevel_active_partial_idx',
+        )
+
+    def test_task_earnings_by_period(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            Task.objects.filter(user=self.user, completed_at__gte=since),
+            'task_user_completed_idx',
+        )
+
+    def test_withdrawal_history_and_totals(self):
+        self.assertUsesIndex(
+            Withdrawal.objects.filter(user=self.user).order_by('-created_at'),
+            'withdrawal_user_created_idx',
+        )
+        self.assertUsesIndex(
+            Withdrawal.objects.filter(user=self.user, status='Aprovado'),
+            'withdrawal_user_status_idx',
+        )
+
+    def test_deposit_totals_and_admin_queue(self):
+        # Quase todos os depósitos estão aprovados: o planejador pode preferir o índice
+        # do histórico (user, created_at); ambos começam por user_id
+        self.assertUsesIndex(
+            Deposit.objects.filter(user=self.user, is_approved=True),
+            'deposit_user_approved_idx', 'deposit_user_created_idx',
+        )
+        self.assertUsesIndex(
+            Deposit.objects.filter(user=self.user).order_by('-created_at', '-pk'),
+            'deposit_user_created_idx',
+        )
+        self.assertUsesIndex(
+            Deposit.objects.filter(is_approved=False).order_by('created_at'),
+            'deposit_pending_created_idx',
+        )
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class QueryBudgetTests(TestCase):
+    """
+    Falha se as páginas principais ultrapassarem o orçamento de consultas
+    definido em settings.QUERY_BUDGETS.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        levels = [
+            Level.objects.create(
+                name=f'VIP {i}', deposit_value=Decimal(1000 * i), daily_gain=Decimal(50 * i),
+                monthly_gain=Decimal(1500 * i), cycle_days=30, image=f'level_images/vip{i}.png'
+            )
+            for i in range(1, 6)
+        ]
+        PlatformSettings.objects.create(
+            whatsapp_link='https://chat.whatsapp.com/x', history_text='Histórico',
+            deposit_instruction='Depósito', withdrawal_instruction='Saque'
+        )
+        cls.user = CustomUser.objects.create_user(phone_number='923000000', password='senha-forte-123')
+        UserLevel.objects.create(user=cls.user, level=levels[0])
+        for i in range(40):
+            member = CustomUser.objects.create_user(phone_number=f'924{i:06d}', invited_by=cls.user)
+            UserLevel.objects.create(user=member, level=levels[i % len(levels)])
+        Task.objects.bulk_create([Task(user=cls.user, earnings=Decimal('50')) for _ in range(30)])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_views_within_budget(self):
+        for url_name in ('menu', 'tarefa', 'tarefa_status', 'equipa', 'renda', 'saque', 'perfil'):
+            with self.subTest(url_name=url_name):
+                response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Server-Timing', response)
+                assert_within_query_budget(response)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get(reverse('renda'))
+        self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        report = self.client.get(reverse('request_metrics')).json()
+        self.assertIn('renda', report['views'])
+
+
+class RoulettePrizeSamplerTests(TestCase):
+    """Verifica que o sorteio da roleta segue os pesos configurados."""
+
+    WEIGHTS = {100: 3, 200: 3, 500: 2, 1000: 1, 5000: 1}
+
+    def test_alias_table_probabilities_are_exact(self):
+        table = AliasTable(list(self.WEIGHTS), list(self.WEIGHTS.values()))
+        total = sum(self.WEIGHTS.values())
+        for amount, probability in table.probabilities().items():
+            self.assertAlmostEqual(probability, self.WEIGHTS[amount] / total, places=12)
+
+    def test_sample_distribution_chi_square(self):
+        table = AliasTable(list(self.WEIGHTS), list(self.WEIGHTS.values()))
+        rng = random.Random(2024)
+        draws = 100000
+        observed = Counter(table.sample(rng) for _ in range(draws))
+
+        total = sum(self.WEIGHTS.values())
+        chi_square = sum(
+            (observed[amount] - draws * weight / total) ** 2 / (draws * weight / total)
+            for amount, weight in self.WEIGHTS.items()
+        )
+        # Valor crítico do qui-quadrado com 4 graus de liberdade para p = 0,001
+        self.assertLess(chi_square, 18.47)
+
+    def test_zero_weight_is_never_drawn(self):
+        table = AliasTable([100, 200], [1, 0])
+        self.assertEqual({table.sample() for _ in range(200)}, {100})
+
+    def test_prize_rows_are_compiled_and_recompiled_on_change(self):
+        roulette_settings = RouletteSettings.objects.create()
+        prize = RoulettePrize.objects.create(settings=roulette_settings, amount=300, weight=1)
+        self.assertEqual(draw_prize(), 300)
+
+        prize.amount = 700
+        prize.save()
+        self.assertEqual(draw_prize(), 700)
+
+    def test_prize_table_expires_without_invalidation(self):
+        roulette_settings = RouletteSettings.objects.create()
+        prize = RoulettePrize.objects.create(settings=roulette_settings, amount=300, weight=1)
+        self.assertEqual(draw_prize(), 300)
+
+        # Edição feita por outro worker: a versão vista por este processo não muda
+        RoulettePrize.objects.filter(pk=prize.pk).update(amount=700)
+        self.assertEqual(draw_prize(), 300)
+        later = time.monotonic() + CONFIG_CACHE_TIMEOUT + 1
+        with mock.patch('core.roulette.time.monotonic', return_value=later):
+            self.assertEqual(draw_prize(), 700)
+
+
+class RouletteSpinConcurrencyTests(TransactionTestCase):
+    """Giros simultâneos do mesmo usuário nunca gastam o mesmo giro duas vezes."""
+
+    SPINS = 40
+    ATTEMPTS = 200
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(phone_number='925000000', roulette_spins=self.SPINS)
+        RoulettePrize.objects.create(settings=RouletteSettings.objects.create(), amount=100, weight=1)
+
+    def test_parallel_spins(self):
+        barrier = threading.Barrier(20)
+        results = Counter()
+        lock = threading.Lock()
+
+        def worker(attempts):
+            barrier.wait()
+            try:
+                for _ in range(attempts):
+                    # O SQLite em memória dos testes bloqueia a tabela inteira: tenta de novo
+                    while True:
+                        try:
+                            spin(CustomUser.objects.get(pk=self.user.pk))
+                            outcome = 'won'
+                        except NoSpinsLeft:
+                            outcome = 'empty'
+                        except OperationalError:
+                            time.sleep(0.001)
+                            continue
+                        break
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        with mock.patch.object(spin_limiter, 'capacity', 0):
+            threads = [threading.Thread(target=worker, args=(self.ATTEMPTS // 20,)) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.user.refresh_from_db()
+        won = Roulette.objects.filter(user=self.user).count()
+        self.assertEqual(sum(results.values()), self.ATTEMPTS)
+        self.assertEqual(won, results['won'])
+        self.assertEqual(self.user.roulette_spins, self.SPINS - won)
+        self.assertGreaterEqual(self.user.roulette_spins, 0)
+        self.assertEqual(self.user.available_balance, Decimal(100 * won))
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user, reason=LedgerEntry.REASON_ROULETTE).count(), won)
+        self.assertEqual(won, self.SPINS)
+
+    def test_rate_limiter(self):
+        bucket = TokenBucket('test', capacity=3, refill_rate=1.0)
+        self.assertEqual([bucket.consume(1, now=100.0) for _ in range(4)], [True, True, True, False])
+        self.assertTrue(bucket.consume(2, now=100.0))
+        self.assertTrue(bucket.consume(1, now=101.0))
+        self.assertFalse(bucket.consume(1, now=101.5))
+
+    def test_spins_granted_elsewhere_are_used_and_counted_from_database(self):
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        stale.roulette_spins = 0  # Retrato antigo: sem giros
+        CustomUser.objects.filter(pk=self.user.pk).update(roulette_spins=2)
+        with mock.patch.object(spin_limiter, 'capacity', 0):
+            self.assertEqual(spin(stale), (100, 1))
+            self.assertEqual(spin(stale), (100, 0))
+            with self.assertRaises(NoSpinsLeft):
+                spin(stale)
+        self.assertEqual(stale.roulette_spins, 0)
+        self.assertEqual(Roulette.objects.filter(user=self.user).count(), 2)
+
+    def test_view_rejects_burst(self):
+        self.client.force_login(self.user)
+        spin_limiter.reset(self.user.pk)
+        statuses = [self.client.post(reverse('spin_roulette')).status_code for _ in range(spin_limiter.capacity + 1)]
+        self.assertEqual(statuses[:-1], [200] * spin_limiter.capacity)
+        self.assertEqual(statuses[-1], 429)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class WithdrawalBatchTests(TestCase):
+    """Ações em lote de saques no Admin (core.payouts)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_superuser(phone_number='926000000', password='senha-forte-123')
+        cls.users = []
+        for i in range(30):
+            user = CustomUser.objects.create_user(phone_number=f'927{i:06d}')
+            BankDetails.objects.create(
+                user=user, bank_name=['BAI', 'BFA', 'BIC'][i % 3], IBAN=f'AO06{i:021d}', account_holder_name=f'Titular {i}'
+            )
+            cls.users.append(user)
+        Withdrawal.objects.bulk_create([
+            Withdrawal(user=user, amount=Decimal('2000')) for user in cls.users for _ in range(2)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.changelist = reverse('admin:core_withdrawal_changelist')
+
+    def _action(self, action, queryset):
+        return self.client.post(self.changelist, {
+            'action': action, '_selected_action': [str(pk) for pk in queryset.values_list('pk', flat=True)],
+        })
+
+    def _export(self, queryset):
+        response = self._action('export_payouts_csv', queryset)
+        self.assertTrue(response.is_async)  # Transmitido de fato sob ASGI
+
+        async def read():
+            return [line async for line in response.streaming_content]
+
+        return list(csv.reader(line.decode() for line in async_to_sync(read)()))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        response = self.client.get(self.changelist)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'AO06')
+        self.assertLess(response.request_metrics['queries'], 15)
+
+    def test_bulk_approve_and_reject(self):
+        first, second = self.users[0], self.users[1]
+        self._action('approve_selected', Withdrawal.objects.filter(user=first))
+        self._action('reject_selected', Withdrawal.objects.filter(user__in=[first, second]))
+
+        self.assertEqual(Withdrawal.objects.filter(user=first, status=Withdrawal.STATUS_APPROVED).count(), 2)
+        self.assertEqual(Withdrawal.objects.filter(user=second, status=Withdrawal.STATUS_REJECTED).count(), 2)
+        self.assertEqual(first.income_summary.approved_withdrawal_total, Decimal('4000'))
+
+        second.refresh_from_db()
+        self.assertEqual(second.available_balance, Decimal('4000'))
+        self.assertEqual(LedgerEntry.objects.filter(user=second, reason=LedgerEntry.REASON_WITHDRAWAL).count(), 2)
+
+        # Repetir a ação não altera saques já processados
+        self.assertEqual(reject_withdrawals(Withdrawal.objects.filter(user=first)), 0)
+
+    def test_export_groups_by_bank(self):
+        # Sem detalhes bancários: deve vir antes de todos os bancos
+        unbanked = CustomUser.objects.create_user(phone_number='928000000')
+        Withdrawal.objects.create(user=unbanked, amount=Decimal('2000'))
+        approve_withdrawals(Withdrawal.objects.all())
+        rows = self._export(Withdrawal.objects.all())
+
+        self.assertEqual(rows[0][0], 'Banco')
+        self.assertEqual((rows[1][0], rows[1][3]), ('', '928000000'))
+        banks = [row[0] for row in rows[2:]]
+        self.assertEqual(len(banks), 60)
+        self.assertEqual(banks, sorted(banks))
+
+    def test_export_neutralizes_spreadsheet_formulas(self):
+        user = self.users[0]
+        BankDetails.objects.filter(user=user).update(
+            bank_name='=HYPERLINK("http://x")', IBAN='+AO06', account_holder_name='@SUM(A1)'
+        )
+        approve_withdrawals(Withdrawal.objects.filter(user=user))
+        rows = self._export(Withdrawal.objects.filter(user=user))
+
+        self.assertEqual(rows[1][:3], ['\'=HYPERLINK("http://x")', "'+AO06", "'@SUM(A1)"])
+        self.assertEqual(rows[1][3], user.phone_number)
+
+
+class DepositBatchApprovalTests(TestCase):
+    """Aprovação de depósitos em lote (core.deposits)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(phone_number='928000000', is_staff=True)
+        cls.users = [CustomUser.objects.create_user(phone_number=f'929{i:06d}') for i in range(5)]
+        cls.deposits = Deposit.objects.bulk_create([
+            Deposit(user=user, amount=Decimal('5000'), proof_of_payment='deposit_proofs/x.png')
+            for user in cls.users for _ in range(3)
+        ])
+
+    def test_endpoint_approves_batch_once(self):
+        self.client.force_login(self.staff)
+        ids = [deposit.pk for deposit in self.deposits]
+        url = reverse('approve_deposits')
+
+        report = self.client.post(url, {'deposit_ids': ids + [999999]}, content_type='application/json').json()
+        self.assertEqual(report['approved'], 15)
+        self.assertEqual(report['results'][-1], {'id': 999999, 'result': 'not_found'})
+
+        # Segunda aprovação do mesmo lote não credita de novo
+        report = self.client.post(url, {'deposit_ids': ids[:3]}, content_type='application/json').json()
+        self.assertEqual(report['approved'], 0)
+        self.assertEqual({row['result'] for row in report['results']}, {'already_approved'})
+
+        for user in self.users:
+            user.refresh_from_db()
+            self.assertEqual(user.available_balance, Decimal('15000'))
+            self.assertEqual(user.income_summary.approved_deposit_total, Decimal('15000'))
+        self.assertEqual(LedgerEntry.objects.filter(reason=LedgerEntry.REASON_DEPOSIT).count(), 15)
+
+    def test_endpoint_is_staff_only(self):
+        self.client.force_login(self.users[0])
+        response = self.client.post(reverse('approve_deposits'), {'deposit_ids': [self.deposits[0].pk]}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Deposit.objects.filter(is_approved=True).exists())
+
+
+class DepositProofPipelineTests(TestCase):
+    """Processamento dos comprovativos de depósito (core.proofs)."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(phone_number='930000000')
+
+    def _upload(self, content, name='foto.jpg'):
+        return Deposit.objects.create(
+            user=self.user, amount=Decimal('5000'), proof_of_payment=SimpleUploadedFile(name, content),
+        )
+
+    def test_proof_is_downscaled_stripped_and_thumbnailed(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientação: girar 90°
+        exif[0x010F] = 'Fabricante'
+        buffer = BytesIO()
+        Image.new('RGB', (4000, 3000), 'white').save(buffer, format='JPEG', exif=exif)
+        deposit = self._upload(buffer.getvalue())
+        original_name = deposit.proof_of_payment.name
+
+        self.assertEqual(process_pending_proofs(), {Deposit.PROOF_READY: 1})
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.proof_status, Deposit.PROOF_READY)
+        self.assertNotEqual(deposit.proof_of_payment.name, original_name)
+        self.assertEqual(deposit.proof_sha256, digest_from_name(original_name))
+
+        with Image.open(deposit.proof_of_payment.path) as proof:
+            self.assertEqual(proof.size, (1200, 1600))  # Orientação aplicada e lado maior limitado
+            self.assertEqual(len(proof.getexif()), 0)
+        with Image.open(deposit.proof_thumbnail.path) as thumbnail:
+            self.assertLessEqual(max(thumbnail.size), 240)
+
+        # Já processado: nenhum worker o pega de novo
+        self.assertIsNone(process_proof(deposit.pk))
+
+    def test_invalid_image_is_marked_failed(self):
+        deposit = self._upload(b'isto nao e uma imagem', name='x.png')
+        with self.assertLogs('core.proofs', 'WARNING'):
+            self.assertEqual(process_proof(deposit.pk), Deposit.PROOF_FAILED)
+        deposit.refresh_from_db()
+        self.assertTrue(deposit.proof_of_payment.storage.exists(deposit.proof_of_payment.name))
+
+    def test_oversized_image_is_refused_without_changing_pillow_global(self):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200)).save(buffer, format='PNG')
+        deposit = self._upload(buffer.getvalue(), name='grande.png')
+        limit = Image.MAX_IMAGE_PIXELS
+        with mock.patch('core.proofs.MAX_PIXELS', 50_000), self.assertLogs('core.proofs', 'WARNING'):
+            self.assertEqual(process_proof(deposit.pk), Deposit.PROOF_FAILED)
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, limit)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'core.storage.ContentAddressedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ContentAddressedStorageTests(TestCase):
+    """Armazenamento endereçado pelo conteúdo (core.storage) e comprovativos repetidos."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff = CustomUser.objects.create_superuser(phone_number='931000000', password='senha-forte-123')
+
+    def _deposit(self, user, content, name='print.png'):
+        return Deposit.objects.create(user=user, amount=Decimal('5000'), proof_of_payment=SimpleUploadedFile(name, content))
+
+    def test_same_content_is_stored_once(self):
+        first = self._deposit(self.staff, b'mesmo conteudo', name='a.png')
+        second = self._deposit(self.staff, b'mesmo conteudo', name='b.PNG')
+        other = self._deposit(self.staff, b'outro conteudo')
+
+        self.assertEqual(first.proof_of_payment.name, second.proof_of_payment.name)
+        self.assertNotEqual(first.proof_of_payment.name, other.proof_of_payment.name)
+        digest = hashlib.sha256(b'mesmo conteudo').hexdigest()
+        self.assertEqual(first.proof_of_payment.name, f'deposit_proofs/{digest[:2]}/{digest}.png')
+        self.assertEqual(len(os.listdir(os.path.dirname(first.proof_of_payment.path))), 1)
+
+    def test_media_is_served_only_to_staff_without_public_cache(self):
+        owner = CustomUser.objects.create_user(phone_number='932100000')
+        deposit = self._deposit(owner, b'conteudo')
+        url = deposit.proof_of_payment.url
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'conteudo')
+        cache_control = response['Cache-Control']
+        self.assertIn('private', cache_control)
+        self.assertNotIn('public', cache_control)
+        self.assertNotIn('immutable', cache_control)
+        self.assertEqual(self.client.get('/media/../neoenergia/settings.py').status_code, 400)
+        self.assertEqual(self.client.get('/media/deposit_proofs/nao-existe.png').status_code, 404)
+
+    @override_settings(AWS_S3_CUSTOM_DOMAIN='cdn.example.com', AWS_S3_OBJECT_PARAMETERS={'CacheControl': 'public, immutable'})
+    def test_s3_backend_stores_once_and_signs_urls(self):
+        storage = ContentAddressedS3Storage(
+            bucket_name='comprovativos', access_key='chave', secret_key='segredo', region_name='us-east-1',
+        )
+        digest = hashlib.sha256(b'print').hexdigest()
+        with mock.patch.object(S3Storage, 'exists', return_value=False), \
+                mock.patch.object(S3Storage, '_save', side_effect=lambda name, content: name) as upload:
+            name = storage.save('deposit_proofs/print.PNG', ContentFile(b'print'))
+        self.assertEqual(name, f'deposit_proofs/{digest[:2]}/{digest}.png')
+        upload.assert_called_once()
+        with mock.patch.object(S3Storage, 'exists', return_value=True), mock.patch.object(S3Storage, '_save') as upload:
+            self.assertEqual(storage.save('deposit_proofs/outro.png', ContentFile(b'print')), name)
+        upload.assert_not_called()
+
+        # Bucket privado: URL assinado e com validade, nunca pelo domínio público
+        url = storage.url(name)
+        self.assertTrue(url.startswith('https://comprovativos.s3.amazonaws.com/'), url)
+        self.assertIn('Signature=', url)
+        self.assertIn('Expires=', url)
+        self.assertEqual(storage.get_object_parameters(name)['CacheControl'], 'private, max-age=86400')
+
+    def test_cleanup_removes_only_old_unreferenced_blobs(self):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, format='PNG')
+        deposit = self._deposit(self.staff, buffer.getvalue())
+        original = deposit.proof_of_payment.name
+        self.assertEqual(process_proof(deposit.pk), Deposit.PROOF_READY)
+        deposit.refresh_from_db()
+        storage = deposit.proof_of_payment.storage
+        self.assertTrue(storage.exists(original))  # delete() não remove arquivos endereçados
+        # Arquivo anterior ao armazenamento endereçado: nunca é removido
+        legacy = 'deposit_proofs/antigo.png'
+        with open(storage.path(legacy), 'wb') as handle:
+            handle.write(b'legado')
+
+        output = StringIO()
+        call_command('cleanup_media', stdout=output)
+        self.assertIn('0 arquivo(s) removido(s)', output.getvalue())  # Ainda dentro da carência
+
+        call_command('cleanup_media', grace_hours=0, dry_run=True, stdout=output)
+        self.assertIn(original, output.getvalue())
+        self.assertTrue(storage.exists(original))
+        self.assertEqual(purge_unreferenced_media(grace=timedelta(0)), [original])
+        self.assertFalse(storage.exists(original))
+        for name in (deposit.proof_of_payment.name, deposit.proof_thumbnail.name, legacy):
+            self.assertTrue(storage.exists(name), name)
+
+    def test_local_media_on_render_is_reported(self):
+        with override_settings(RENDER_EXTERNAL_HOSTNAME='neoenergia.onrender.com'):
+            self.assertEqual([warning.id for warning in media_is_not_on_ephemeral_disk(None)], ['core.W001'])
+        self.assertEqual(media_is_not_on_ephemeral_disk(None), [])
+
+    def test_duplicate_proofs_are_flagged_in_admin(self):
+        users = [CustomUser.objects.create_user(phone_number=f'932{i:06d}') for i in range(3)]
+        for user in users[:2]:
+            self._deposit(user, b'mesmo print')
+        self._deposit(users[2], b'print diferente')
+        with self.assertLogs('core.proofs', 'WARNING'):
+            process_pending_proofs()  # Não são imagens: falham, mas o hash é registrado
+
+        self.client.force_login(self.staff)
+        changelist = reverse('admin:core_deposit_changelist')
+        flagged = self.client.get(changelist, {'duplicate_proof': 'yes'}).context['cl'].result_list
+        self.assertEqual({deposit.user_id for deposit in flagged}, {users[0].pk, users[1].pk})
+
+
+class StaticAssetBuildTests(TestCase):
+    """collectstatic com core.static_storage: deduplicação e variantes de imagem."""
+
+    def test_collectstatic_dedupes_and_creates_variants(self):
+        source, root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'images'))
+        image = Image.linear_gradient('L').resize((512, 512)).convert('RGBA')
+        for name in ('wheel.png', 'wheel_copy.png'):
+            image.save(os.path.join(source, 'images', name))
+
+        with override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'core.static_storage.OptimizedStaticFilesStorage'},
+            },
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            storage = OptimizedStaticFilesStorage()
+            paths = storage.hashed_files
+
+            self.assertEqual(paths['images/wheel.png'], paths['images/wheel_copy.png'])
+            self.assertEqual(paths['images/wheel_copy.webp'], paths['images/wheel.webp'])
+            self.assertTrue(storage.exists(paths['images/wheel.webp']))
+
+            # O hash no nome corresponde ao conteúdo servido (cache "immutable")
+            for name in ('images/wheel.png', 'images/wheel.webp'):
+                with storage.open(paths[name]) as handle:
+                    self.assertIn(f'.{storage.file_hash(name, handle)}.', paths[name])
+            self.assertLess(
+                os.path.getsize(storage.path(paths['images/wheel.png'])),
+                os.path.getsize(os.path.join(source, 'images', 'wheel.png'))
+            )
+            self.assertEqual(
+                [name for name in storage.listdir('images')[1] if name.startswith('wheel_copy.')],
+                ['wheel_copy.png']
+            )
+
+            html = Template("{% load assets %}{% picture 'images/wheel_copy.png' alt='Roda' class='x' %}").render(Context())
+            self.assertIn('<source type="image/webp"', html)
+            self.assertIn(f'<img src="/static/{paths["images/wheel.png"]}" alt="Roda" class="x">', html)
+
+
+# Um único processo de teste: o LocMem se comporta como um cache compartilhado
+@override_settings(USER_SNAPSHOT_CACHE=True, STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class CachedAuthenticationTests(TestCase):
+    """Sessão e usuário autenticado lidos do cache (core.user_cache)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.level = Level.objects.create(
+            name='VIP 1', deposit_value=Decimal('5000'), daily_gain=Decimal('250'),
+            monthly_gain=Decimal('7500'), cycle_days=30, image='level_images/vip1.png'
+        )
+        cls.user = CustomUser.objects.create_user(phone_number='933000000', password='senha-forte-123')
+        UserLevel.objects.create(user=cls.user, level=cls.level)
+
+    def setUp(self):
+        self.client.login(phone_number='933000000', password='senha-forte-123')
+
+    def _auth_queries(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return response, [
+            query['sql'] for query in queries.captured_queries
+            if 'django_session' in query['sql'] or 'FROM "core_customuser"' in query['sql']
+        ]
+
+    def test_warm_request_has_no_auth_queries(self):
+        self._auth_queries('sobre')  # Aquece o cache
+        response, queries = self._auth_queries('sobre')
+        self.assertEqual(queries, [])
+        self.assertEqual(response.wsgi_request.user.active_level, self.level)
+
+    def test_balance_changes_invalidate_cached_user(self):
+        self._auth_queries('sobre')
+        credit(self.user, Decimal('1500'), LedgerEntry.REASON_ADJUSTMENT)
+        response, _ = self._auth_queries('sobre')
+        self.assertEqual(response.wsgi_request.user.available_balance, Decimal('1500'))
+
+        UserLevel.objects.filter(user=self.user).delete()
+        response, _ = self._auth_queries('sobre')
+        self.assertIsNone(response.wsgi_request.user.active_level)
+
+    def test_password_change_keeps_balances_changed_elsewhere(self):
+        self._auth_queries('sobre')  # Retrato em cache com saldo zero
+        # Crédito feito por outro processo: o retrato deste processo não é invalidado
+        CustomUser.objects.filter(pk=self.user.pk).update(available_balance=Decimal('900'), roulette_spins=3)
+
+        response = self.client.post(reverse('perfil'), {
+            'change_password': '1', 'old_password': 'senha-forte-123',
+            'new_password1': 'outra-senha-456', 'new_password2': 'outra-senha-456',
+        })
+        self.assertRedirects(response, reverse('perfil'), fetch_redirect_response=False)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertTrue(user.check_password('outra-senha-456'))
+        self.assertEqual((user.available_balance, user.roulette_spins), (Decimal('900'), 3))
+
+    def test_change_password_url_keeps_balances_changed_elsewhere(self):
+        self._auth_queries('sobre')  # Retrato em cache com saldo zero
+        # Crédito feito por outro processo: o retrato deste processo não é invalidado
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            available_balance=F('available_balance') + Decimal('900'), roulette_spins=3
+        )
+
+        response = self.client.post(reverse('change_password'), {
+            'old_password': 'senha-forte-123', 'new_password1': 'outra-senha-456', 'new_password2': 'outra-senha-456',
+        })
+        self.assertEqual(response.status_code, 302)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertTrue(user.check_password('outra-senha-456'))
+        self.assertEqual((user.available_balance, user.roulette_spins), (Decimal('900'), 3))
+        # A sessão continua válida com a nova senha
+        self.assertEqual(self.client.get(reverse('sobre')).status_code, 200)
+
+    def test_snapshot_does_not_store_the_password_hash(self):
+        invalidate_users([self.user.pk])
+        user = load_user(self.user.pk)
+        snapshot = cache.get(user_cache._key(self.user.pk, user_cache._get_version(self.user.pk)))
+        self.assertNotIn(self.user.password, repr(snapshot))
+        self.assertIn('password', user.get_deferred_fields())
+
+        # A sessão é verificada sem a senha; ela só é lida do banco quando usada
+        with self.assertNumQueries(0):
+            self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('senha-forte-123'))
+        user.set_password('outra-senha-456')
+        self.assertNotEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+
+    def test_stale_read_does_not_repopulate_after_invalidation(self):
+        invalidate_users([self.user.pk])
+        load_snapshot = user_cache._load_snapshot
+
+        def read_then_concurrent_credit(user_id):
+            snapshot = load_snapshot(user_id)  # Lido antes do crédito de outra requisição
+            credit(self.user, Decimal('500'), LedgerEntry.REASON_ADJUSTMENT)
+            return snapshot
+
+        with mock.patch.object(user_cache, '_load_snapshot', read_then_concurrent_credit):
+            self.assertEqual(load_user(self.user.pk).available_balance, Decimal('0'))
+        with self.assertNumQueries(1):
+            self.assertEqual(load_user(self.user.pk).available_balance, Decimal('500'))
+        with self.assertNumQueries(0):
+            self.assertEqual(load_user(self.user.pk).available_balance, Decimal('500'))
+
+    @override_settings(USER_SNAPSHOT_CACHE=False)
+    def test_without_shared_cache_user_is_read_from_database(self):
+        self._auth_queries('sobre')
+        CustomUser.objects.filter(pk=self.user.pk).update(available_balance=Decimal('700'))
+        response, queries = self._auth_queries('sobre')
+        self.assertTrue(queries)
+        self.assertEqual(response.wsgi_request.user.available_balance, Decimal('700'))
+
+
+@override_settings(USER_SNAPSHOT_CACHE=True)
+class TaskStatusEndpointTests(TestCase):
+    """Endpoint JSON assíncrono do contador da tarefa (core.task_status)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.level = Level.objects.create(
+            name='VIP 1', deposit_value=Decimal('5000'), daily_gain=Decimal('250'),
+            monthly_gain=Decimal('7500'), cycle_days=30, image='level_images/vip1.png'
+        )
+        cls.user = CustomUser.objects.create_user(phone_number='936000000', password='senha-forte-123')
+        cls.user_level = UserLevel.objects.create(user=cls.user, level=cls.level)
+        UserLevel.objects.filter(pk=cls.user_level.pk).update(purchase_date=timezone.now() - timedelta(hours=25))
+
+    async def test_status_is_served_from_cache(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('tarefa_status'))
+        status = response.json()
+        self.assertTrue(status['gain_ready'])
+        self.assertEqual(status['time_remaining'], 0)
+        self.assertEqual(status['daily_gain'], '250.00')
+        self.assertIsNone(status['last_gain_at'])
+
+        response = await self.async_client.get(reverse('tarefa_status'))
+        self.assertEqual(response.request_metrics['queries'], 0)
+
+    def test_applied_gain_invalidates_status(self):
+        self.client.force_login(self.user)
+        self.assertTrue(self.client.get(reverse('tarefa_status')).json()['gain_ready'])
+
+        self.assertEqual(apply_due_daily_gains(user_ids=[self.user.pk])[0], 1)
+        status = self.client.get(reverse('tarefa_status')).json()
+        self.assertFalse(status['gain_ready'])
+        self.assertGreater(status['time_remaining'], 23 * 3600)
+        self.assertIsNotNone(status['last_gain_at'])
+        self.assertEqual(status['available_balance'], '250.00')
+
+    def test_stale_status_read_before_commit_is_not_served(self):
+        self.client.force_login(self.user)
+        load_status = task_status._load_status
+
+        def read_then_concurrent_gain(user_id):
+            status = load_status(user_id)  # Lido antes do ganho aplicado por outra requisição
+            apply_due_daily_gains(user_ids=[self.user.pk])
+            return status
+
+        with mock.patch.object(task_status, '_load_status', read_then_concurrent_gain):
+            self.assertTrue(self.client.get(reverse('tarefa_status')).json()['gain_ready'])
+        self.assertFalse(self.client.get(reverse('tarefa_status')).json()['gain_ready'])
+
+    @override_settings(USER_SNAPSHOT_CACHE=False)
+    def test_gain_from_other_process_is_seen_without_shared_cache(self):
+        self.client.force_login(self.user)
+        self.assertTrue(self.client.get(reverse('tarefa_status')).json()['gain_ready'])
+        # Ganho aplicado por outro processo: nenhuma invalidação chega a este cache
+        UserLevel.objects.filter(pk=self.user_level.pk).update(last_daily_gain_date=timezone.now())
+        self.assertFalse(self.client.get(reverse('tarefa_status')).json()['gain_ready'])
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(reverse('tarefa_status')).status_code, 302)
+
+
+class LiveNotificationTests(TestCase):
+    """Canal SSE de saldos e status (core.notifications), com o pub/sub local."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(phone_number='937000000', password='senha-forte-123')
+        cls.withdrawal = Withdrawal.objects.create(user=cls.user, amount=Decimal('800'))
+
+    def _approve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            credit(self.user, Decimal('1500'), LedgerEntry.REASON_ADJUSTMENT)
+            approve_withdrawals(Withdrawal.objects.filter(pk=self.withdrawal.pk))
+
+    async def test_stream_pushes_balance_and_status_changes(self):
+        stream = event_stream(self.user.pk, max_seconds=5, keepalive=1)
+        try:
+            self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+            self.assertIn('"available_balance": "0.00"', await anext(stream))
+
+            await sync_to_async(self._approve)()
+            balance = await anext(stream)
+            self.assertTrue(balance.startswith('event: balance\n'))
+            self.assertIn('"available_balance": "1500.00"', balance)
+            withdrawal = await anext(stream)
+            self.assertTrue(withdrawal.startswith('event: withdrawal\n'))
+            self.assertIn(f'"id": {self.withdrawal.pk}, "status": "Aprovado"', withdrawal)
+
+            self.assertEqual(await anext(stream), ': keepalive\n\n')
+        finally:
+            await stream.aclose()
+        self.assertEqual(broker._subscribers, {})
+
+    @override_settings(USER_SNAPSHOT_CACHE=True)
+    async def test_balance_event_ignores_stale_cached_snapshot(self):
+        await sync_to_async(load_user)(self.user.pk)  # Retrato com saldo zero em cache
+        stream = event_stream(self.user.pk, max_seconds=5, keepalive=1)
+        try:
+            await anext(stream)
+            self.assertIn('"available_balance": "0.00"', await anext(stream))
+            # Crédito de outro processo: chega o NOTIFY, mas o retrato local não foi descartado
+            await CustomUser.objects.filter(pk=self.user.pk).aupdate(available_balance=Decimal('300'))
+            broker.dispatch(self.user.pk, {'type': 'balance'})
+            self.assertIn('"available_balance": "300.00"', await anext(stream))
+        finally:
+            await stream.aclose()
+
+    async def test_events_endpoint(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+        self.assertIn(b'event: balance', await anext(chunks))
+        await chunks.aclose()
+
+
+class InviteCodeAllocatorTests(TestCase):
+    """Códigos de convite garantidos pela restrição UNIQUE, sem consulta prévia (core.invite_codes)."""
+
+    def test_signup_does_not_query_for_existing_codes(self):
+        with CaptureQueriesContext(connection) as queries:
+            user = CustomUser.objects.create_user(phone_number='938000000')
+        self.assertEqual(len(user.invite_code), 8)
+        self.assertFalse([q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')])
+
+    def test_collision_is_retried(self):
+        taken = CustomUser.objects.create_user(phone_number='938000001').invite_code
+        with mock.patch('core.models.generate_invite_code', side_effect=[taken, 'novocod2']):
+            user = CustomUser.objects.create_user(phone_number='938000002')
+        self.assertEqual(user.invite_code, 'novocod2')
+
+    def test_other_integrity_errors_are_raised(self):
+        CustomUser.objects.create_user(phone_number='938000003')
+        with self.assertRaises(IntegrityError):
+            CustomUser.objects.create_user(phone_number='938000003')
+
+    def test_bulk_create_mints_distinct_codes(self):
+        taken = CustomUser.objects.create_user(phone_number='938000004').invite_code
+        users = [CustomUser(phone_number=f'939{i:06d}') for i in range(200)]
+        users[0].invite_code = 'manual01'
+        real_generate = generate_invite_codes
+        calls = []
+
+        def colliding(count, exclude=()):
+            calls.append(count)
+            codes = real_generate(count, exclude)
+            return [taken] + codes[1:] if len(calls) == 1 else codes
+
+        with mock.patch('core.models.generate_invite_codes', side_effect=colliding):
+            CustomUser.objects.bulk_create(users)
+        self.assertEqual(calls, [199, 199])
+        codes = list(CustomUser.objects.filter(phone_number__startswith='939').values_list('invite_code', flat=True))
+        self.assertEqual(len(codes), 200)
+        self.assertEqual(len(set(codes) | {taken}), 201)
+        self.assertIn('manual01', codes)
+
+
+@override_settings(BACKGROUND_WORKERS=0, STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class SignupServiceTests(TestCase):
+    """Cadastro pelo serviço core.signup."""
+
+    @classmethod
+    def setUpTestData(cls):
+        root = CustomUser.objects.create_user(phone_number='940000000')
+        cls.inviter = CustomUser.objects.create_user(phone_number='940000001')
+        assign_inviter(cls.inviter, root)
+        cls.inviter.save()
+
+    def _signup(self, phone_number, invite_code=None):
+        data = {'phone_number': phone_number, 'password': 'senha-forte-123', 'confirm_password': 'senha-forte-123'}
+        if invite_code:
+            data['invited_by_code'] = invite_code
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('cadastro'), data)
+
+    def test_signup_hashes_once_and_defers_side_effects(self):
+        with mock.patch('django.contrib.auth.base_user.make_password', wraps=make_password) as hasher:
+            response = self._signup('941000000', self.inviter.invite_code)
+        self.assertRedirects(response, reverse('menu'), fetch_redirect_response=False)
+        self.assertEqual(hasher.call_count, 1)
+
+        user = CustomUser.objects.get(phone_number='941000000')
+        self.assertEqual(user.invited_by_id, self.inviter.pk)
+        self.assertEqual(user.referral_path, f'{self.inviter.referral_path}{self.inviter.pk}/')
+        self.assertEqual(user.referral_depth, 2)
+        self.assertTrue(UserIncomeSummary.objects.filter(user=user).exists())
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+    def test_inviter_is_resolved_from_cache(self):
+        self._signup('941000001', self.inviter.invite_code)
+        self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            self._signup('941000002', self.inviter.invite_code)
+        self.assertFalse([q for q in queries.captured_queries if 'invite_code" =' in q['sql'] and q['sql'].startswith('SELECT')])
+        self.assertEqual(CustomUser.objects.get(phone_number='941000002').invited_by_id, self.inviter.pk)
+
+    def test_invalid_invite_and_duplicate_phone(self):
+        response = self._signup('941000003', 'naoexist')
+        self.assertContains(response, 'Código de convite inválido.')
+        self.assertFalse(CustomUser.objects.filter(phone_number='941000003').exists())
+
+        response = self._signup('940000001')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('phone_number'))
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class WithdrawalPolicyTests(TestCase):
+    """Regras de saque da política em cache e limite diário por contador (core.withdrawal_policy)."""
+
+    # 10:00 em Luanda (UTC+1)
+    OPEN = datetime(2026, 3, 10, 9, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(phone_number='942000000')
+        BankDetails.objects.create(user=cls.user, account_holder_name='Teste', bank_name='BAI', IBAN='AO06000000000000000000000')
+        credit(cls.user, Decimal('10000'), LedgerEntry.REASON_ADJUSTMENT)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.OPEN)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _withdraw(self, amount):
+        return self.client.post(reverse('saque'), {'amount': amount}, follow=True)
+
+    def test_daily_limit_uses_counter_and_range_bounds(self):
+        self.assertContains(self._withdraw('2000'), 'Saque solicitado com sucesso.')
+        self.assertContains(self._withdraw('2000'), 'Você só pode realizar um saque por dia.')
+        self.assertEqual(Withdrawal.objects.filter(user=self.user).count(), 1)
+        counter = WithdrawalDailyCounter.objects.get(user=self.user)
+        self.assertEqual((counter.day, counter.count, counter.total), (date(2026, 3, 10), 1, Decimal('2000')))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('saque'))
+        self.assertTrue(response.context['already_withdrawn_today'])
+        self.assertFalse([q for q in queries.captured_queries if 'cast_date' in q['sql'] or 'DATE(' in q['sql']])
+
+    def test_policy_is_configurable_and_cached(self):
+        WithdrawalPolicy.objects.create(min_amount=Decimal('500'), max_per_day=2, window_start=dt_time(11, 0))
+        self.assertContains(self._withdraw('600'), 'O saque só é permitido entre as 11:00h e as 18:00h.')
+
+        WithdrawalPolicy.objects.update(window_start=dt_time(9, 0))
+        WithdrawalPolicy.objects.first().save()  # save() invalida o cache da política
+        self.assertContains(self._withdraw('400'), 'O valor mínimo para saque é 500.00 KZ.')
+        self.assertContains(self._withdraw('600'), 'Saque solicitado com sucesso.')
+        self.assertContains(self._withdraw('600'), 'Saque solicitado com sucesso.')
+        self.assertContains(self._withdraw('600'), 'Você só pode realizar 2 saques por dia.')
+
+    def test_insufficient_balance_rolls_back_counter(self):
+        with self.assertRaises(InsufficientBalance):
+            request_withdrawal(CustomUser(pk=self.user.pk, available_balance=Decimal('99999')), Decimal('50000'))
+        self.assertFalse(WithdrawalDailyCounter.objects.filter(user=self.user, count__gt=0).exists())
+        self.assertFalse(Withdrawal.objects.filter(user=self.user).exists())
+
+
+class WithdrawalBenchmarkTests(TransactionTestCase):
+    """Envios simultâneos pelo comando benchmark_withdrawals nunca passam do limite diário."""
+
+    def test_concurrent_submits_respect_daily_limit(self):
+        for i in range(4):
+            CustomUser.objects.create_user(phone_number=f'943{i:06d}')
+        output = StringIO()
+        call_command('benchmark_withdrawals', users=4, attempts=6, concurrency=6, stdout=output, stderr=StringIO())
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['limit_violations'], [])
+        self.assertEqual(report['submits'], 24)
+        self.assertLessEqual(report['outcomes'].get('accepted', 0), 4)
+        self.assertEqual(Withdrawal.objects.count(), report['outcomes'].get('accepted', 0))
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class UserSummaryAnnotationTests(TestCase):
+    """CustomUser.objects.with_summary() e as propriedades memorizadas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.level = Level.objects.create(
+            name='VIP 2', deposit_value=Decimal('15000'), daily_gain=Decimal('800'),
+            monthly_gain=Decimal('24000'), cycle_days=30, image='level_images/vip2.png'
+        )
+        cls.inviter = CustomUser.objects.create_user(phone_number='934000000', is_staff=True, is_superuser=True)
+        for i in range(20):
+            member = CustomUser.objects.create_user(phone_number=f'935{i:06d}', invited_by=cls.inviter)
+            if i % 2:
+                UserLevel.objects.create(user=member, level=cls.level)
+                Withdrawal.objects.create(user=member, amount=Decimal('2000'), status=Withdrawal.STATUS_APPROVED)
+
+    def test_list_uses_constant_queries(self):
+        get_levels()  # Catálogo já em cache, como num worker aquecido
+        with self.assertNumQueries(1):
+            members = list(CustomUser.objects.filter(invited_by=self.inviter).order_by('phone_number').with_summary())
+            levels = [member.active_level for member in members]
+            withdrawn = [member.total_withdrawn for member in members]
+        self.assertEqual(levels[1], self.level)
+        self.assertIsNone(levels[0])
+        self.assertEqual(withdrawn[:2], [Decimal('0'), Decimal('2000')])
+
+    def test_properties_are_memoized(self):
+        member = CustomUser.objects.get(phone_number='935000001')
+        with self.assertNumQueries(2):
+            for _ in range(3):
+                self.assertEqual(member.active_level, self.level)
+                self.assertEqual(member.total_withdrawn, Decimal('2000'))
+
+    def test_admin_changelist_is_not_n_plus_one(self):
+        self.client.force_login(self.inviter)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:core_customuser_changelist'))
+        self.assertContains(response, 'VIP 2')
+        self.assertLess(len(queries), 12)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class HistoryPaginationTests(TestCase):
+    """Histórico unificado paginado por cursor (core.pagination, core.history)."""
+
+    BASE = datetime(2026, 3, 10, 9, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(phone_number='944000000')
+        other = CustomUser.objects.create_user(phone_number='944000001')
+        for i in range(15):
+            Withdrawal.objects.create(user=cls.user, amount=Decimal('2000'))
+            Deposit.objects.bulk_create([Deposit(user=cls.user, amount=Decimal('5000'), proof_of_payment='deposit_proofs/x.png')])
+            Task.objects.create(user=cls.user, earnings=Decimal('100'))
+            Roulette.objects.create(user=cls.user, prize=Decimal('50'), is_approved=True)
+        Withdrawal.objects.create(user=other, amount=Decimal('2000'))
+        # Datas repetidas entre as tabelas (e dentro delas) para exercitar os desempates
+        for model, field in ((Withdrawal, 'created_at'), (Deposit, 'created_at'), (Task, 'completed_at'), (Roulette, 'spin_date')):
+            for index, pk in enumerate(model.objects.filter(user=cls.user).values_list('pk', flat=True)):
+                model.objects.filter(pk=pk).update(**{field: cls.BASE - timedelta(hours=index // 2)})
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_cover_every_record_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 7, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(reverse('historico_api'), params).json()
+            self.assertLessEqual(len(data['entries']), 7)
+            seen.extend(data['entries'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 60)
+        self.assertEqual(len({(entry['type'], entry['id']) for entry in seen}), 60)
+        timestamps = [entry['timestamp'] for entry in seen]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+        self.assertEqual(seen[0]['amount'], '-2000.00')
+
+    def test_page_cost_does_not_depend_on_position(self):
+        page = history_page(self.user.pk, page_size=5)
+        for _ in range(8):
+            with self.assertNumQueries(4):
+                page = history_page(self.user.pk, page.next_cursor, page_size=5)
+        with self.assertNumQueries(1):
+            history_page(self.user.pk, page.next_cursor, page_size=5, types=['task'])
+
+    def test_type_filter_and_invalid_cursor(self):
+        data = self.client.get(reverse('historico_api'), {'tipo': 'deposit', 'page_size': 100}).json()
+        self.assertEqual({entry['type'] for entry in data['entries']}, {'deposit'})
+        self.assertEqual(len(data['entries']), 15)
+        self.assertFalse(data['has_next'])
+
+        self.assertEqual(self.client.get(reverse('historico_api'), {'cursor': 'abc'}).status_code, 400)
+        response = self.client.get(reverse('historico'), {'cursor': 'abc'})
+        self.assertEqual(len(response.context['entries']), 20)
+        self.assertContains(response, 'Ver mais')
+
+    def test_saque_lists_only_the_latest_withdrawals(self):
+        response = self.client.get(reverse('saque'))
+        records = response.context['withdrawal_records']
+        self.assertEqual(len(records), 10)
+        self.assertTrue(response.context['has_more_withdrawals'])
+        self.assertContains(response, 'Ver histórico completo')
+
+        page = keyset_page(Withdrawal.objects.filter(user=self.user), 'created_at', page_size=10)
+        rest = keyset_page(Withdrawal.objects.filter(user=self.user), 'created_at', page.next_cursor, page_size=10)
+        self.assertEqual(len(rest.items), 5)
+        self.assertFalse(rest.has_next)
+        self.assertFalse({w.pk for w in page.items} & {w.pk for w in rest.items})
+
+
+class TaskArchiveTests(TestCase):
+    """Arquivamento das tarefas antigas em resumos mensais (core.task_archive)."""
+
+    NOW = datetime(2026, 3, 10, 9, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [CustomUser.objects.create_user(phone_number=f'945{i:06d}') for i in range(3)]
+        # Dezembro a março, um ganho por usuário a cada 10 dias
+        for user in cls.users:
+            for days in range(0, 100, 10):
+                task = Task.objects.create(user=user, earnings=Decimal('150'))
+                Task.objects.filter(pk=task.pk).update(completed_at=cls.NOW - timedelta(days=days))
+
+    def setUp(self):
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_archive_keeps_lifetime_totals(self):
+        user_ids = [user.pk for user in self.users]
+        before = lifetime_task_earnings(user_ids)
+        rebuild_income_summaries()  # Alinha o contador do dia com a data simulada
+
+        output = StringIO()
+        call_command('archive_tasks', keep_months=2, stdout=output)
+        self.assertIn('arquivada(s) em 2 mês(es)', output.getvalue())
+
+        # Só fevereiro e março continuam linha a linha
+        oldest = Task.objects.order_by('completed_at').first().completed_at
+        self.assertEqual((timezone.localtime(oldest).year, timezone.localtime(oldest).month), (2026, 2))
+        summary = TaskMonthlySummary.objects.get(user=self.users[0], month=date(2026, 1, 1))
+        self.assertEqual((summary.task_count, summary.earnings_total), (3, Decimal('450')))
+        self.assertEqual(lifetime_task_earnings(user_ids), before)
+        self.assertEqual(rebuild_income_summaries(), 0)
+
+    def test_rearchiving_adds_to_existing_summary(self):
+        archive_tasks(keep_months=1)
+        total = TaskMonthlySummary.objects.filter(user=self.users[0]).aggregate(total=Sum('earnings_total'))['total']
+
+        late = Task.objects.create(user=self.users[0], earnings=Decimal('50'))
+        Task.objects.filter(pk=late.pk).update(completed_at=datetime(2026, 1, 15, 12, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(archive_tasks(keep_months=1), [(date(2026, 1, 1), 1), (date(2026, 2, 1), 0)])
+        summary = TaskMonthlySummary.objects.get(user=self.users[0], month=date(2026, 1, 1))
+        self.assertEqual(summary.task_count, 4)
+        self.assertEqual(
+            TaskMonthlySummary.objects.filter(user=self.users[0]).aggregate(total=Sum('earnings_total'))['total'],
+            total + Decimal('50'),
+        )
+        self.assertFalse(Task.objects.filter(completed_at__lt=datetime(2026, 2, 28, 23, 0, tzinfo=dt_timezone.utc)).exists())
+
+    @skipIf(connection.vendor == 'postgresql', 'No PostgreSQL o comando cria as partições')
+    def test_partition_command_is_a_noop_without_postgres(self):
+        output = StringIO()
+        call_command('create_task_partitions', stdout=output)
+        self.assertIn('nada a fazer', output.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'core_task só é particionada no PostgreSQL')
+class TaskPartitionMigrationTests(TransactionTestCase):
+    """Migração 0012 (core_task particionada) aplicada e desfeita no PostgreSQL."""
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('core', target)])
+
+    def tearDown(self):
+        self._migrate('0012_task_partitioning')
+
+    def test_migration_applies_forward_and_backward(self):
+        user = CustomUser.objects.create_user(phone_number='941000000')
+        old = Task.objects.create(user=user, earnings=Decimal('100'))
+        ensure_partitions()  # Move a linha da DEFAULT para a partição do mês
+        new = Task.objects.create(user=user, earnings=Decimal('200'))
+
+        self._migrate('0010_withdrawal_policy')
+        self.assertFalse(is_partitioned())
+        self.assertEqual(sorted(Task.objects.values_list('id', flat=True)), [old.pk, new.pk])
+        self.assertGreater(Task.objects.create(user=user, earnings=Decimal('300')).pk, new.pk)
+
+        self._migrate('0012_task_partitioning')
+        self.assertTrue(is_partitioned())
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(ensure_partitions()[0][1], 3)
+        self.assertGreater(Task.objects.create(user=user, earnings=Decimal('400')).pk, new.pk + 1)
@@ -19,22 +19,31 @@ urlpatterns = [
     path('download/app/', views.download_app, name='download_app'), 
     
     path('deposito/', views.deposito, name='deposito'),
+    path('deposito/aprovar/', views.approve_deposits_view, name='approve_deposits'),
     path('saque/', views.saque, name='saque'),
+    path('historico/', views.historico, name='historico'),
+    path('historico/api/', views.historico_api, name='historico_api'),
     path('tarefa/', views.tarefa, name='tarefa'),
+    path('tarefa/status/', views.tarefa_status, name='tarefa_status'),
+    path('eventos/', views.events, name='events'),
     
     # ROTAS REMOVIDAS: 'process_task' e 'check_and_generate_gain' não são mais necessárias
     # com a nova lógica de ganho de 24h implementada na função views.tarefa.
 
     path('nivel/', views.nivel, name='nivel'),
     path('equipa/', views.equipa, name='equipa'),
+    path('equipa/membros/', views.equipa_membros, name='equipa_membros'),
     path('roleta/', views.roleta, name='roleta'),
     path('spin-roulette/', views.spin_roulette, name='spin_roulette'),
     path('sobre/', views.sobre, name='sobre'),
     path('perfil/', views.perfil, name='perfil'),
     path('renda/', views.renda, name='renda'),
     
+    # Métricas de desempenho por view (somente equipe)
+    path('metrics/requests/', views.request_metrics, name='request_metrics'),
+    
     # URLs para alteração de senha
-    path('change_password/', auth_views.PasswordChangeView.as_view(
+    path('change_password/', views.PasswordChangeView.as_view(
         template_name='registration/password_change_form.html',
         success_url='change_password_done/'
     ), name='change_password'),
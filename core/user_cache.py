@@ -0,0 +1,182 @@
+"""
+Cache do usuário autenticado.
+
+Cada requisição autenticada carregava o CustomUser do banco (e as páginas
+ainda consultavam o nível ativo). Aqui guardamos no cache do Django um
+"retrato" compacto do usuário: os valores das colunas (saldos, giros,
+flags...) e o id do nível ativo, cujo nome vem do catálogo em cache
+(core.cache.get_levels).
+
+O hash da senha não entra no retrato. Guardamos apenas o hash de sessão
+derivado dele (verificado em toda requisição por django.contrib.auth); a
+senha só é lida do banco, como campo adiado, quando usada (ex.:
+check_password na troca de senha).
+
+O retrato é descartado (write-through) sempre que essas colunas mudam:
+pelos sinais de CustomUser/UserLevel em save()/delete() e, para os UPDATEs
+em lote (core.ledger, core.referrals...), por invalidate_users(). Como em
+core.cache, a chave do retrato tem uma versão por usuário; invalidar troca
+a versão, agora e de novo após o commit. Uma requisição concorrente que
+leu o banco antes da alteração grava o retrato na versão antiga, que
+nenhuma leitura usa mais. O estado do ciclo da tarefa
+(core.task_status) depende das mesmas colunas e usa a mesma versão.
+
+Os saldos também são alterados por outros processos (worker de ganhos,
+processamento de comprovativos), cujas invalidações só alcançam os
+processos web se o cache for compartilhado. Por isso o retrato só é usado
+com USER_SNAPSHOT_CACHE ligado (padrão: cache diferente de LocMem/Dummy);
+desligado, o usuário é lido do banco a cada requisição.
+"""
+import hashlib
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+
+from .models import CustomUser, UserLevel
+
+
+USER_CACHE_TIMEOUT = 600
+
+# Colunas guardadas no retrato (todas, menos a senha). A chave muda se o modelo
+# mudar (deploy com migração) ou a SECRET_KEY mudar (o hash de sessão depende dela)
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in CustomUser._meta.concrete_fields if field.attname != 'password'
+)
+_SCHEMA = hashlib.md5(','.join(SNAPSHOT_FIELDS + (settings.SECRET_KEY,)).encode()).hexdigest()[:8]
+
+
+def _version_key(user_id):
+    return f'core:user:{_SCHEMA}:{user_id}:version'
+
+
+def _new_version():
+    # Aleatória: uma versão expulsa do cache nunca volta a valer
+    return uuid.uuid4().hex
+
+
+def _get_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = _new_version()
+        cache.add(_version_key(user_id), version, USER_CACHE_TIMEOUT)
+        version = cache.get(_version_key(user_id), version)
+    return version
+
+
+async def _aget_version(user_id):
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        version = _new_version()
+        await cache.aadd(_version_key(user_id), version, USER_CACHE_TIMEOUT)
+        version = await cache.aget(_version_key(user_id), version)
+    return version
+
+
+def _key(user_id, version):
+    return f'core:user:{_SCHEMA}:{user_id}:v{version}'
+
+
+def task_status_key(user_id):
+    """Chave do estado da tarefa na versão atual do usuário; obtenha-a antes de ler o banco."""
+    return f'core:user:{_SCHEMA}:{user_id}:v{_get_version(user_id)}:tarefa'
+
+
+async def atask_status_key(user_id):
+    """Versão assíncrona de task_status_key."""
+    return f'core:user:{_SCHEMA}:{user_id}:v{await _aget_version(user_id)}:tarefa'
+
+
+def snapshots_enabled():
+    """True se o cache é compartilhado entre os processos (ver USER_SNAPSHOT_CACHE)."""
+    return settings.USER_SNAPSHOT_CACHE
+
+
+def _active_level_subquery():
+    return Subquery(
+        UserLevel.objects.filter(user=OuterRef('pk'), is_active=True).order_by('pk').values('level_id')[:1]
+    )
+
+
+def _from_snapshot(snapshot):
+    values, active_level_id, session_auth_hash = snapshot
+    # A senha fica adiada: só é lida do banco se for acessada
+    user = CustomUser.from_db('default', SNAPSHOT_FIELDS, values)
+    user.prefetched_active_level_id = active_level_id
+    user.prefetched_session_auth_hash = session_auth_hash
+    return user
+
+
+def _load_snapshot(user_id):
+    row = (
+        CustomUser.objects.filter(pk=user_id)
+        .annotate(prefetched_active_level_id=_active_level_subquery())
+        .values_list(*SNAPSHOT_FIELDS, 'password', 'prefetched_active_level_id')
+        .first()
+    )
+    if row is None:
+        return None
+    # Só o hash de sessão deriva da senha; ela não entra no retrato
+    session_auth_hash = CustomUser(password=row[-2]).get_session_auth_hash()
+    return (row[:-2], row[-1], session_auth_hash)
+
+
+def load_user(user_id):
+    """Retorna o CustomUser de 'user_id' (do cache, se possível) ou None."""
+    if not snapshots_enabled():
+        snapshot = _load_snapshot(user_id)
+        return _from_snapshot(snapshot) if snapshot is not None else None
+
+    # A versão é lida antes do banco: se o usuário mudar no meio, o retrato fica na versão antiga
+    key = _key(user_id, _get_version(user_id))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = _load_snapshot(user_id)
+        if snapshot is None:
+            return None
+        cache.set(key, snapshot, USER_CACHE_TIMEOUT)
+    return _from_snapshot(snapshot)
+
+
+async def aload_user(user_id):
+    """Versão assíncrona de load_user: o banco só é acessado (numa thread) sem o cache."""
+    if snapshots_enabled():
+        version = await cache.aget(_version_key(user_id))
+        snapshot = await cache.aget(_key(user_id, version)) if version is not None else None
+        if snapshot is not None:
+            return _from_snapshot(snapshot)
+    return await sync_to_async(load_user)(user_id)
+
+
+def invalidate_users(user_ids):
+    """Troca a versão do retrato dos usuários (agora e de novo após o commit da transação atual)."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    def invalidate():
+        # O retrato e o estado da tarefa ficam nas chaves da versão antiga, que expiram sozinhas
+        cache.set_many({_version_key(user_id): _new_version() for user_id in user_ids}, USER_CACHE_TIMEOUT)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def _user_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return  # Usuário novo: nada em cache (load_user não guarda ausências)
+    invalidate_users([instance.pk])
+
+
+def _user_level_changed(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
+
+
+post_save.connect(_user_changed, sender=CustomUser, dispatch_uid='core.user_cache.user_save')
+post_delete.connect(_user_changed, sender=CustomUser, dispatch_uid='core.user_cache.user_delete')
+post_save.connect(_user_level_changed, sender=UserLevel, dispatch_uid='core.user_cache.userlevel_save')
+post_delete.connect(_user_level_changed, sender=UserLevel, dispatch_uid='core.user_cache.userlevel_delete')
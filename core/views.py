@@ -1,77 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout, update_session_auth_hash
+from django.contrib.auth import views as auth_views
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
 from django.urls import reverse
-from django.http import JsonResponse
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.db import transaction # IMPORTANTE: Adicionado para transações seguras
-import random
-from datetime import date, datetime, time, timedelta # Importação completa
+import json
+import os
 from django.utils import timezone # Adicionado para garantir o uso de timezone-aware datetimes
 from decimal import Decimal # <--- IMPORTANTE: Adicionado para corrigir o TypeError
 
 from .forms import RegisterForm, DepositForm, WithdrawalForm, BankDetailsForm
-from .models import PlatformSettings, CustomUser, Level, UserLevel, BankDetails, Deposit, Withdrawal, Task, PlatformBankDetails, Roulette, RouletteSettings
-
-
-# --- NOVA FUNÇÃO DE LÓGICA (Ganho de 24 horas) ---
-@transaction.atomic # Garante que as operações de banco de dados sejam seguras
-def check_and_apply_daily_gain(user):
-    """
-    Verifica e aplica o ganho de 24 horas ao saldo do usuário, se devido.
-    
-    ESTA FUNÇÃO REQUER O CAMPO 'last_daily_gain_date' NO MODELO UserLevel.
-    
-    Retorna (boolean, datetime_do_proximo_ganho)
-    """
-    # Usamos select_for_update para bloquear a linha, garantindo que o ganho não seja duplicado
-    active_user_level = UserLevel.objects.select_for_update().filter(user=user, is_active=True).first()
-    
-    if not active_user_level:
-        return False, None
-
-    level = active_user_level.level
-    now = timezone.now()
-    
-    # Define o tempo de espera (24 horas)
-    COOLDOWN_DURATION = timedelta(hours=24) 
-    
-    # Se o 'last_daily_gain_date' for None (primeiro acesso), usamos a data de compra como referência.
-    last_gain_time = active_user_level.last_daily_gain_date or active_user_level.purchase_date
-    next_gain_time = last_gain_time + COOLDOWN_DURATION
-
-    # 1. Verifica se já é hora de aplicar o ganho
-    if now >= next_gain_time:
-        
-        daily_gain_amount = level.daily_gain
-        
-        # 2. Aplicar o ganho ao saldo do usuário
-        user.available_balance += daily_gain_amount
-        user.save()
-        
-        # 3. Registrar o último ganho no UserLevel e criar um registro de Task (para histórico)
-        active_user_level.last_daily_gain_date = now # Zera o contador para o próximo ciclo
-        active_user_level.save()
-        
-        # Cria um registro de tarefa concluída (para fins de histórico e totalização)
-        Task.objects.create(
-            user=user, 
-            # CORREÇÃO CRÍTICA: Agora passamos NONE, pois este ganho não é associado a uma TaskDefinition.
-            # O erro estava aqui: 'task_definition=Task.objects.first()', que retornava um objeto Task.
-            task_definition=None, 
-            earnings=daily_gain_amount
-        )
-        
-        # O próximo ganho será 24h a partir de agora
-        next_gain_time_new = now + COOLDOWN_DURATION
-        return True, next_gain_time_new
-    
-    # Se não for hora de gerar o ganho
-    return False, next_gain_time
-# --- FIM DA NOVA FUNÇÃO DE LÓGICA ---
+from .models import PlatformSettings, CustomUser, Level, UserLevel, BankDetails, Withdrawal, LedgerEntry
+from .accrual import apply_due_daily_gains, next_gain_time_for
+from .cache import get_levels, get_platform_bank_details, get_platform_settings
+from .team import MEMBERS_PAGE_SIZE, team_members_page, team_summary
+from .signup import InvalidInviteCode, PhoneNumberTaken, register_user
+from .ledger import InsufficientBalance, credit, debit
+from .deposits import RESULT_APPROVED, approve_deposits
+from .income import get_income_summary
+from .middleware import metrics_store
+from .proofs import enqueue_proof
+from .roulette import NoSpinsLeft, SpinRateLimited, spin
+from .withdrawal_policy import (
+    WithdrawalDenied, daily_limit_reached, get_active_policy, is_within_window, request_withdrawal,
+)
+from .task_status import aget_task_status
+from .notifications import event_stream
+from .pagination import InvalidCursor, keyset_page, parse_page_size
+from .history import HISTORY_PAGE_SIZE, HISTORY_TYPES, TYPE_LABELS, history_page
 
 
 # --- FUNÇÃO ATUALIZADA ---
@@ -91,7 +51,7 @@ def download_app(request):
     """
     try:
         # Tenta obter o link de download configurado nas PlatformSettings
-        app_link = PlatformSettings.objects.first().app_download_link
+        app_link = get_platform_settings().app_download_link
         if app_link:
             return redirect(app_link)
     except (PlatformSettings.DoesNotExist, AttributeError):
@@ -106,13 +66,13 @@ def download_app(request):
 @login_required
 def menu(request):
     user_level = None
-    levels = Level.objects.all().order_by('deposit_value')
+    levels = get_levels()
 
     if request.user.is_authenticated:
         user_level = UserLevel.objects.filter(user=request.user, is_active=True).first()
 
     try:
-        platform_settings = PlatformSettings.objects.first()
+        platform_settings = get_platform_settings()
         whatsapp_link = platform_settings.whatsapp_link
         # --- ADIÇÃO DO LINK DO TELEGRAM AQUI ---
         telegram_link = getattr(platform_settings, 'telegram_link', '#') 
@@ -139,29 +99,23 @@ def cadastro(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.set_password(form.cleaned_data['password'])
-            
-            # --- CORREÇÃO AQUI: O NOME DO CAMPO NO FORM É 'invited_by_code' ---
-            invited_by_code = form.cleaned_data.get('invited_by_code')
-            
-            if invited_by_code:
-                try:
-                    invited_by_user = CustomUser.objects.get(invite_code=invited_by_code)
-                    user.invited_by = invited_by_user
-                except CustomUser.DoesNotExist:
-                    messages.error(request, 'Código de convite inválido.')
-                    return render(request, 'cadastro.html', {'form': form})
-                
-            user.save()
-            login(request, user)
-            return redirect('menu')
-        else:
+            # --- NOVO: SERVIÇO DE CADASTRO (core.signup): uma única hash da senha,
+            # convidador resolvido pelo cache e efeitos não críticos em segundo plano ---
             try:
-                whatsapp_link = PlatformSettings.objects.first().whatsapp_link
-            except (PlatformSettings.DoesNotExist, AttributeError):
-                whatsapp_link = '#'
-            return render(request, 'cadastro.html', {'form': form, 'whatsapp_link': whatsapp_link})
+                user = register_user(
+                    form.cleaned_data['phone_number'],
+                    form.cleaned_data['password'],
+                    # --- CORREÇÃO AQUI: O NOME DO CAMPO NO FORM É 'invited_by_code' ---
+                    form.cleaned_data.get('invited_by_code'),
+                )
+            except InvalidInviteCode:
+                messages.error(request, 'Código de convite inválido.')
+            except PhoneNumberTaken:
+                form.add_error('phone_number', form.instance.unique_error_message(CustomUser, ['phone_number']))
+            else:
+                # Backend explícito: há mais de um em AUTHENTICATION_BACKENDS
+                login(request, user, backend='core.auth_backends.CachedModelBackend')
+                return redirect('menu')
     else:
         # --- CORREÇÃO AQUI: O NOME DO CAMPO NO FORM É 'invited_by_code' ---
         if invite_code_from_url:
@@ -170,7 +124,7 @@ def cadastro(request):
             form = RegisterForm()
     
     try:
-        whatsapp_link = PlatformSettings.objects.first().whatsapp_link
+        whatsapp_link = get_platform_settings().whatsapp_link
     except (PlatformSettings.DoesNotExist, AttributeError):
         whatsapp_link = '#'
 
@@ -187,7 +141,7 @@ def user_login(request):
         form = AuthenticationForm()
 
     try:
-        whatsapp_link = PlatformSettings.objects.first().whatsapp_link
+        whatsapp_link = get_platform_settings().whatsapp_link
     except (PlatformSettings.DoesNotExist, AttributeError):
         whatsapp_link = '#'
 
@@ -201,11 +155,12 @@ def user_logout(request):
 # --- FUNÇÃO DE DEPÓSITO ATUALIZADA PARA O NOVO FLUXO ---
 @login_required
 def deposito(request):
-    platform_bank_details = PlatformBankDetails.objects.all()
-    deposit_instruction = PlatformSettings.objects.first().deposit_instruction if PlatformSettings.objects.first() else 'Instruções de depósito não disponíveis.'
+    platform_bank_details = get_platform_bank_details()
+    platform_settings = get_platform_settings()
+    deposit_instruction = platform_settings.deposit_instruction if platform_settings else 'Instruções de depósito não disponíveis.'
     
-    # Busca todos os valores de depósito dos Níveis para a Etapa 2
-    level_deposits = Level.objects.all().values_list('deposit_value', flat=True).distinct().order_by('deposit_value')
+    # Busca todos os valores de depósito dos Níveis para a Etapa 2 (catálogo já ordenado)
+    level_deposits = sorted({level.deposit_value for level in get_levels()})
     # Converte os Decimais para strings formatadas para JS
     level_deposits_list = [str(d) for d in level_deposits] 
 
@@ -217,6 +172,8 @@ def deposito(request):
             deposit = form.save(commit=False)
             deposit.user = request.user
             deposit.save()
+            # Redimensionamento e miniatura em segundo plano (core.proofs)
+            enqueue_proof(deposit.pk)
             
             # Não exibe mensagem aqui, mas sim no template
             # O template irá exibir uma tela de sucesso após a submissão
@@ -242,48 +199,56 @@ def deposito(request):
     return render(request, 'deposito.html', context)
 # --- FIM DA FUNÇÃO DE DEPÓSITO ATUALIZADA ---
 
+# --- APROVAÇÃO DE DEPÓSITOS EM LOTE (substitui a antiga approve_deposit) ---
+MAX_DEPOSIT_BATCH = 1000
+
 @login_required
-def approve_deposit(request, deposit_id):
+@require_POST
+def approve_deposits_view(request):
+    """
+    Aprova um lote de depósitos (somente equipe). Aceita JSON {"deposit_ids": [...]}
+    ou o campo de formulário 'deposit_ids' repetido, e retorna o resultado de cada depósito.
+    """
     if not request.user.is_staff:
-        messages.error(request, 'Você não tem permissão para realizar esta ação.')
-        return redirect('menu')
+        return JsonResponse({'detail': 'Acesso restrito à equipe.'}, status=403)
 
-    deposit = get_object_or_404(Deposit, id=deposit_id)
-    if not deposit.is_approved:
-        deposit.is_approved = True
-        deposit.save()
-        deposit.user.available_balance += deposit.amount
-        deposit.user.save()
-        messages.success(request, f'Depósito de {deposit.amount} KZ aprovado para {deposit.user.phone_number}. Saldo atualizado.')
-    
-    return redirect('renda')
+    try:
+        if request.content_type == 'application/json':
+            raw_ids = json.loads(request.body or b'{}').get('deposit_ids', [])
+        else:
+            raw_ids = request.POST.getlist('deposit_ids')
+        deposit_ids = [int(deposit_id) for deposit_id in raw_ids]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'detail': 'deposit_ids deve ser uma lista de números.'}, status=400)
+
+    if not deposit_ids:
+        return JsonResponse({'detail': 'Nenhum depósito informado.'}, status=400)
+    if len(deposit_ids) > MAX_DEPOSIT_BATCH:
+        return JsonResponse({'detail': f'No máximo {MAX_DEPOSIT_BATCH} depósitos por lote.'}, status=400)
+
+    report = approve_deposits(deposit_ids)
+    return JsonResponse({
+        'approved': sum(1 for result in report.values() if result == RESULT_APPROVED),
+        'results': [{'id': deposit_id, 'result': report[deposit_id]} for deposit_id in sorted(report)],
+    })
+# --- FIM APROVAÇÃO DE DEPÓSITOS ---
+
+# --- FUNÇÃO DE SAQUE: REGRAS DA POLÍTICA DE SAQUES (core.withdrawal_policy) ---
+SAQUE_HISTORY_SIZE = 10
 
-# --- FUNÇÃO DE SAQUE ATUALIZADA COM NOVAS REGRAS ---
 @login_required
 def saque(request):
-    # NOVOS PARÂMETROS DE SAQUE
-    MIN_WITHDRAWAL_AMOUNT = Decimal('2000') # Usado como Decimal por ser valor monetário
-    START_TIME = time(9, 0, 0) # 09:00:00
-    END_TIME = time(18, 0, 0) # 18:00:00
-    # FIM DOS NOVOS PARÂMETROS
+    # Regras editáveis no Admin (WithdrawalPolicy), lidas do cache
+    policy = get_active_policy()
 
-    withdrawal_instruction = PlatformSettings.objects.first().withdrawal_instruction if PlatformSettings.objects.first() else 'Instruções de saque não disponíveis.'
+    platform_settings = get_platform_settings()
+    withdrawal_instruction = platform_settings.withdrawal_instruction if platform_settings else 'Instruções de saque não disponíveis.'
     
-    withdrawal_records = Withdrawal.objects.filter(user=request.user).order_by('-created_at')
+    # Apenas os saques mais recentes; o restante fica no histórico paginado ('historico')
+    withdrawal_page = keyset_page(Withdrawal.objects.filter(user=request.user), 'created_at', page_size=SAQUE_HISTORY_SIZE)
     
     has_bank_details = BankDetails.objects.filter(user=request.user).exists()
     
-    # Verifica se o saque está dentro do horário permitido
-    now = datetime.now().time()
-    is_time_allowed = START_TIME <= now <= END_TIME
-
-    # Verifica se já houve saque hoje
-    today = date.today()
-    already_withdrawn_today = Withdrawal.objects.filter(
-        user=request.user, 
-        created_at__date=today
-    ).exists()
-    
     if request.method == 'POST':
         form = WithdrawalForm(request.POST)
         if form.is_valid():
@@ -293,61 +258,142 @@ def saque(request):
                 messages.error(request, 'Por favor, adicione suas coordenadas bancárias no seu perfil antes de solicitar um saque.')
                 return redirect('perfil')
             
-            if not is_time_allowed:
-                messages.error(request, f'O saque só é permitido entre as {START_TIME.strftime("%H:%M")}h e as {END_TIME.strftime("%H:%M")}h.')
-            elif already_withdrawn_today:
-                messages.error(request, 'Você só pode realizar um saque por dia.')
-            elif amount < MIN_WITHDRAWAL_AMOUNT: # Mínimo atualizado
-                messages.error(request, f'O valor mínimo para saque é {MIN_WITHDRAWAL_AMOUNT} KZ.')
-            elif request.user.available_balance < amount:
+            # Horário (hora local), valores, saldo e limite diário (contador atômico)
+            try:
+                request_withdrawal(request.user, amount, policy=policy)
+            except WithdrawalDenied as denied:
+                messages.error(request, str(denied))
+            except InsufficientBalance:
                 messages.error(request, 'Saldo insuficiente.')
             else:
-                # Todas as regras de negócio foram atendidas
-                withdrawal = Withdrawal.objects.create(user=request.user, amount=amount)
-                request.user.available_balance -= amount
-                request.user.save()
                 messages.success(request, 'Saque solicitado com sucesso. Aguarde a aprovação.')
                 return redirect('saque')
         # Se o formulário não for válido, as mensagens de erro do formulário (se houver) serão tratadas implicitamente.
     else:
         form = WithdrawalForm()
 
+    now = timezone.now()
     context = {
         'withdrawal_instruction': withdrawal_instruction,
-        'withdrawal_records': withdrawal_records,
+        'withdrawal_records': withdrawal_page.items,
+        'has_more_withdrawals': withdrawal_page.has_next,
         'form': form,
         'has_bank_details': has_bank_details,
-        'min_withdrawal_amount': MIN_WITHDRAWAL_AMOUNT, # Passa o novo mínimo para o template
-        'is_time_allowed': is_time_allowed, # Passa se está no horário
-        'already_withdrawn_today': already_withdrawn_today # Passa se já sacou hoje
+        'policy': policy,
+        'min_withdrawal_amount': policy.min_amount, # Passa o mínimo para o template
+        'is_time_allowed': is_within_window(policy, now), # Passa se está no horário (hora local)
+        # Passa se já atingiu o limite do dia (intervalo sobre created_at, usa o índice)
+        'already_withdrawn_today': daily_limit_reached(policy, request.user.pk, now),
     }
     return render(request, 'saque.html', context)
-# --- FIM DA FUNÇÃO DE SAQUE ATUALIZADA ---
+# --- FIM DA FUNÇÃO DE SAQUE ---
+
+
+# --- NOVO: HISTÓRICO DE TRANSAÇÕES (PAGINAÇÃO POR CURSOR) ---
+def _history_types(request):
+    types = [kind for kind in request.GET.getlist('tipo') if kind in HISTORY_TYPES]
+    return types or None
 
 
-# --- FUNÇÃO TAREFA COMPLETAMENTE SUBSTITUÍDA PELA LÓGICA DE 24H ---
+@login_required
+def historico(request):
+    """
+    Saques, depósitos, tarefas e giros da roleta do usuário, do mais recente
+    para o mais antigo (core.history). 'Ver mais' segue o cursor da página.
+    """
+    types = _history_types(request)
+    try:
+        page = history_page(request.user.pk, request.GET.get('cursor'), HISTORY_PAGE_SIZE, types)
+    except InvalidCursor:
+        page = history_page(request.user.pk, None, HISTORY_PAGE_SIZE, types)
+
+    context = {
+        'entries': page.items,
+        'next_cursor': page.next_cursor,
+        'selected_type': types[0] if types and len(types) == 1 else '',
+        'type_labels': TYPE_LABELS,
+    }
+    return render(request, 'historico.html', context)
+
+
+@login_required
+def historico_api(request):
+    """
+    API JSON do histórico. Parâmetros GET: 'cursor' (o 'next_cursor' da página
+    anterior), 'page_size' e 'tipo' (repetível: withdrawal, deposit, task, roulette).
+    """
+    try:
+        page = history_page(
+            request.user.pk,
+            request.GET.get('cursor'),
+            parse_page_size(request.GET.get('page_size'), HISTORY_PAGE_SIZE),
+            _history_types(request),
+        )
+    except InvalidCursor as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse({
+        'entries': [
+            {
+                'type': entry['type'],
+                'id': entry['id'],
+                'timestamp': entry['timestamp'].isoformat(),
+                'amount': str(entry['amount']),
+                'status': entry['status'],
+            }
+            for entry in page.items
+        ],
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
+
+# --- FUNÇÃO TAREFA: APENAS LEITURA (os ganhos são aplicados pelo motor em lote) ---
 @login_required
 def tarefa(request):
+    """
+    Exibe o estado do ciclo de 24h do usuário.
+
+    Os ganhos diários são creditados pelo comando 'apply_daily_gains'
+    (core.accrual), portanto um simples acesso à página não bloqueia nem
+    escreve nenhuma linha. O POST do botão "Receber Ganho" apenas executa o
+    mesmo motor, restrito a este usuário, e responde em JSON.
+    """
     user = request.user
-    
-    # 1. Tenta aplicar o ganho se 24h se passaram
-    gain_applied, next_gain_time = check_and_apply_daily_gain(user)
-    
-    # 2. Encontra o nível ativo (novamente, se necessário para o template)
-    active_user_level = UserLevel.objects.filter(user=user, is_active=True).first()
-    
+    gain_applied = False
+
+    if request.method == 'POST':
+        applied, _ = apply_due_daily_gains(user_ids=[user.id])
+        gain_applied = applied > 0
+
+    # Encontra o nível ativo que gera o ganho diário
+    active_user_level = UserLevel.objects.select_related('level').filter(user=user, is_active=True).first()
+
     cooldown_seconds_remaining = 0 # Inicializa
-    
-    if active_user_level and next_gain_time:
+
+    if active_user_level:
+        next_gain_time = next_gain_time_for(active_user_level)
         now = timezone.now()
-        
+
         if next_gain_time > now:
             # Calcula o tempo restante real até o próximo ganho
-            time_remaining = next_gain_time - now
-            cooldown_seconds_remaining = int(time_remaining.total_seconds())
-        else:
-            # Se o ganho deveria ter sido aplicado mas por algum motivo falhou (ou não tem nível)
-            cooldown_seconds_remaining = 0
+            cooldown_seconds_remaining = int((next_gain_time - now).total_seconds())
+
+    if request.method == 'POST':
+        if not active_user_level:
+            return JsonResponse({'success': False, 'message': 'Nível não ativo. Compre um Nível para prosseguir.'})
+        if gain_applied:
+            return JsonResponse({
+                'success': True,
+                'daily_gain': str(active_user_level.level.daily_gain),
+                'new_time_remaining': cooldown_seconds_remaining,
+                'message': 'Ciclo reiniciado.',
+            })
+        return JsonResponse({
+            'success': False,
+            'time_remaining': cooldown_seconds_remaining,
+            'message': 'O ciclo atual ainda não terminou.',
+        })
 
     context = {
         'has_active_level': active_user_level is not None,
@@ -357,7 +403,32 @@ def tarefa(request):
         'gain_applied': gain_applied, # Indica se um ganho acabou de ser aplicado
     }
     return render(request, 'tarefa.html', context)
-# --- FIM DA FUNÇÃO TAREFA SUBSTITUÍDA ---
+# --- FIM DA FUNÇÃO TAREFA ---
+
+
+# --- NOVO: ESTADO DO CICLO EM JSON (VIEW ASSÍNCRONA, CONSULTADA PELO CONTADOR DA TAREFA) ---
+@login_required
+async def tarefa_status(request):
+    """
+    Próximo ganho, tempo restante, último ganho e saldo do usuário, lidos do
+    cache (core.task_status). Substitui o recarregamento da página 'tarefa'.
+    """
+    user = await request.auser()
+    return JsonResponse(await aget_task_status(user.pk))
+
+
+# --- NOVO: NOTIFICAÇÕES EM TEMPO REAL (SERVER-SENT EVENTS) ---
+@login_required
+async def events(request):
+    """
+    Saldos e mudanças de status de depósitos/saques do usuário (core.notifications),
+    consumidos por static/js/live.js em vez de recarregar as páginas.
+    """
+    user = await request.auser()
+    response = StreamingHttpResponse(event_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Sem buffer no proxy (nginx)
+    return response
 
 
 # ATENÇÃO: AS FUNÇÕES process_task E check_and_generate_gain FORAM REMOVIDAS
@@ -371,7 +442,7 @@ def nivel(request):
     INVITE_COMMISSION_PERCENTAGE = Decimal('0.15') # 15%
     # FIM DO NOVO PERCENTUAL
     
-    levels = Level.objects.all().order_by('deposit_value')
+    levels = get_levels()
     user_levels = UserLevel.objects.filter(user=request.user, is_active=True).values_list('level__id', flat=True)
     
     if request.method == 'POST':
@@ -382,35 +453,34 @@ def nivel(request):
             messages.error(request, 'Você já possui este nível.')
             return redirect('nivel')
         
-        if request.user.available_balance >= level_to_buy.deposit_value:
-            request.user.available_balance -= level_to_buy.deposit_value
-            
-            # --- ATUALIZAÇÃO IMPORTANTE PARA INICIALIZAR O CAMPO last_daily_gain_date ---
-            # Para o novo ciclo de 24h funcionar corretamente a partir da compra:
-            UserLevel.objects.create(
-                user=request.user, 
-                level=level_to_buy, 
-                is_active=True,
-                # O primeiro ciclo será gerado 24h após a compra.
-                # Não definimos last_daily_gain_date aqui para que o primeiro cálculo na tarefa(request) use a purchase_date.
-            )
-            
-            request.user.level_active = True
-            request.user.save()
-            
+        try:
+            with transaction.atomic():
+                # --- ATUALIZAÇÃO IMPORTANTE PARA INICIALIZAR O CAMPO last_daily_gain_date ---
+                # Para o novo ciclo de 24h funcionar corretamente a partir da compra:
+                new_user_level = UserLevel.objects.create(
+                    user=request.user, 
+                    level=level_to_buy, 
+                    is_active=True,
+                    # O primeiro ciclo será gerado 24h após a compra.
+                    # Não definimos last_daily_gain_date aqui para que o primeiro cálculo na tarefa(request) use a purchase_date.
+                )
+                # Débito atômico: falha (e desfaz a compra) se o saldo não for suficiente
+                debit(request.user, level_to_buy.deposit_value, LedgerEntry.REASON_LEVEL_PURCHASE, source=new_user_level)
+
+                request.user.level_active = True
+                request.user.save(update_fields=['level_active'])
+        except InsufficientBalance:
+            messages.error(request, 'Saldo insuficiente. Por favor, faça um depósito.')
+        else:
             invited_by_user = request.user.invited_by
             if invited_by_user and UserLevel.objects.filter(user=invited_by_user, is_active=True).exists():
                 # Calcula a nova comissão de 15%
                 commission_amount = level_to_buy.deposit_value * INVITE_COMMISSION_PERCENTAGE
                 
-                invited_by_user.subsidy_balance += commission_amount
-                invited_by_user.available_balance += commission_amount
-                invited_by_user.save()
+                credit(invited_by_user, commission_amount, LedgerEntry.REASON_COMMISSION, source=new_user_level, subsidy=True)
                 messages.success(request, f'Parabéns! Você recebeu {commission_amount:.2f} KZ de subsídio por convite de {request.user.phone_number} (15% do investimento).')
 
             messages.success(request, f'Você comprou o nível {level_to_buy.name} com sucesso! O seu primeiro ganho estará disponível em 24h.')
-        else:
-            messages.error(request, 'Saldo insuficiente. Por favor, faça um depósito.')
         
         return redirect('nivel')
         
@@ -425,56 +495,63 @@ def nivel(request):
 def equipa(request):
     user = request.user
 
-    # 1. Encontra todos os membros da equipe (convidados diretos)
-    team_members = CustomUser.objects.filter(invited_by=user).order_by('-date_joined')
-    team_count = team_members.count()
-
-    # 2. Obtém todos os Níveis disponíveis
-    all_levels = Level.objects.all().order_by('deposit_value')
-
-    # 3. Contabilização por Nível de Investimento
-    levels_data = []
-    total_investors = 0
-    
-    # Dicionário para armazenar membros por nível (para exibição no template)
-    members_by_level = {} 
-    
-    # Preenche os dados para cada nível
-    for level in all_levels:
-        # Filtra membros da equipe que possuem este nível ATIVO
-        members_with_level = team_members.filter(userlevel__level=level, userlevel__is_active=True).distinct()
-        
-        levels_data.append({
-            'name': level.name,
-            'count': members_with_level.count(),
-            'members': members_with_level, 
-        })
-        members_by_level[level.name] = members_with_level
-        total_investors += members_with_level.count()
-
-    # 4. Contabilização de Não Investidores GERAL
-    # Membros que NÃO têm NENHUM UserLevel ativo
-    non_invested_members = team_members.exclude(userlevel__is_active=True)
-    total_non_investors = non_invested_members.count()
-    
-    # Adiciona a contagem de não investidos na estrutura levels_data para a primeira aba
-    levels_data.insert(0, {
-        'name': 'Não Investido',
-        'count': total_non_investors,
-        'members': non_invested_members,
-    })
+    # Resumo da equipa com duas consultas agregadas (ver core.team)
+    summary = team_summary(user)
+    # Só a primeira página da primeira aba (não investidos); o resto vem de equipa_membros pelo cursor
+    first_page = team_members_page(user, level_id='none', page_size=MEMBERS_PAGE_SIZE)
 
     context = {
-        'team_members': team_members, # Membros totais
-        'team_count': team_count, # Contagem total de membros
+        'team_count': summary['team_count'], # Contagem total de membros
         'invite_link': request.build_absolute_uri(reverse('cadastro')) + f'?invite={user.invite_code}',
-        'levels_data': levels_data, # Dados detalhados por nível (para as abas)
-        'total_investors': total_investors, # Contagem de investidores
-        'total_non_investors': total_non_investors, # Contagem de não investidores
+        'levels_data': summary['levels_data'], # Contagens por nível (para as abas)
+        'first_members': first_page.items,
+        'first_next_cursor': first_page.next_cursor,
+        'total_investors': summary['total_investors'], # Contagem de investidores
+        'total_non_investors': summary['total_non_investors'], # Contagem de não investidores
         'subsidy_balance': user.subsidy_balance, # Saldo de Subsídios
     }
     return render(request, 'equipa.html', context)
 
+@login_required
+def equipa_membros(request):
+    """
+    API paginada dos membros da equipa, para promotores com muitos convidados.
+    Parâmetros GET: 'level' (id do nível ou 'none'), 'cursor' (o 'next_cursor'
+    da página anterior) e 'page_size'.
+    """
+    # Apenas 'none' ou o id de um nível do catálogo (em cache)
+    level_id = request.GET.get('level') or None
+    if level_id not in (None, 'none'):
+        try:
+            level_id = int(level_id)
+        except ValueError:
+            level_id = None
+        if level_id not in {level.id for level in get_levels()}:
+            return JsonResponse({'detail': "level deve ser o id de um nível ou 'none'."}, status=400)
+
+    try:
+        page = team_members_page(
+            request.user,
+            level_id=level_id,
+            cursor=request.GET.get('cursor'),
+            page_size=parse_page_size(request.GET.get('page_size'), MEMBERS_PAGE_SIZE),
+        )
+    except InvalidCursor as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse({
+        'members': [
+            {
+                'phone_number': member.phone_number,
+                'date_joined': member.date_joined.isoformat(),
+                'level': member.active_level.name if member.active_level else None,
+            }
+            for member in page.items
+        ],
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
 @login_required
 def roleta(request):
     user = request.user
@@ -488,46 +565,22 @@ def roleta(request):
 @login_required
 @require_POST
 def spin_roulette(request):
-    user = request.user
-
-    if not user.roulette_spins or user.roulette_spins <= 0:
-        return JsonResponse({'success': False, 'message': 'Você não tem giros disponíveis para a roleta.'})
-
-    user.roulette_spins -= 1
-    user.save()
-    
     try:
-        roulette_settings = RouletteSettings.objects.first()
-        
-        if roulette_settings and roulette_settings.prizes:
-            prizes_from_admin = [int(p.strip()) for p in roulette_settings.prizes.split(',')]
-            prizes_weighted = []
-            for prize in prizes_from_admin:
-                if prize <= 1000:
-                    prizes_weighted.extend([prize] * 3)
-                else:
-                    prizes_weighted.append(prize)
-            prize = random.choice(prizes_weighted)
-        else:
-            prizes = [100, 200, 300, 500, 1000, 2000]
-            prize = random.choice(prizes)
-
-    except RouletteSettings.DoesNotExist:
-        prizes = [100, 200, 300, 500, 1000, 2000]
-        prize = random.choice(prizes)
-
-    Roulette.objects.create(user=user, prize=prize, is_approved=True)
-
-    user.subsidy_balance += prize
-    user.available_balance += prize
-    user.save()
+        prize, remaining_spins = spin(request.user)
+    except NoSpinsLeft:
+        return JsonResponse({'success': False, 'message': 'Você não tem giros disponíveis para a roleta.'})
+    except SpinRateLimited:
+        return JsonResponse({'success': False, 'message': 'Aguarde um momento antes de girar novamente.'}, status=429)
 
-    return JsonResponse({'success': True, 'prize': prize, 'message': f'Parabéns! Você ganhou {prize} KZ.'})
+    return JsonResponse({
+        'success': True, 'prize': prize, 'remaining_spins': remaining_spins,
+        'message': f'Parabéns! Você ganhou {prize} KZ.',
+    })
 
 @login_required
 def sobre(request):
     try:
-        platform_settings = PlatformSettings.objects.first()
+        platform_settings = get_platform_settings()
         history_text = platform_settings.history_text if platform_settings else 'Histórico da plataforma não disponível.'
     except PlatformSettings.DoesNotExist:
         history_text = 'Histórico da plataforma não disponível.'
@@ -553,7 +606,9 @@ def perfil(request):
 
         if 'change_password' in request.POST:
             if password_form.is_valid():
-                user = password_form.save()
+                # Apenas a senha: request.user pode ser um retrato em cache com saldos antigos
+                user = password_form.save(commit=False)
+                user.save(update_fields=['password'])
                 update_session_auth_hash(request, user)
                 messages.success(request, 'Sua senha foi alterada com sucesso!')
                 return redirect('perfil')
@@ -570,22 +625,27 @@ def perfil(request):
     }
     return render(request, 'perfil.html', context)
 
+class PasswordChangeView(auth_views.PasswordChangeView):
+    def form_valid(self, form):
+        # Apenas a senha, como em perfil(): request.user pode ser um retrato em cache com saldos antigos
+        user = form.save(commit=False)
+        user.save(update_fields=['password'])
+        update_session_auth_hash(self.request, user)
+        return HttpResponseRedirect(self.get_success_url())
+
 @login_required
 def renda(request):
     user = request.user
     
     active_level = UserLevel.objects.filter(user=user, is_active=True).first()
 
-    approved_deposit_total = Deposit.objects.filter(user=user, is_approved=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    today = date.today()
-    # A linha abaixo foi alterada para calcular o ganho diário com base nos registros da Task.
-    daily_income = Task.objects.filter(user=user, completed_at__date=today).aggregate(Sum('earnings'))['earnings__sum'] or 0
-
-    # A linha abaixo foi alterada para corrigir o status para 'Aprovado'
-    total_withdrawals = Withdrawal.objects.filter(user=user, status='Aprovado').aggregate(Sum('amount'))['amount__sum'] or 0
+    # Totais lidos de uma única linha (UserIncomeSummary), mantida por core.income
+    summary = get_income_summary(user)
 
-    total_income = (Task.objects.filter(user=user).aggregate(Sum('earnings'))['earnings__sum'] or 0) + user.subsidy_balance
+    approved_deposit_total = summary.approved_deposit_total
+    daily_income = summary.today_task_earnings
+    total_withdrawals = summary.approved_withdrawal_total
+    total_income = summary.task_earnings_total + user.subsidy_balance
     
     context = {
         'user': user,
@@ -596,4 +656,14 @@ def renda(request):
         'total_income': total_income,
     }
     return render(request, 'renda.html', context)
-    
\ No newline at end of file
+    
+
+@login_required
+def request_metrics(request):
+    """
+    Métricas em memória deste processo (p50/p95 por nome de URL), apenas para a equipe.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'detail': 'Acesso restrito à equipe.'}, status=403)
+
+    return JsonResponse({'pid': os.getpid(), 'views': metrics_store.snapshot()})
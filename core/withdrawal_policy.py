@@ -0,0 +1,128 @@
+"""
+Regras de saque (WithdrawalPolicy) e limites diários.
+
+As regras vêm da política ativa em cache (core.cache), com os padrões do
+modelo quando nenhuma foi cadastrada. Horário e "dia" usam a hora local
+(TIME_ZONE), convertida em limites de intervalo sobre 'created_at'
+(início do dia <= created_at < início do dia seguinte), o que usa o índice
+(user, created_at) em vez de converter a coluna para data.
+
+O limite diário é garantido por WithdrawalDailyCounter: o contador do dia é
+incrementado com um UPDATE condicional (count < limite) na mesma transação
+que cria o saque e debita o saldo. Dois envios simultâneos nunca passam do
+limite, e um saque que falha (saldo insuficiente) desfaz o incremento.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .cache import get_withdrawal_policy
+from .ledger import InsufficientBalance, debit
+from .models import LedgerEntry, Withdrawal, WithdrawalDailyCounter, WithdrawalPolicy
+
+
+ZERO = Decimal('0.00')
+
+# Regras usadas quando não há política ativa cadastrada
+DEFAULT_POLICY = WithdrawalPolicy()
+
+
+class WithdrawalDenied(Exception):
+    """O saque viola uma regra da política; a mensagem é exibida ao usuário."""
+
+
+def get_active_policy():
+    return get_withdrawal_policy() or DEFAULT_POLICY
+
+
+def day_bounds(now=None):
+    """(data local, início do dia, início do dia seguinte) de 'now', com fuso horário."""
+    day = timezone.localdate(now)
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return day, start, end
+
+
+def is_within_window(policy, now=None):
+    return policy.window_start <= timezone.localtime(now).time() <= policy.window_end
+
+
+def daily_usage(user_id, now=None):
+    """(quantidade, valor) dos saques do usuário no dia local de 'now'."""
+    _, start, end = day_bounds(now)
+    totals = Withdrawal.objects.filter(user_id=user_id, created_at__gte=start, created_at__lt=end).aggregate(
+        count=Count('id'), total=Sum('amount')
+    )
+    return totals['count'], totals['total'] or ZERO
+
+
+def daily_limit_reached(policy, user_id, now=None):
+    count, total = daily_usage(user_id, now)
+    return count >= policy.max_per_day or (
+        policy.max_daily_amount is not None and total + policy.min_amount > policy.max_daily_amount
+    )
+
+
+def window_message(policy):
+    return f'O saque só é permitido entre as {policy.window_start:%H:%M}h e as {policy.window_end:%H:%M}h.'
+
+
+def daily_limit_message(policy):
+    if policy.max_per_day == 1:
+        return 'Você só pode realizar um saque por dia.'
+    return f'Você só pode realizar {policy.max_per_day} saques por dia.'
+
+
+def check_request(policy, user, amount, now=None):
+    """Regras que não dependem do histórico (horário, valores, saldo). Levanta WithdrawalDenied."""
+    if not is_within_window(policy, now):
+        raise WithdrawalDenied(window_message(policy))
+    if amount < policy.min_amount:
+        raise WithdrawalDenied(f'O valor mínimo para saque é {policy.min_amount} KZ.')
+    if policy.max_amount is not None and amount > policy.max_amount:
+        raise WithdrawalDenied(f'O valor máximo por saque é {policy.max_amount} KZ.')
+    if user.available_balance < amount:
+        raise InsufficientBalance()
+
+
+def _consume_daily_quota(policy, user_id, amount, now):
+    day = day_bounds(now)[0]
+    guard = Q(count__lt=policy.max_per_day)
+    if policy.max_daily_amount is not None:
+        guard &= Q(total__lte=policy.max_daily_amount - amount)
+
+    counters = WithdrawalDailyCounter.objects.filter(user_id=user_id, day=day)
+    changes = {'count': F('count') + 1, 'total': F('total') + amount}
+    if counters.filter(guard).update(**changes):
+        return
+
+    if not counters.exists():
+        # Primeiro saque do dia: o contador parte dos saques já existentes (ex.: criados no Admin)
+        count, total = daily_usage(user_id, now)
+        WithdrawalDailyCounter.objects.bulk_create(
+            [WithdrawalDailyCounter(user_id=user_id, day=day, count=count, total=total)], ignore_conflicts=True
+        )
+        if counters.filter(guard).update(**changes):
+            return
+
+    if policy.max_daily_amount is not None and counters.filter(count__lt=policy.max_per_day).exists():
+        raise WithdrawalDenied(f'O valor máximo de saques por dia é {policy.max_daily_amount} KZ.')
+    raise WithdrawalDenied(daily_limit_message(policy))
+
+
+def request_withdrawal(user, amount, now=None, policy=None):
+    """
+    Valida e registra um saque de 'user', debitando o saldo.
+    Levanta WithdrawalDenied ou InsufficientBalance.
+    """
+    policy = policy or get_active_policy()
+    now = now or timezone.now()
+    check_request(policy, user, amount, now)
+    with transaction.atomic():
+        _consume_daily_quota(policy, user.pk, amount, now)
+        withdrawal = Withdrawal.objects.create(user=user, amount=amount)
+        debit(user, amount, LedgerEntry.REASON_WITHDRAWAL, source=withdrawal)
+    return withdrawal
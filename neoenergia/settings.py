@@ -56,6 +56,8 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     # WhiteNoise deve vir logo abaixo do SecurityMiddleware
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Mede consultas SQL / tempo de template por URL (cabeçalho Server-Timing)
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -68,7 +70,8 @@ ROOT_URLCONF = 'neoenergia.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Backend padrão do Django, com medição do tempo de renderização
+        'BACKEND': 'core.template_backend.TimedDjangoTemplates',
         # Assumindo que você tem uma pasta 'templates' na raiz do projeto
         'DIRS': [BASE_DIR / 'templates'], 
         'APP_DIRS': True,
@@ -106,6 +109,44 @@ else:
     }
 
 
+# ======================================================================
+# Cache (configurações da plataforma, catálogo de níveis, etc.)
+# Por padrão usa memória local. Para compartilhar entre workers, defina
+# CACHE_BACKEND/CACHE_LOCATION (ex.: FileBasedCache ou DatabaseCache).
+# ======================================================================
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='neoenergia'),
+    }
+}
+
+# Tempo máximo (segundos) que uma configuração fica em cache sem invalidação
+CONFIG_CACHE_TIMEOUT = config('CONFIG_CACHE_TIMEOUT', default=300, cast=int)
+
+# Limite de giros da roleta por usuário (token bucket em core.ratelimit):
+# até ROULETTE_SPIN_BURST giros seguidos, repostos a ROULETTE_SPIN_RATE por segundo
+ROULETTE_SPIN_BURST = config('ROULETTE_SPIN_BURST', default=5, cast=int)
+ROULETTE_SPIN_RATE = config('ROULETTE_SPIN_RATE', default=1.0, cast=float)
+
+
+# ======================================================================
+# Orçamento de consultas SQL por view (verificado nos testes com
+# core.middleware.assert_within_query_budget)
+# ======================================================================
+QUERY_BUDGETS = {
+    'menu': 8,
+    'tarefa': 6,
+    'tarefa_status': 3,
+    'equipa': 6,
+    'renda': 8,
+    'saque': 8,
+    'historico': 8,
+    'historico_api': 6,
+    'perfil': 10,
+}
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -143,12 +184,30 @@ STATICFILES_DIRS = [BASE_DIR / 'static'] # Seus diretórios estáticos locais (d
 # 🚀 Configuração de Armazenamento de Arquivos Estáticos (WhiteNoise)
 # Usa o novo sistema STORAGES para WhiteNoise em Produção
 # ======================================================================
+# Mídia num bucket privado compatível com S3 (AWS, MinIO, R2...), via
+# django-storages. Com o bucket definido, a mídia deixa o disco local.
+AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME', default='')
+AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID', default=None)
+AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY', default=None)
+AWS_S3_ENDPOINT_URL = config('AWS_S3_ENDPOINT_URL', default=None) # MinIO/R2, se usado
+AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME', default=None)
+# Validade (segundos) dos URLs assinados dos comprovativos
+AWS_QUERYSTRING_EXPIRE = config('AWS_QUERYSTRING_EXPIRE', default=3600, cast=int)
+
 STORAGES = {
+    # Mídia endereçada pelo conteúdo (core.storage): cada arquivo é gravado uma
+    # única vez. No bucket S3 se AWS_STORAGE_BUCKET_NAME estiver definido.
     "default": {
-        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "BACKEND": config(
+            'MEDIA_STORAGE_BACKEND',
+            default='core.storage.ContentAddressedS3Storage' if AWS_STORAGE_BUCKET_NAME
+            else 'core.storage.ContentAddressedFileSystemStorage',
+        ),
     },
     "staticfiles": {
-        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        # WhiteNoise (hash + gzip/brotli) + deduplicação, recompressão de imagens
+        # e variantes WebP/AVIF no collectstatic (core.static_storage)
+        "BACKEND": "core.static_storage.OptimizedStaticFilesStorage",
     },
 }
 
@@ -159,9 +218,27 @@ STORAGES = {
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = '/media/'
 
+# Comprovativos de depósito (core.proofs): regravados com no máximo
+# DEPOSIT_PROOF_MAX_SIZE px e com miniatura para o Admin. Com
+# DEPOSIT_PROOF_WORKERS=0 o processamento fica só com o comando
+# 'process_deposit_proofs'.
+DEPOSIT_PROOF_WORKERS = config('DEPOSIT_PROOF_WORKERS', default=2, cast=int)
+DEPOSIT_PROOF_MAX_SIZE = config('DEPOSIT_PROOF_MAX_SIZE', default=1600, cast=int)
+DEPOSIT_PROOF_THUMBNAIL_SIZE = 240
+DEPOSIT_PROOF_MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+
+# Threads da fila em segundo plano do processo web (core.background), usada
+# pelos efeitos não críticos do cadastro. 0 = executa logo após o commit.
+BACKGROUND_WORKERS = config('BACKGROUND_WORKERS', default=2, cast=int)
+
+# Meses de tarefas mantidos linha a linha (incluindo o atual); os anteriores são
+# resumidos por mês e removidos pelo comando 'archive_tasks' (core.task_archive)
+TASK_ARCHIVE_KEEP_MONTHS = config('TASK_ARCHIVE_KEEP_MONTHS', default=3, cast=int)
+
 # NOTA: Em produção no Render, arquivos de mídia não devem ser 
 # armazenados localmente, pois o sistema de arquivos é temporário.
-# Você deve configurar o AWS S3 ou similar para mídia em produção.
+# Defina AWS_STORAGE_BUCKET_NAME e as credenciais AWS_* acima
+# (verificação core.W001).
 # ======================================================================
 
 
@@ -171,6 +248,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # UKZ o modelo de usuário personalizado
 AUTH_USER_MODEL = 'core.CustomUser' # Mantido, assumindo que 'core' contém este modelo
 
+# O usuário da sessão é carregado do cache (core.user_cache). O ModelBackend
+# padrão continua na lista para as sessões abertas antes desta configuração.
+# O retrato do usuário (com os saldos) só é guardado num cache compartilhado
+# entre os processos: com memória local, as invalidações feitas pelo worker
+# (apply_daily_gains) e pelo processo 'proofs' não chegariam aos processos web.
+USER_SNAPSHOT_CACHE = config(
+    'USER_SNAPSHOT_CACHE',
+    default=not CACHES['default']['BACKEND'].endswith(('LocMemCache', 'DummyCache')),
+    cast=bool,
+)
+AUTHENTICATION_BACKENDS = [
+    'core.auth_backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Sessões lidas do cache e gravadas também no banco (write-through)
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 LOGIN_URL = 'login'
 
 # Configuração de segurança adicional para produção (Recomendado)
@@ -1,13 +1,22 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.storage import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
 ]
 
-# CORREÇÃO: Adiciona a rota de mídia (comprovativos) para ser executada 
-# mesmo quando DEBUG=False.
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Mídia (comprovativos) servida pela aplicação, também com DEBUG=False, mas
+# somente para a equipe e sem cache público (core.storage.serve_media).
+if settings.MEDIA_URL.startswith('/'):
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            serve_media,
+        ),
+    ]
@@ -0,0 +1,51 @@
+// Atualizações em tempo real (Server-Sent Events, endpoint 'events').
+// Atualiza os elementos [data-live="available_balance"|"subsidy_balance"] e
+// avisa quando um depósito é aprovado ou um saque é pago/rejeitado, sem
+// recarregar a página. O navegador reconecta sozinho quando a conexão cai.
+(function () {
+    const script = document.currentScript;
+    if (!window.EventSource || !script) return;
+
+    const source = new EventSource(script.dataset.eventsUrl);
+
+    function showToast(text) {
+        const toast = document.createElement('div');
+        toast.className = 'live-toast';
+        toast.textContent = text;
+        document.body.appendChild(toast);
+        setTimeout(() => toast.remove(), 6000);
+    }
+
+    source.addEventListener('balance', function (event) {
+        const data = JSON.parse(event.data);
+        if (!data) return;
+        document.querySelectorAll('[data-live]').forEach(function (element) {
+            const value = data[element.dataset.live];
+            if (value !== undefined) element.textContent = value;
+        });
+    });
+
+    source.addEventListener('deposit', function (event) {
+        const data = JSON.parse(event.data);
+        if (data.status === 'Aprovado') showToast('Depósito aprovado! O saldo já foi atualizado.');
+    });
+
+    source.addEventListener('withdrawal', function (event) {
+        const data = JSON.parse(event.data);
+        if (data.status === 'Aprovado') showToast('Levantamento aprovado e pago.');
+        else if (data.status === 'Rejeitado') showToast('Levantamento rejeitado: o valor voltou ao seu saldo.');
+
+        // Histórico da página de saque
+        const item = document.querySelector(`[data-withdrawal-id="${data.id}"]`);
+        if (!item) return;
+        const status = data.status.toLowerCase();
+        item.className = `transaction-item-new status-${status}`;
+        const tag = item.querySelector('.status-tag-new');
+        if (tag) {
+            tag.className = `status-tag-new tag-${status}`;
+            tag.textContent = data.status;
+        }
+        const type = item.querySelector('.transaction-type-new');
+        if (type) type.textContent = `Levantamento: ${data.status}`;
+    });
+})();